@@ -0,0 +1,85 @@
+"""
+Tiered storage for old chat answers.
+
+``archive_batch`` moves ``response_text`` of rows older than
+``CHAT_ARCHIVE_AFTER_DAYS`` into ``ChatHistoryArchive`` as compressed bytes
+(zstd when the optional ``zstandard`` package is installed, zlib otherwise)
+and blanks it in the hot ``ChatHistory`` table. ``rehydrate`` (model
+instances) and ``archived_texts`` (``values()`` rows) restore the text with
+one extra query, so views keep returning the full answer.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core import compression
+from .models import ChatHistory, ChatHistoryArchive
+
+
+def default_codec():
+    return compression.preferred_codec(getattr(settings, "CHAT_ARCHIVE_CODEC", ""))
+
+
+def compress(text, codec=None):
+    codec = codec or default_codec()
+    return codec, compression.compress(text.encode("utf-8"), codec)
+
+
+def decompress(codec, payload):
+    return compression.decompress(bytes(payload), codec).decode("utf-8")
+
+
+def archived_texts(history_ids):
+    """``{history_id: response_text}`` for archived rows, in one query."""
+    if not history_ids:
+        return {}
+    return {
+        archive.history_id: decompress(archive.codec, archive.payload)
+        for archive in ChatHistoryArchive.objects.filter(history_id__in=list(history_ids))
+    }
+
+
+def rehydrate(items):
+    """Fill in ``response_text`` for archived rows among ``items`` (in place)."""
+    pending = {
+        item.pk: item
+        for item in items
+        if item.archived_at is not None and not getattr(item, "_archive_loaded", False)
+    }
+    for history_id, text in archived_texts(pending).items():
+        item = pending[history_id]
+        item.response_text = text
+        item._archive_loaded = True
+    return items
+
+
+def archive_batch(older_than=None, batch_size=500, codec=None):
+    """Archive up to ``batch_size`` eligible rows; returns how many were archived."""
+    if older_than is None:
+        older_than = timedelta(days=getattr(settings, "CHAT_ARCHIVE_AFTER_DAYS", 90))
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            ChatHistory.objects.select_for_update(skip_locked=True)
+            .filter(archived_at__isnull=True, created_at__lt=now - older_than)
+            .order_by("created_at", "id")
+            .only("id", "response_text")[:batch_size]
+        )
+        if not rows:
+            return 0
+        archives = []
+        for row in rows:
+            row_codec, payload = compress(row.response_text, codec)
+            archives.append(
+                ChatHistoryArchive(
+                    history_id=row.id,
+                    codec=row_codec,
+                    payload=payload,
+                    original_size=len(row.response_text),
+                )
+            )
+        ChatHistoryArchive.objects.bulk_create(archives)
+        ChatHistory.objects.filter(id__in=[row.id for row in rows]).update(response_text="", archived_at=now)
+    return len(rows)
@@ -0,0 +1,24 @@
+from core.deletion import delete_in_batches
+from search import indexing
+from search.models import Chunk
+from . import export
+from .models import ChatHistory
+
+
+def delete_chat_history(job, user_id, up_to_id):
+    """
+    Background job for ``DeleteAllHistoryView``: removes the user's chat rows
+    that existed when the request was made (``id <= up_to_id``), in batches.
+    """
+    queryset = ChatHistory.objects.filter(user_id=user_id, id__lte=up_to_id)
+    total = queryset.count()
+    job.progress(0, total)
+    # Search chunks first, in their own batches: an answer can have many, and
+    # each batch of history rows would otherwise take all of theirs with it.
+    # The history rows still go through the collector (their chunk and
+    # archive relations cascade), which removes archive rows batch by batch.
+    delete_in_batches(Chunk.objects.filter(user_id=user_id, history_id__lte=up_to_id))
+    deleted = delete_in_batches(queryset, on_batch=lambda count: job.progress(count, total))
+    indexing.forget(user_id)
+    export.forget(user_id)
+    return {"deleted_count": deleted}
@@ -0,0 +1,153 @@
+"""
+Cached .docx exports of Project Mode answers.
+
+An export is rendered once by ``ai.rendering`` in the worker processes of
+``core.processes`` and kept at ``EXPORT_DIR/<user id>/<key>.docx``, where
+the key hashes the answer text, its title and ``RENDER_VERSION``. Later
+downloads of the same answer are served from that file (with Range support,
+see ``core.ranges``); the key doubles as the ETag. A cold export is rendered
+by a background job (``schedule_render``), so no request thread waits on the
+pool; requests made while it runs get the same job, and renders of one file
+in this process are shared.
+
+Files not downloaded for ``EXPORT_CACHE_TTL`` seconds, and the least recently
+downloaded ones beyond ``EXPORT_CACHE_MAX_BYTES``, are removed after each
+render. Deleting chat history removes the user's exports (``forget``).
+"""
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.text import slugify
+
+from core import jobs, processes
+from . import rendering
+from .archive import rehydrate
+from .models import ChatHistory
+
+logger = logging.getLogger(__name__)
+
+# Bump when ai.rendering's output changes, so cached files are re-rendered.
+RENDER_VERSION = 1
+CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+_rendering = {}
+_rendering_lock = threading.Lock()
+
+
+class RenderTimeout(Exception):
+    pass
+
+
+def _root():
+    return Path(getattr(settings, "EXPORT_DIR", None) or Path(settings.BASE_DIR) / ".exports")
+
+
+def title(history):
+    data = history.input_data if isinstance(history.input_data, dict) else {}
+    return " ".join(str(data.get("project_name") or "Project").split())[:200]
+
+
+def filename(history):
+    return f"{slugify(title(history))[:80] or 'project'}.docx"
+
+
+def key(history):
+    """Content hash of what the export is rendered from; loads archived text if needed."""
+    rehydrate([history])
+    digest = hashlib.sha256(f"{RENDER_VERSION}\0{title(history)}\0".encode())
+    digest.update(history.response_text.encode())
+    return digest.hexdigest()
+
+
+def _render(path, history):
+    pool = processes.get_pool()
+    with _rendering_lock:
+        future = _rendering.get(path)
+        owner = future is None
+        if owner:
+            future = pool.submit(rendering.render_docx, history.response_text, str(path), title(history))
+            _rendering[path] = future
+    try:
+        future.result(timeout=getattr(settings, "EXPORT_RENDER_TIMEOUT", 30))
+    except FutureTimeout:
+        if owner:
+            logger.warning("Rendering %s timed out; restarting the worker pool", path.name)
+            processes.discard(pool)
+        raise RenderTimeout()
+    finally:
+        if owner:
+            with _rendering_lock:
+                _rendering.pop(path, None)
+    if owner:
+        _evict()
+
+
+def _path(user_id, artifact_key):
+    return _root() / str(user_id) / f"{artifact_key}.docx"
+
+
+def cached_path(history, artifact_key):
+    """Path of the rendered export of ``history`` (whose ``key`` is ``artifact_key``), or ``None`` if not rendered."""
+    path = _path(history.user_id, artifact_key)
+    try:
+        # Downloads refresh the modification time that eviction goes by.
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def _render_job(job, history_id, artifact_key):
+    history = ChatHistory.objects.get(pk=history_id)
+    rehydrate([history])
+    path = _path(history.user_id, artifact_key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _render(path, history)
+    return {"download_url": f"/api/ai/history/{history_id}/export/"}
+
+
+def schedule_render(history, artifact_key):
+    """Render the export in the background, once while a render is pending; returns the job id."""
+    job_key = f"export-job:{artifact_key}"
+    job_id = cache.get(job_key)
+    state = jobs.get(job_id) if job_id else None
+    if state is not None and state["status"] in ("queued", "running"):
+        return job_id
+    job_id = jobs.submit("project_export", _render_job, history.pk, artifact_key)
+    cache.set(job_key, job_id, getattr(settings, "JOBS_RESULT_TTL", 24 * 3600))
+    return job_id
+
+
+def _evict():
+    root = _root()
+    cutoff = time.time() - getattr(settings, "EXPORT_CACHE_TTL", 7 * 24 * 3600)
+    files = []
+    for path in root.glob("*/*.docx"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        if stat.st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+        else:
+            files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    limit = getattr(settings, "EXPORT_CACHE_MAX_BYTES", 200 * 1024 * 1024)
+    for _, size, path in sorted(files):
+        if total <= limit:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+
+
+def forget(user_id):
+    """Remove the user's cached exports (after their chat history is deleted)."""
+    shutil.rmtree(_root() / str(int(user_id)), ignore_errors=True)
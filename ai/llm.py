@@ -0,0 +1,49 @@
+"""
+OpenRouter (OpenAI-compatible) chat completions.
+
+The ``openai`` SDK is heavy to import and only the AI endpoints need it, so
+it is loaded on the first completion rather than when views are imported.
+Clients are reused per API key and base URL; each owns an HTTP connection
+pool.
+"""
+from functools import lru_cache
+
+from django.conf import settings
+
+from core.instrumentation import timed
+from core.lazy import lazy_import
+
+openai = lazy_import("openai")
+
+
+@lru_cache(maxsize=4)
+def _client(api_key, base_url):
+    return openai.OpenAI(api_key=api_key, base_url=base_url)
+
+
+def get_client():
+    api_key = getattr(settings, "OPENROUTER_API_KEY", None)
+    base_url = getattr(settings, "OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+    if not api_key:
+        return None
+    return _client(api_key, base_url)
+
+
+def chat(messages, model=None, temperature=0.7):
+    client = get_client()
+    if client is None:
+        raise RuntimeError("OpenRouter API key missing")
+
+    model = model or getattr(settings, "OPENROUTER_DEFAULT_MODEL", "openai/gpt-4o-mini")
+    with timed("external"):
+        return client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+        )
+
+
+def extract_text(completion):
+    if not completion or not completion.choices:
+        return ""
+    return completion.choices[0].message.content or ""
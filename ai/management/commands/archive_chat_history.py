@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ai import archive
+from core import compression
+
+
+class Command(BaseCommand):
+    help = (
+        "Move old chat answers into compressed cold storage, one batch per transaction. "
+        "Safe to interrupt and re-run; schedule it (e.g. nightly) to archive incrementally."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=getattr(settings, "CHAT_ARCHIVE_AFTER_DAYS", 90),
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--max-batches", type=int, default=None, help="Stop after this many batches.")
+        parser.add_argument("--codec", choices=("zstd", "zlib"), default=None)
+
+    def handle(self, *args, **options):
+        if options["codec"] == "zstd" and compression.zstandard is None:
+            raise CommandError("--codec zstd requires the zstandard package.")
+        older_than = timedelta(days=options["older_than_days"])
+        total = batches = 0
+        while options["max_batches"] is None or batches < options["max_batches"]:
+            archived = archive.archive_batch(older_than, options["batch_size"], options["codec"])
+            if not archived:
+                break
+            total += archived
+            batches += 1
+        self.stdout.write(f"Archived {total} chat history row(s) in {batches} batch(es).")
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-19 02:40
+
+import core.fields
+from django.db import migrations
+
+
+def compress_responses(apps, schema_editor):
+    core.fields.compress_existing(apps.get_model("ai", "ChatHistory"), "response_text")
+
+
+def decompress_responses(apps, schema_editor):
+    core.fields.decompress_existing(apps.get_model("ai", "ChatHistory"), "response_text")
+
+
+class Migration(migrations.Migration):
+
+    # Each batch commits on its own so large tables are not converted in
+    # one long transaction.
+    atomic = False
+
+    dependencies = [
+        ('ai', '0002_chat_history_archive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chathistory',
+            name='response_text',
+            field=core.fields.CompressedTextField(),
+        ),
+        migrations.RunPython(compress_responses, decompress_responses),
+    ]
@@ -1,10 +1,32 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+from core.fields import CompressedTextField
+
 
 class ChatHistory(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     mode = models.CharField(max_length=20)
     input_data = models.JSONField()
-    response_text = models.TextField()
+    response_text = CompressedTextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Set when response_text has been moved to ChatHistoryArchive (and
+    # blanked here); see ai/archive.py.
+    archived_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["archived_at", "created_at"]),
+        ]
+
+
+class ChatHistoryArchive(models.Model):
+    """Cold storage for the compressed response of an archived ChatHistory row."""
+
+    history = models.OneToOneField(
+        ChatHistory, on_delete=models.CASCADE, primary_key=True, related_name="archive"
+    )
+    codec = models.CharField(max_length=8)
+    payload = models.BinaryField()
+    original_size = models.PositiveIntegerField()
+    archived_at = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,103 @@
+"""System prompt fragments shared by the AI views and shared chat."""
+
+
+def ree_identity():
+    return (
+        "You are REE (Research, Explain, Elevate), the user's study, project, and exam companion. "
+        "You must follow the selected mode rules strictly."
+    )
+
+
+def is_project_request(text):
+    if not text:
+        return False
+    lowered = text.lower()
+    keywords = ["project", "zimsec", "proposal", "title page", "abstract", "literature review", "methodology"]
+    return any(k in lowered for k in keywords)
+
+
+# ZIMSEC page layout: asked of the model in Project Mode and applied to
+# exported .docx files (ai.rendering).
+PROJECT_PAGE = {
+    "paper": "A4",
+    "font": "Times New Roman",
+    "font_size": 12,
+    "line_spacing": 1.5,
+    "margins_inches": {"left": 1.5, "right": 1, "top": 1, "bottom": 1},
+}
+
+
+def project_formatting_rules():
+    page = PROJECT_PAGE
+    margins = ", ".join(f'{side} {inches:g}"' for side, inches in page["margins_inches"].items())
+    return (
+        f"Formatting rules (Project Mode only): {page['paper']} paper, {page['font']}, "
+        f"font size {page['font_size']}, line spacing {page['line_spacing']:g}, margins: {margins}."
+    )
+
+
+def project_template():
+    return (
+        "Use ONLY the Standard ZIMSEC Project Framework and report structure. "
+        "Include all mandatory stages and headings.\n"
+        "Mandatory stages (include in order with typical marks):\n"
+        "1) Problem Identification (5 marks)\n"
+        "2) Investigation of Ideas (10 marks)\n"
+        "3) Generation of Ideas (10 marks)\n"
+        "4) Development/Refinement (10 marks)\n"
+        "5) Presentation of Results (10 marks)\n"
+        "6) Evaluation & Recommendations (5 marks)\n"
+        "General report structure (use these formal headings):\n"
+        "Title Page\n"
+        "Table of Contents\n"
+        "Introduction\n"
+        "Research Methodology\n"
+        "Findings & Analysis\n"
+        "Appendices"
+    )
+
+
+def project_subject_rules(subject):
+    subject_lower = (subject or "").lower()
+    if "science" in subject_lower:
+        return (
+            "Science/Geography: expand Research Methodology and Findings & Analysis with clear "
+            "environmental or experimental evidence. Use the 6 stages."
+        )
+    if "math" in subject_lower:
+        return (
+            "Mathematics: include relevant calculations, formulas, and worked examples tied to "
+            "real-life data (profits, surveys, measurements, modeling)."
+        )
+    if "computer" in subject_lower or "ict" in subject_lower:
+        return (
+            "Computer Science/ICT (4021): include system analysis approach with Section A "
+            "(Investigation), Section B (Design), Section C (Development), and Section D "
+            "(Testing/Evaluation)."
+        )
+    if "english" in subject_lower or "shona" in subject_lower:
+        return (
+            "Languages: focus on communication strategies, literacy improvements, or cultural "
+            "preservation as appropriate."
+        )
+    if "heritage" in subject_lower:
+        return "Include local history, culture, traditions, and community knowledge."
+    return ""
+
+
+def originality_rules():
+    return (
+        "Originality and safety rules: Never copy content directly. Rewrite everything originally. "
+        "Localize examples. Avoid plagiarism. Match ZIMSEC expectations."
+    )
+
+
+def notes_context(excerpts):
+    """System message carrying passages retrieved from the user's notes (``search.index.search_notes``)."""
+    passages = "\n\n".join(
+        f"[{number}] {excerpt['title']}\n{excerpt['text']}" for number, excerpt in enumerate(excerpts, start=1)
+    )
+    return (
+        "Relevant passages from the user's own notes are below. Base your answer on them where they apply, "
+        "cite them by number, and say so when they do not cover the question.\n\n" + passages
+    )
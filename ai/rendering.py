@@ -0,0 +1,123 @@
+"""
+Rendering Project Mode answers as .docx files with the ZIMSEC layout.
+
+``render_docx`` runs in the worker processes of ``core.processes``, so this
+module imports nothing from Django. The page layout comes from
+``ai.prompts.PROJECT_PAGE``, the same rules the model is given. The answer's
+Markdown is mapped onto Word structure: ``#`` headings, ``-``/``*`` bullets,
+numbered lines (keeping their numbers), pipe tables, and ``**bold**``,
+``*italic*`` and `` `code` `` runs; every other line is a paragraph.
+"""
+import os
+import re
+
+from core.lazy import lazy_import
+
+from .prompts import PROJECT_PAGE
+
+docx = lazy_import("docx")
+
+HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*$")
+BULLET = re.compile(r"^\s*[-*•]\s+(.*)$")
+NUMBERED = re.compile(r"^\s*\d+[.)]\s+")
+TABLE_SEPARATOR = re.compile(r"^\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?$")
+RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+INLINE = re.compile(r"(\*\*[^*]+\*\*|__[^_]+__|\*[^*\s][^*]*\*|`[^`]+`)")
+HEADING_SIZES = {1: 16, 2: 14}
+
+
+def _apply_layout(document):
+    from docx.enum.text import WD_LINE_SPACING
+    from docx.oxml.ns import qn
+    from docx.shared import Inches, Mm, Pt, RGBColor
+
+    section = document.sections[0]
+    section.page_width, section.page_height = Mm(210), Mm(297)
+    margins = PROJECT_PAGE["margins_inches"]
+    section.left_margin = Inches(margins["left"])
+    section.right_margin = Inches(margins["right"])
+    section.top_margin = Inches(margins["top"])
+    section.bottom_margin = Inches(margins["bottom"])
+
+    font_name = PROJECT_PAGE["font"]
+    styles = [document.styles["Normal"]] + [document.styles[f"Heading {level}"] for level in range(1, 7)]
+    for style in styles:
+        style.font.name = font_name
+        # Word takes East Asian text's font from its own attribute.
+        style.element.get_or_add_rPr().get_or_add_rFonts().set(qn("w:eastAsia"), font_name)
+    normal = document.styles["Normal"]
+    normal.font.size = Pt(PROJECT_PAGE["font_size"])
+    normal.paragraph_format.line_spacing_rule = WD_LINE_SPACING.MULTIPLE
+    normal.paragraph_format.line_spacing = PROJECT_PAGE["line_spacing"]
+    for level in range(1, 7):
+        heading = document.styles[f"Heading {level}"]
+        heading.font.size = Pt(HEADING_SIZES.get(level, PROJECT_PAGE["font_size"]))
+        heading.font.bold = True
+        heading.font.italic = False
+        heading.font.color.rgb = RGBColor(0, 0, 0)
+
+
+def _add_runs(paragraph, text):
+    for part in INLINE.split(text):
+        if not part:
+            continue
+        if part[:2] in ("**", "__") and part[-2:] == part[:2] and len(part) > 4:
+            paragraph.add_run(part[2:-2]).bold = True
+        elif part[0] == "*" and part[-1] == "*" and len(part) > 2:
+            paragraph.add_run(part[1:-1]).italic = True
+        elif part[0] == "`" and part[-1] == "`" and len(part) > 2:
+            paragraph.add_run(part[1:-1]).font.name = "Courier New"
+        else:
+            paragraph.add_run(part)
+
+
+def _cells(line):
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+
+def _add_table(document, rows):
+    width = max(len(row) for row in rows)
+    table = document.add_table(rows=len(rows), cols=width)
+    table.style = "Table Grid"
+    for row, cells in zip(table.rows, rows):
+        for cell, text in zip(row.cells, cells):
+            _add_runs(cell.paragraphs[0], text)
+
+
+def render_docx(text, path, title=""):
+    """Write ``text`` (the model's Markdown answer) to ``path`` as a formatted .docx; returns its size."""
+    document = docx.Document()
+    _apply_layout(document)
+    document.core_properties.title = title
+
+    table_rows = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("|"):
+            if not TABLE_SEPARATOR.match(stripped):
+                table_rows.append(_cells(stripped))
+            continue
+        if table_rows:
+            _add_table(document, table_rows)
+            table_rows = []
+        if not stripped or RULE.match(stripped):
+            continue
+        if match := HEADING.match(stripped):
+            paragraph = document.add_heading(level=len(match.group(1)))
+            _add_runs(paragraph, match.group(2))
+        elif match := BULLET.match(line):
+            _add_runs(document.add_paragraph(style="List Bullet"), match.group(1))
+        elif NUMBERED.match(line):
+            # Word's auto-numbering would run on across separate lists; keep
+            # the answer's own numbers.
+            _add_runs(document.add_paragraph(style="List Paragraph"), stripped)
+        else:
+            _add_runs(document.add_paragraph(), stripped)
+    if table_rows:
+        _add_table(document, table_rows)
+
+    # Write then rename, so a reader never sees a partial file.
+    temporary = f"{path}.{os.getpid()}.tmp"
+    document.save(temporary)
+    os.replace(temporary, path)
+    return os.path.getsize(path)
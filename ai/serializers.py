@@ -1,8 +1,32 @@
 from rest_framework import serializers
+from .archive import rehydrate
 from .models import ChatHistory
 
 
+class ChatHistoryListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, "all") else data)
+        # One query for every archived row on the page instead of one each.
+        rehydrate(items)
+        return super().to_representation(items)
+
+
 class ChatHistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatHistory
         fields = ["id", "mode", "input_data", "response_text", "created_at"]
+        list_serializer_class = ChatHistoryListSerializer
+
+    def to_representation(self, instance):
+        rehydrate([instance])
+        return super().to_representation(instance)
+
+
+class ChatHistorySummarySerializer(serializers.Serializer):
+    """List-mode row (``?summary=1``) built from a ``values()`` projection."""
+
+    id = serializers.IntegerField()
+    mode = serializers.CharField()
+    session_id = serializers.CharField(allow_null=True)
+    question = serializers.CharField(allow_null=True)
+    created_at = serializers.DateTimeField()
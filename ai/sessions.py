@@ -0,0 +1,116 @@
+"""
+Chat session management.
+
+A session is the ``input_data["session_id"]`` shared by a user's chat rows.
+``assign``, ``merge`` and ``split`` move rows between sessions with one
+set-based UPDATE that rewrites only that JSON key in SQL (``jsonb_set`` on
+PostgreSQL, ``JSON_SET`` on SQLite/MySQL); other backends fall back to
+``bulk_update`` in batches. Each call runs in a single transaction.
+
+Share links keep pointing at the session they were created for: rows merged
+into another session are no longer visible through the old link, and rows
+split off an existing session leave its link.
+"""
+import uuid
+from functools import partial
+
+from django.db import NotSupportedError, connection, transaction
+from django.db.models import F, Func, JSONField, Q
+
+from core import conditional
+from .models import ChatHistory
+
+SESSION_KEY = "session_id"
+BATCH_SIZE = 500
+
+
+def history_version_scope(user_id):
+    """``core.conditional`` scope of the user's history list."""
+    return f"chat-history:{user_id}"
+
+
+class _SetSessionId(Func):
+    """``input_data`` with its ``session_id`` key replaced, computed in SQL."""
+
+    output_field = JSONField()
+
+    def __init__(self, session_id):
+        super().__init__(F("input_data"))
+        self.session_id = session_id
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError(f"Setting a JSON key in SQL is not supported on {connection.vendor}.")
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.source_expressions[0])
+        return (
+            f"jsonb_set(COALESCE({sql}, '{{}}'::jsonb), ARRAY[%s]::text[], to_jsonb(%s::text))",
+            (*params, SESSION_KEY, self.session_id),
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.source_expressions[0])
+        return f"JSON_SET(COALESCE({sql}, '{{}}'), %s, %s)", (*params, f"$.{SESSION_KEY}", self.session_id)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.source_expressions[0])
+        return f"JSON_SET(COALESCE({sql}, JSON_OBJECT()), %s, %s)", (*params, f"$.{SESSION_KEY}", self.session_id)
+
+
+def _set_session(queryset, session_id):
+    if connection.vendor in ("postgresql", "sqlite", "mysql"):
+        return queryset.update(input_data=_SetSessionId(session_id))
+
+    updated = 0
+    rows = queryset.only("id", "input_data").order_by("id")
+    last_id = 0
+    while True:
+        batch = list(rows.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            return updated
+        for row in batch:
+            row.input_data = {**(row.input_data or {}), SESSION_KEY: session_id}
+        ChatHistory.objects.bulk_update(batch, ["input_data"])
+        updated += len(batch)
+        last_id = batch[-1].id
+
+
+def _move(user, queryset, session_id):
+    with transaction.atomic():
+        updated = _set_session(queryset, session_id)
+        if updated:
+            # Ids and timestamps are unchanged, so the history list's ETag
+            # needs a version bump; after commit, so readers never pair the
+            # new version with the old rows.
+            transaction.on_commit(partial(conditional.bump, history_version_scope(user.id)))
+    return updated
+
+
+def _in_sessions(session_ids):
+    query = Q(pk__in=[])
+    for session_id in session_ids:
+        query |= Q(input_data__session_id=session_id)
+    return query
+
+
+def assign(user, history_ids, session_id):
+    """Put the user's rows ``history_ids`` into ``session_id``; returns how many moved."""
+    return _move(user, ChatHistory.objects.filter(user=user, id__in=list(history_ids)), session_id)
+
+
+def merge(user, session_ids, into):
+    """Move every row of the user's ``session_ids`` into session ``into``; returns how many moved."""
+    sources = [session_id for session_id in session_ids if session_id != into]
+    if not sources:
+        return 0
+    return _move(user, ChatHistory.objects.filter(_in_sessions(sources), user=user), into)
+
+
+def split(user, session_id, history_ids, new_session_id=None):
+    """
+    Move the given rows of ``session_id`` into a new session. Returns the new
+    session id (``new_session_id`` or a generated one) and how many rows moved.
+    """
+    new_session_id = new_session_id or uuid.uuid4().hex
+    queryset = ChatHistory.objects.filter(user=user, id__in=list(history_ids), input_data__session_id=session_id)
+    return new_session_id, _move(user, queryset, new_session_id)
@@ -0,0 +1,69 @@
+"""
+msgspec rows for the chat history list (see ``core.fastjson``).
+
+Field order matches ``ChatHistorySerializer``/``ChatHistorySummarySerializer``
+so the encoded JSON is identical to what the serializers produce.
+"""
+from datetime import datetime
+from operator import itemgetter
+from typing import Any, Optional
+
+import msgspec
+from django.db.models.fields.json import KT
+
+from core import keyset
+from core.fields import CompressedTextField
+from .archive import archived_texts
+
+
+class HistoryRow(msgspec.Struct):
+    id: int
+    mode: str
+    input_data: Any
+    response_text: str
+    created_at: datetime
+
+
+class HistorySummaryRow(msgspec.Struct):
+    id: int
+    mode: str
+    session_id: Optional[str]
+    question: Optional[str]
+    created_at: datetime
+
+
+HISTORY_FIELDS = ("id", "mode", "input_data", "response_text", "created_at", "archived_at")
+
+
+def history_rows(queryset):
+    return _history_rows(list(queryset.values_list(*HISTORY_FIELDS)))
+
+
+def iter_history_rows(queryset, chunk_size):
+    """``HistoryRow``s in id order, fetched ``chunk_size`` rows per query (archived answers loaded per chunk)."""
+    for batch in keyset.pages(queryset.values_list(*HISTORY_FIELDS), chunk_size, itemgetter(0), "id"):
+        yield from _history_rows(batch)
+
+
+def _history_rows(rows):
+    archived = archived_texts([row[0] for row in rows if row[5] is not None])
+    return [
+        HistoryRow(
+            id,
+            mode,
+            input_data,
+            archived[id] if id in archived else CompressedTextField.decode(response_text),
+            created_at,
+        )
+        for id, mode, input_data, response_text, created_at, _ in rows
+    ]
+
+
+def history_summary_rows(queryset):
+    # Two JSON keys extracted in SQL instead of the whole input_data document.
+    return [
+        HistorySummaryRow(*row)
+        for row in queryset.values_list(
+            "id", "mode", KT("input_data__session_id"), KT("input_data__question"), "created_at"
+        )
+    ]
@@ -1,3 +1,430 @@
-from django.test import TestCase
+import io
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models.fields.json import KT
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from core import compression
+from core.llm_stub import StubLLMServer
+from core.models import PendingDeletion
+from core.query_guard import QueryCountTestCase
+from sharing.models import ShareLink, ShareMember
+from . import archive, export, rendering, sessions
+from .models import ChatHistory, ChatHistoryArchive
+from .serializers import ChatHistorySerializer, ChatHistorySummarySerializer
+
+
+def _user_with_history(username, count, session_id=None):
+    user = User.objects.create_user(username=username, email=f"{username}@example.com")
+    ChatHistory.objects.bulk_create(
+        [
+            ChatHistory(
+                user=user,
+                mode="general",
+                input_data={"question": f"Question {i}", "session_id": session_id or f"{username}-session"},
+                response_text=f"Answer {i}",
+            )
+            for i in range(count)
+        ]
+    )
+    return user
+
+
+class AiQueryCountTests(QueryCountTestCase):
+    urlconf = "ai.urls"
+    url_prefix = "/api/ai/"
+    covered_routes = (
+        "",
+        "study/",
+        "project/",
+        "general/",
+        "notes/",
+        "history/",
+        "history/delete-all/",
+        "history/<int:id>/delete/",
+        "history/<int:id>/export/",
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.llm = StubLLMServer(latency=0, token_rate=0, tokens=20).start()
+        cls.llm_settings = override_settings(OPENROUTER_API_KEY="test-key", OPENROUTER_BASE_URL=cls.llm.base_url)
+        cls.llm_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.llm_settings.disable()
+        cls.llm.stop()
+        super().tearDownClass()
+
+    def test_index(self):
+        self.assertConstantQueries(
+            "", "get", lambda scale: (_user_with_history(f"index{scale}", scale), "", None)
+        )
+
+    def test_study_mode(self):
+        self.assertConstantQueries(
+            "study/",
+            "post",
+            lambda scale: (
+                _user_with_history(f"study{scale}", scale),
+                "study/",
+                {"notes": "Photosynthesis", "task": "summarize", "history": [{"role": "user", "content": "hi"}] * scale},
+            ),
+        )
+
+    def test_project_mode(self):
+        self.assertConstantQueries(
+            "project/",
+            "post",
+            lambda scale: (
+                _user_with_history(f"project{scale}", scale),
+                "project/",
+                {"mode": "fast", "project_name": "Water harvesting", "subject": "Geography"},
+            ),
+        )
+
+    def test_general_mode(self):
+        self.assertConstantQueries(
+            "general/",
+            "post",
+            lambda scale: (_user_with_history(f"general{scale}", scale), "general/", {"question": "What is erosion?"}),
+        )
+
+    def test_notes_ai(self):
+        self.assertConstantQueries(
+            "notes/",
+            "post",
+            lambda scale: (
+                _user_with_history(f"notesai{scale}", scale),
+                "notes/",
+                {"note_content": "Erosion notes", "action": "explain"},
+            ),
+        )
+
+    def test_history_list(self):
+        self.assertConstantQueries(
+            "history/", "get", lambda scale: (_user_with_history(f"history{scale}", scale), "history/", None)
+        )
+
+    def test_history_list_summary(self):
+        def setup(scale):
+            return _user_with_history(f"historysummary{scale}", scale), "history/?summary=1", None
+
+        self.assertConstantQueries("history/", "get", setup)
+
+    def test_history_list_with_archived_rows(self):
+        def setup(scale):
+            user = _user_with_history(f"archived{scale}", scale)
+            ChatHistory.objects.filter(user=user).update(created_at=timezone.now() - timedelta(days=400))
+            archive.archive_batch(timedelta(days=1))
+            return user, "history/", None
+
+        self.assertConstantQueries("history/", "get", setup)
+
+    def test_delete_all_history(self):
+        self.assertConstantQueries(
+            "history/delete-all/",
+            "delete",
+            lambda scale: (_user_with_history(f"purge{scale}", scale), "history/delete-all/", None),
+            expected_status=202,
+        )
+
+    def test_delete_history_item(self):
+        def setup(scale):
+            user = _user_with_history(f"delete{scale}", scale)
+            item = ChatHistory.objects.filter(user=user).first()
+            return user, f"history/{item.id}/delete/", None
+
+        self.assertConstantQueries("history/<int:id>/delete/", "delete", setup)
+
+    def test_export_history_item(self):
+        def setup(scale):
+            user = _user_with_history(f"export{scale}", scale)
+            item = ChatHistory.objects.create(user=user, mode="project", input_data={}, response_text="# Title")
+            return user, f"history/{item.id}/export/", None
+
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(EXPORT_DIR=directory, JOBS_ALWAYS_EAGER=True):
+            self.assertConstantQueries("history/<int:id>/export/", "get", setup)
+
+
+@override_settings(JOBS_ALWAYS_EAGER=True, DELETION_BATCH_SIZE=4)
+class DeleteAllHistoryTests(APITestCase):
+    def test_history_is_deleted_by_background_job(self):
+        user = _user_with_history("purge", 10)
+        other = _user_with_history("bystander", 2)
+        self.client.force_authenticate(user)
+
+        response = self.client.delete("/api/ai/history/delete-all/")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["pending_count"], 10)
+
+        job = self.client.get(response.data["status_url"]).data
+        self.assertEqual((job["status"], job["result"]), ("done", {"deleted_count": 10}))
+        self.assertEqual(job["progress"], {"done": 10, "total": 10})
+        self.assertFalse(ChatHistory.objects.filter(user=user).exists())
+        self.assertEqual(ChatHistory.objects.filter(user=other).count(), 2)
+
+    @override_settings(JOBS_ALWAYS_EAGER=False)
+    def test_interrupted_deletion_is_resumed(self):
+        user = _user_with_history("interrupted", 5)
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.delete("/api/ai/history/delete-all/").status_code, 202)
+        newer = ChatHistory.objects.create(user=user, mode="general", input_data={}, response_text="after")
+
+        with override_settings(JOBS_ALWAYS_EAGER=True):
+            call_command("resume_deletions", "--older-than", "0", stdout=StringIO())
+
+        self.assertEqual(list(ChatHistory.objects.filter(user=user)), [newer])
+        self.assertFalse(PendingDeletion.objects.exists())
+
+    def test_empty_history_returns_immediately(self):
+        self.client.force_authenticate(User.objects.create_user(username="empty"))
+        response = self.client.delete("/api/ai/history/delete-all/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["deleted_count"], 0)
+
+
+class ChatArchiveTests(APITestCase):
+    def setUp(self):
+        self.user = _user_with_history("archive", 3, session_id="archive-session")
+        self.old = list(ChatHistory.objects.filter(user=self.user).order_by("id")[:2])
+        ChatHistory.objects.filter(id__in=[row.id for row in self.old]).update(
+            created_at=timezone.now() - timedelta(days=200), response_text="A long answer. " * 200
+        )
+
+    def test_archives_only_old_rows_and_blanks_hot_copy(self):
+        out = StringIO()
+        call_command("archive_chat_history", "--older-than-days", "30", "--batch-size", "1", stdout=out)
+        self.assertIn("Archived 2 chat history row(s) in 2 batch(es).", out.getvalue())
+
+        rows = {row.id: row for row in ChatHistory.objects.filter(user=self.user)}
+        for old in self.old:
+            self.assertEqual(rows[old.id].response_text, "")
+            self.assertIsNotNone(rows[old.id].archived_at)
+        stored = ChatHistoryArchive.objects.get(history_id=self.old[0].id)
+        self.assertLess(len(bytes(stored.payload)), stored.original_size)
+        self.assertEqual(ChatHistory.objects.filter(archived_at__isnull=True).count(), 1)
+
+        # Re-running is a no-op.
+        self.assertEqual(archive.archive_batch(timedelta(days=30)), 0)
+
+    def test_history_list_and_shared_chat_rehydrate(self):
+        archive.archive_batch(timedelta(days=30))
+        expected = "A long answer. " * 200
+
+        self.client.force_authenticate(self.user)
+        history = self.client.get("/api/ai/history/").json()
+        answers = {item["id"]: item["response_text"] for item in history}
+        self.assertEqual(answers[self.old[0].id], expected)
+
+        member = User.objects.create_user(username="archive-member")
+        share = ShareLink.objects.create(created_by=self.user, resource_type="chat", session_id="archive-session")
+        ShareMember.objects.create(share=share, user=member)
+        self.client.force_authenticate(member)
+        messages = self.client.get(f"/api/share/links/{share.token}/chat/").json()["messages"]
+        self.assertIn(expected, [message["content"] for message in messages])
+
+    def test_codecs_round_trip(self):
+        codecs = ["zlib"] + (["zstd"] if compression.zstandard else [])
+        for codec in codecs:
+            with self.subTest(codec=codec):
+                self.assertEqual(archive.decompress(*archive.compress("ünïcode " * 50, codec)), "ünïcode " * 50)
+
+
+class HistorySummaryTests(APITestCase):
+    def test_summary_projects_json_keys_without_answer(self):
+        user = _user_with_history("summary", 2, session_id="s-1")
+        self.client.force_authenticate(user)
+        response = self.client.get("/api/ai/history/?summary=1")
+        self.assertEqual(response.status_code, 200)
+        rows = response.json()
+        self.assertEqual(sorted(rows[0]), ["created_at", "id", "mode", "question", "session_id"])
+        self.assertEqual({row["session_id"] for row in rows}, {"s-1"})
+        self.assertEqual({row["question"] for row in rows}, {"Question 0", "Question 1"})
+
+    def test_fast_path_matches_serializers(self):
+        user = _user_with_history("fastpath", 3)
+        ChatHistory.objects.filter(pk=ChatHistory.objects.filter(user=user).first().pk).update(
+            created_at=timezone.now() - timedelta(days=400)
+        )
+        archive.archive_batch(timedelta(days=1))
+        self.client.force_authenticate(user)
+        queryset = ChatHistory.objects.filter(user=user).order_by("-created_at")
+        summaries = queryset.values(
+            "id", "mode", "created_at", session_id=KT("input_data__session_id"), question=KT("input_data__question")
+        )
+
+        for path, serializer in (
+            ("/api/ai/history/", ChatHistorySerializer(queryset, many=True)),
+            ("/api/ai/history/?summary=1", ChatHistorySummarySerializer(summaries, many=True)),
+        ):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path).content, JSONRenderer().render(serializer.data))
+
+
+class HistoryConditionalGetTests(APITestCase):
+    def test_new_answer_invalidates_etag(self):
+        user = _user_with_history("poll", 2)
+        self.client.force_authenticate(user)
+        etag = self.client.get("/api/ai/history/")["ETag"]
+        self.assertEqual(self.client.get("/api/ai/history/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        ChatHistory.objects.create(user=user, mode="general", input_data={"question": "q"}, response_text="a")
+        self.assertEqual(self.client.get("/api/ai/history/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class SessionManagementTests(APITestCase):
+    def setUp(self):
+        self.user = _user_with_history("sessions", 4, session_id="a")
+        self.rows = list(ChatHistory.objects.filter(user=self.user).order_by("id"))
+        self.other = _user_with_history("bystander", 1, session_id="a")
+
+    def _sessions(self, user=None):
+        return list(
+            ChatHistory.objects.filter(user=user or self.user).order_by("id").values_list(
+                KT("input_data__session_id"), flat=True
+            )
+        )
+
+    def test_split_then_merge(self):
+        new_id, moved = sessions.split(self.user, "a", [row.id for row in self.rows[2:]], "b")
+        self.assertEqual((new_id, moved), ("b", 2))
+        self.assertEqual(self._sessions(), ["a", "a", "b", "b"])
+        self.assertEqual(ChatHistory.objects.get(pk=self.rows[2].pk).input_data["question"], "Question 2")
+
+        self.assertEqual(sessions.merge(self.user, ["a", "b"], "c"), 4)
+        self.assertEqual(self._sessions(), ["c"] * 4)
+        self.assertEqual(self._sessions(self.other), ["a"])
+
+    def test_assign_is_one_update_and_refreshes_history_etag(self):
+        self.client.force_authenticate(self.user)
+        etag = self.client.get("/api/ai/history/?summary=1")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(3):
+            # SAVEPOINT, UPDATE, RELEASE
+            self.assertEqual(sessions.assign(self.user, [row.id for row in self.rows], "shared"), 4)
+        response = self.client.get("/api/ai/history/?summary=1", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({row["session_id"] for row in response.json()}, {"shared"})
+
+
+PROJECT_ANSWER = """# Water Harvesting in Gokwe
+
+## Stage 1: Problem Identification
+1) Villagers walk **5 km** for water.
+2) Rain runs off *unused*.
+
+- Survey homes
+- Interview elders
+
+| Method | Cost |
+|---|---|
+| Tanks | $200 |
+"""
+
+
+@override_settings(JOBS_ALWAYS_EAGER=True)
+class ProjectExportTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="exporter")
+        self.client.force_authenticate(self.user)
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(EXPORT_DIR=self.directory))
+        self.item = ChatHistory.objects.create(
+            user=self.user, mode="project", input_data={"project_name": "Water harvesting"}, response_text=PROJECT_ANSWER
+        )
+        self.url = f"/api/ai/history/{self.item.id}/export/"
+
+    def _download(self, **headers):
+        response = self.client.get(self.url, **headers)
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_export_uses_the_zimsec_layout(self):
+        response, body = self._download()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], export.CONTENT_TYPE)
+        self.assertIn('filename="water-harvesting.docx"', response["Content-Disposition"])
+
+        document = rendering.docx.Document(io.BytesIO(body))
+        section = document.sections[0]
+        self.assertEqual((round(section.page_width.mm), round(section.page_height.mm)), (210, 297))
+        self.assertEqual((section.left_margin.inches, section.right_margin.inches), (1.5, 1.0))
+        normal = document.styles["Normal"]
+        self.assertEqual((normal.font.name, normal.font.size.pt), ("Times New Roman", 12))
+        self.assertEqual(normal.paragraph_format.line_spacing, 1.5)
+        paragraphs = [(paragraph.style.name, paragraph.text) for paragraph in document.paragraphs]
+        self.assertEqual(paragraphs[:4], [
+            ("Heading 1", "Water Harvesting in Gokwe"),
+            ("Heading 2", "Stage 1: Problem Identification"),
+            ("List Paragraph", "1) Villagers walk 5 km for water."),
+            ("List Paragraph", "2) Rain runs off unused."),
+        ])
+        self.assertTrue(document.paragraphs[2].runs[1].bold)
+        self.assertEqual(document.tables[0].rows[1].cells[1].text, "$200")
+
+    def test_repeat_downloads_are_served_from_disk(self):
+        first, body = self._download()
+        with mock.patch("ai.export.processes.get_pool") as get_pool:
+            again, same = self._download()
+            partial, part = self._download(HTTP_RANGE="bytes=0-99")
+            unchanged, _ = self._download(HTTP_IF_NONE_MATCH=first["ETag"])
+        get_pool.assert_not_called()
+        self.assertEqual((again.status_code, same), (200, body))
+        self.assertEqual((partial.status_code, part), (206, body[:100]))
+        self.assertEqual(unchanged.status_code, 304)
+
+        self.item.response_text += "\nMore findings."
+        self.item.save()
+        changed, _ = self._download(HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], first["ETag"])
+
+    def test_only_own_project_answers(self):
+        other = ChatHistory.objects.create(user=self.user, mode="general", input_data={}, response_text="Hi")
+        self.assertEqual(self.client.get(f"/api/ai/history/{other.id}/export/").status_code, 400)
+        stranger = User.objects.create_user(username="stranger")
+        self.client.force_authenticate(stranger)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_deleting_history_removes_exports(self):
+        self._download()
+        user_dir = Path(self.directory) / str(self.user.id)
+        self.assertEqual(len(list(user_dir.glob("*.docx"))), 1)
+        self.client.delete(f"/api/ai/history/{self.item.id}/delete/")
+        self.assertFalse(user_dir.exists())
+
+    @override_settings(JOBS_ALWAYS_EAGER=False)
+    def test_cold_export_is_rendered_by_a_background_job(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.client.get(response.data["status_url"]).data["kind"], "project_export")
+        # Requests while the render is pending share its job.
+        self.assertEqual(self.client.get(self.url).data["job_id"], response.data["job_id"])
+
+    def test_render_failure_answers_500(self):
+        with mock.patch("ai.export._render", side_effect=ValueError("bad table")), self.assertLogs("core.jobs"):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.data, {"detail": "The export could not be rendered."})
+
+    def test_render_timeout_answers_503(self):
+        with override_settings(EXPORT_RENDER_TIMEOUT=0), mock.patch("ai.export.processes.discard") as discard, \
+                self.assertLogs("core.jobs"):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+        discard.assert_called_once()
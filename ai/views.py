@@ -1,121 +1,22 @@
-from django.conf import settings
-from openai import OpenAI
+from django.db.models import Count, Max
 from rest_framework.generics import ListAPIView, DestroyAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 import logging
+from django.utils.http import quote_etag
+from core import conditional, deletion, fastjson, jobs, ranges
+from search import index as note_index
+from search import indexing
+from . import export, llm, prompts, sessions
+from .deletion import delete_chat_history
 from .models import ChatHistory
-from .serializers import ChatHistorySerializer
+from .serializers import ChatHistorySerializer, ChatHistorySummarySerializer
+from .structs import history_rows, history_summary_rows
 
 logger = logging.getLogger(__name__)
 
 
-def _get_client():
-    api_key = getattr(settings, "OPENROUTER_API_KEY", None)
-    base_url = getattr(settings, "OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
-    if not api_key:
-        return None
-    return OpenAI(api_key=api_key, base_url=base_url)
-
-
-def _chat(messages, model=None, temperature=0.7):
-    client = _get_client()
-    if client is None:
-        raise RuntimeError("OpenRouter API key missing")
-
-    model = model or getattr(settings, "OPENROUTER_DEFAULT_MODEL", "openai/gpt-4o-mini")
-    return client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=temperature,
-    )
-
-
-def _extract_text(completion):
-    if not completion or not completion.choices:
-        return ""
-    return completion.choices[0].message.content or ""
-
-
-def _ree_identity():
-    return (
-        "You are REE (Research, Explain, Elevate), the user's study, project, and exam companion. "
-        "You must follow the selected mode rules strictly."
-    )
-
-
-def _is_project_request(text):
-    if not text:
-        return False
-    lowered = text.lower()
-    keywords = ["project", "zimsec", "proposal", "title page", "abstract", "literature review", "methodology"]
-    return any(k in lowered for k in keywords)
-
-
-def _project_formatting_rules():
-    return (
-        "Formatting rules (Project Mode only): A4 paper, Times New Roman, font size 12, "
-        "line spacing 1.5, margins: left 1.5\", right 1\", top 1\", bottom 1\"."
-    )
-
-
-def _project_template():
-    return (
-        "Use ONLY the Standard ZIMSEC Project Framework and report structure. "
-        "Include all mandatory stages and headings.\n"
-        "Mandatory stages (include in order with typical marks):\n"
-        "1) Problem Identification (5 marks)\n"
-        "2) Investigation of Ideas (10 marks)\n"
-        "3) Generation of Ideas (10 marks)\n"
-        "4) Development/Refinement (10 marks)\n"
-        "5) Presentation of Results (10 marks)\n"
-        "6) Evaluation & Recommendations (5 marks)\n"
-        "General report structure (use these formal headings):\n"
-        "Title Page\n"
-        "Table of Contents\n"
-        "Introduction\n"
-        "Research Methodology\n"
-        "Findings & Analysis\n"
-        "Appendices"
-    )
-
-
-def _project_subject_rules(subject):
-    subject_lower = (subject or "").lower()
-    if "science" in subject_lower:
-        return (
-            "Science/Geography: expand Research Methodology and Findings & Analysis with clear "
-            "environmental or experimental evidence. Use the 6 stages."
-        )
-    if "math" in subject_lower:
-        return (
-            "Mathematics: include relevant calculations, formulas, and worked examples tied to "
-            "real-life data (profits, surveys, measurements, modeling)."
-        )
-    if "computer" in subject_lower or "ict" in subject_lower:
-        return (
-            "Computer Science/ICT (4021): include system analysis approach with Section A "
-            "(Investigation), Section B (Design), Section C (Development), and Section D "
-            "(Testing/Evaluation)."
-        )
-    if "english" in subject_lower or "shona" in subject_lower:
-        return (
-            "Languages: focus on communication strategies, literacy improvements, or cultural "
-            "preservation as appropriate."
-        )
-    if "heritage" in subject_lower:
-        return "Include local history, culture, traditions, and community knowledge."
-    return ""
-
-
-def _originality_rules():
-    return (
-        "Originality and safety rules: Never copy content directly. Rewrite everything originally. "
-        "Localize examples. Avoid plagiarism. Match ZIMSEC expectations."
-    )
-
-
 def _normalize_history(raw_history, max_items=10):
     if not isinstance(raw_history, list):
         return []
@@ -133,6 +34,33 @@ def _normalize_history(raw_history, max_items=10):
     return cleaned[-max_items:]
 
 
+def _note_excerpts(request, query):
+    """Passages of the user's notes relevant to ``query``, optionally limited to ``note_ids``."""
+    note_ids = request.data.get("note_ids")
+    if isinstance(note_ids, list):
+        note_ids = [note_id for note_id in note_ids if isinstance(note_id, int)]
+    else:
+        note_ids = None
+    if not isinstance(query, str) or not query.strip():
+        return []
+    try:
+        return note_index.search_notes(request.user.id, query, note_ids=note_ids)
+    except Exception:
+        logger.exception("Note retrieval failed")
+        return []
+
+
+def _with_excerpts(messages, excerpts):
+    """``messages`` with the excerpts as a system message after the first one."""
+    if not excerpts:
+        return messages
+    return [messages[0], {"role": "system", "content": prompts.notes_context(excerpts)}, *messages[1:]]
+
+
+def _sources(excerpts):
+    return [{"note_id": excerpt["note_id"], "title": excerpt["title"], "score": excerpt["score"]} for excerpt in excerpts]
+
+
 def _save_history(request, mode, input_data, response_text):
     try:
         history = ChatHistory.objects.create(
@@ -141,6 +69,7 @@ def _save_history(request, mode, input_data, response_text):
             input_data=input_data,
             response_text=response_text,
         )
+        indexing.schedule_history(history)
         return history
     except Exception:
         logger.exception("Failed to save AI chat history")
@@ -152,6 +81,7 @@ class StudyModeView(APIView):
 
     def post(self, request):
         notes = request.data.get("notes", "")
+        question = request.data.get("question", "")
         task = request.data.get("task", "explain")  # summarize / explain / quiz
         action = request.data.get("action", "")
         if action:
@@ -159,7 +89,7 @@ class StudyModeView(APIView):
         history = _normalize_history(request.data.get("history"))
 
         system_prompt = (
-            f"{_ree_identity()} "
+            f"{prompts.ree_identity()} "
             "Mode: STUDY. Behave Socratically: ask guiding questions, explain step-by-step, "
             "and break content into small chunks."
         )
@@ -172,21 +102,29 @@ class StudyModeView(APIView):
         elif task == "simplify":
             system_prompt += " Simplify the topic into very easy language."
 
+        # Without pasted notes, the passages of the user's saved notes that
+        # match ``question`` stand in for them.
+        excerpts = [] if isinstance(notes, str) and notes.strip() else _note_excerpts(request, question)
         try:
-            completion = _chat(
-                [
-                    {"role": "system", "content": system_prompt},
-                    *history,
-                    {"role": "user", "content": notes},
-                ]
+            completion = llm.chat(
+                _with_excerpts(
+                    [
+                        {"role": "system", "content": system_prompt},
+                        *history,
+                        {"role": "user", "content": notes or question},
+                    ],
+                    excerpts,
+                )
             )
         except Exception:
             logger.exception("AI request failed")
             return Response({"error": "AI service error"}, status=502)
 
-        result_text = _extract_text(completion)
+        result_text = llm.extract_text(completion)
         history = _save_history(request, "study", request.data, result_text)
-        return Response({"result": result_text, "history_id": history.id if history else None})
+        return Response(
+            {"result": result_text, "history_id": history.id if history else None, "sources": _sources(excerpts)}
+        )
 
 
 class ProjectModeView(APIView):
@@ -213,7 +151,7 @@ class ProjectModeView(APIView):
                 "Use subject-specific rules. Localize examples. Examiner-safe language."
             )
 
-        subject_rules = _project_subject_rules(subject)
+        subject_rules = prompts.project_subject_rules(subject)
 
         user_context = []
         if project_name:
@@ -226,16 +164,16 @@ class ProjectModeView(APIView):
             user_context.append(f"Additional info: {details}")
 
         try:
-            completion = _chat(
+            completion = llm.chat(
                 [
                     {
                         "role": "system",
                         "content": (
-                            f"{_ree_identity()} "
+                            f"{prompts.ree_identity()} "
                             "Mode: PROJECT (ZIMSEC). "
-                            f"{_project_template()} "
-                            f"{_project_formatting_rules()} "
-                            f"{_originality_rules()} "
+                            f"{prompts.project_template()} "
+                            f"{prompts.project_formatting_rules()} "
+                            f"{prompts.originality_rules()} "
                             f"{subject_rules}"
                         ),
                     },
@@ -248,7 +186,7 @@ class ProjectModeView(APIView):
             logger.exception("AI request failed")
             return Response({"error": "AI service error"}, status=502)
 
-        project_text = _extract_text(completion)
+        project_text = llm.extract_text(completion)
         history = _save_history(request, "project", request.data, project_text)
         return Response({"project": project_text, "history_id": history.id if history else None})
 
@@ -259,7 +197,7 @@ class GeneralModeView(APIView):
     def post(self, request):
         question = request.data.get("question", "")
         history = _normalize_history(request.data.get("history"))
-        if _is_project_request(question):
+        if prompts.is_project_request(question):
             return Response(
                 {
                     "answer": (
@@ -268,28 +206,36 @@ class GeneralModeView(APIView):
                     )
                 }
             )
+        # Retrieval syncs the user's index, so it waits until the question
+        # is known to need an answer.
+        excerpts = _note_excerpts(request, question) if request.data.get("use_notes") is True else []
         try:
-            completion = _chat(
-                [
-                    {
-                        "role": "system",
-                        "content": (
-                            f"{_ree_identity()} "
-                            "Mode: GENERAL. Provide direct answers with simple explanations. "
-                            "Ask a brief follow-up question if needed."
-                        ),
-                    },
-                    *history,
-                    {"role": "user", "content": question},
-                ]
+            completion = llm.chat(
+                _with_excerpts(
+                    [
+                        {
+                            "role": "system",
+                            "content": (
+                                f"{prompts.ree_identity()} "
+                                "Mode: GENERAL. Provide direct answers with simple explanations. "
+                                "Ask a brief follow-up question if needed."
+                            ),
+                        },
+                        *history,
+                        {"role": "user", "content": question},
+                    ],
+                    excerpts,
+                )
             )
         except Exception:
             logger.exception("AI request failed")
             return Response({"error": "AI service error"}, status=502)
 
-        answer_text = _extract_text(completion)
+        answer_text = llm.extract_text(completion)
         history = _save_history(request, "general", request.data, answer_text)
-        return Response({"answer": answer_text, "history_id": history.id if history else None})
+        return Response(
+            {"answer": answer_text, "history_id": history.id if history else None, "sources": _sources(excerpts)}
+        )
 
 
 class NotesAIView(APIView):
@@ -300,7 +246,7 @@ class NotesAIView(APIView):
         action = request.data.get("action", "summarize")  # summarize / explain / understandable
 
         system_prompt = (
-            f"{_ree_identity()} Mode: STUDY (Notes Integration). "
+            f"{prompts.ree_identity()} Mode: STUDY (Notes Integration). "
             "Work only with the provided note. Be concise and helpful."
         )
         if action == "summarize":
@@ -313,7 +259,7 @@ class NotesAIView(APIView):
             system_prompt += " Turn the notes into study questions with short answers."
 
         try:
-            completion = _chat(
+            completion = llm.chat(
                 [
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": note_content},
@@ -323,7 +269,7 @@ class NotesAIView(APIView):
             logger.exception("AI request failed")
             return Response({"error": "AI service error"}, status=502)
 
-        updated_text = _extract_text(completion)
+        updated_text = llm.extract_text(completion)
         history = _save_history(request, "notes", request.data, updated_text)
         return Response({"updated_note": updated_text, "history_id": history.id if history else None})
 
@@ -332,20 +278,52 @@ class ChatHistoryListView(ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = ChatHistorySerializer
 
+    def _summary(self):
+        return self.request.query_params.get("summary") in ("1", "true")
+
+    def get_serializer_class(self):
+        return ChatHistorySummarySerializer if self._summary() else ChatHistorySerializer
+
     def get_queryset(self):
         return ChatHistory.objects.filter(user=self.request.user).order_by("-created_at")
 
+    def list(self, request, *args, **kwargs):
+        # Same JSON as the serializers, built from values() rows via msgspec.
+        # Archiving never changes the rendered answers; session moves bump
+        # the version (see ai/sessions.py).
+        queryset = self.get_queryset()
+        rows = history_summary_rows if self._summary() else history_rows
+        version = conditional.version(sessions.history_version_scope(request.user.id))
+        return conditional.respond(
+            request,
+            conditional.for_queryset(request, queryset, "created_at", request.user.id, version),
+            lambda: Response(fastjson.encode(rows(queryset))),
+        )
+
 
 class DeleteAllHistoryView(DestroyAPIView):
     """Delete all chat history for the authenticated user"""
     permission_classes = [IsAuthenticated]
 
     def delete(self, request, *args, **kwargs):
-        deleted_count, _ = ChatHistory.objects.filter(user=request.user).delete()
-        return Response({
-            "detail": f"Successfully deleted {deleted_count} history items.",
-            "deleted_count": deleted_count
-        })
+        pending = ChatHistory.objects.filter(user=request.user).aggregate(count=Count("id"), last_id=Max("id"))
+        if not pending["count"]:
+            return Response({
+                "detail": "Successfully deleted 0 history items.",
+                "deleted_count": 0
+            })
+        # Large histories are deleted in batches in the background; rows
+        # created after this request are left alone.
+        job_id = deletion.schedule("chat_history_deletion", delete_chat_history, request.user.id, pending["last_id"])
+        return Response(
+            {
+                "detail": f"Deleting {pending['count']} history items.",
+                "pending_count": pending["count"],
+                "job_id": job_id,
+                "status_url": f"/api/jobs/{job_id}/",
+            },
+            status=202,
+        )
 
 
 class DeleteHistoryItemView(DestroyAPIView):
@@ -356,10 +334,54 @@ class DeleteHistoryItemView(DestroyAPIView):
         history_id = kwargs.get('id')
         deleted, _ = ChatHistory.objects.filter(id=history_id, user=request.user).delete()
         if deleted:
+            indexing.forget(request.user.id)
+            export.forget(request.user.id)
             return Response({"detail": "History item deleted successfully."})
         return Response({"detail": "History item not found."}, status=404)
 
 
+class ExportHistoryItemView(APIView):
+    """
+    Download a Project Mode answer as a .docx in the ZIMSEC layout. Rendered
+    once by a background job (202 with the job until then), then served from
+    disk (ETag, Range requests).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, id):
+        history = ChatHistory.objects.filter(id=id, user=request.user).first()
+        if history is None:
+            return Response({"detail": "History item not found."}, status=404)
+        if history.mode != "project":
+            return Response({"detail": "Only Project Mode answers can be exported."}, status=400)
+        artifact_key = export.key(history)
+        etag, filename = quote_etag(artifact_key), export.filename(history)
+        # The key hashes the answer, so a matching ETag needs no file at all.
+        cached = ranges.not_modified(request, etag, filename, export.CONTENT_TYPE)
+        if cached is not None:
+            return cached
+        path = export.cached_path(history, artifact_key)
+        if path is None:
+            job_id = export.schedule_render(history, artifact_key)
+            state = jobs.get(job_id) or {}
+            if state.get("status") == "failed":
+                if state.get("error") == export.RenderTimeout.__name__:
+                    return Response({"detail": "The export is taking too long. Try again shortly."}, status=503)
+                return Response({"detail": "The export could not be rendered."}, status=500)
+            # Finished already when jobs run eagerly.
+            path = export.cached_path(history, artifact_key)
+            if path is None:
+                return Response(
+                    {
+                        "detail": "The export is being prepared.",
+                        "job_id": job_id,
+                        "status_url": f"/api/jobs/{job_id}/",
+                    },
+                    status=202,
+                )
+        return ranges.file_response(request, path, export.CONTENT_TYPE, filename, etag)
+
+
 class AiApiIndexView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class AuthapiConfig(AppConfig):
     name = 'authapi'
+
+    def ready(self):
+        from . import emails  # noqa: F401  (registers outbox builders)
@@ -0,0 +1,237 @@
+"""
+Full-account data export.
+
+An export holds the user's notes, chat history (archived answers included)
+and shares, encoded with ``core.fastjson`` one record per line. It comes as
+NDJSON, a header line, then ``{"type": ..., "data": ...}`` records, then an
+``end`` line with the record counts, so a truncated download is detectable.
+Or it comes as a zip of one ``<section>.ndjson`` file per section plus a
+``manifest.json`` with the same header and counts.
+
+Rows are read ``ACCOUNT_EXPORT_CHUNK_SIZE`` at a time with keyset
+pagination (``core.keyset``; one query per chunk, so memory stays bounded
+with client-side cursors too) and written as they arrive, and the zip is
+produced through a non-seekable sink, so memory stays flat however large
+the account is.
+
+``AccountExportView`` streams small accounts directly. Accounts with more
+than ``ACCOUNT_EXPORT_STREAM_MAX_ROWS`` records, or any account on request,
+are exported by ``build`` as a background job into ``ACCOUNT_EXPORT_DIR``;
+the finished file is downloaded with Range support (``core.ranges``), so an
+interrupted download resumes where it stopped. Files are removed after
+``JOBS_RESULT_TTL`` seconds, when the job status expires too.
+
+Share tokens are left out: anyone holding one can open the share.
+"""
+import io
+import os
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+from operator import itemgetter
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.utils import timezone
+
+from ai.models import ChatHistory
+from ai.structs import iter_history_rows
+from core import fastjson, keyset
+from notes.models import Note
+from notes.structs import iter_note_rows
+from sharing.models import ShareInvite, ShareLink, ShareMember
+
+FORMAT = "zim-account-export"
+FORMAT_VERSION = 1
+NDJSON_TYPE = "application/x-ndjson"
+ZIP_TYPE = "application/zip"
+JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+STREAM_BLOCK = 64 * 1024
+
+
+def _chunk_size():
+    return getattr(settings, "ACCOUNT_EXPORT_CHUNK_SIZE", 500)
+
+
+def _sections(user_id):
+    """``(name, queryset, rows)`` per section; ``rows(queryset, chunk_size)`` yields encodable rows."""
+    return [
+        ("notes", Note.objects.filter(user_id=user_id), iter_note_rows),
+        ("chat_history", ChatHistory.objects.filter(user_id=user_id), iter_history_rows),
+        ("share_links", ShareLink.objects.filter(created_by_id=user_id), _share_links),
+        ("share_memberships", ShareMember.objects.filter(user_id=user_id), _share_memberships),
+        (
+            "share_invites",
+            ShareInvite.objects.filter(Q(invited_user_id=user_id) | Q(invited_by_id=user_id)),
+            _share_invites(user_id),
+        ),
+    ]
+
+
+def _values(queryset, fields, chunk_size, key="id"):
+    """``values()`` rows in ``key`` order, ``chunk_size`` per query; ``key`` is dropped from the rows."""
+    for row in keyset.rows(queryset.values(*fields, key), chunk_size, itemgetter(key), key):
+        del row[key]
+        yield row
+
+
+def _share_links(queryset, chunk_size):
+    fields = ("resource_type", "session_id", "note_id", "permission", "created_at", "revoked_at")
+    return _values(queryset, fields, chunk_size, key="token")
+
+
+def _share_memberships(queryset, chunk_size):
+    fields = ("share__resource_type", "share__session_id", "share__note_id", "role", "added_at")
+    return _values(queryset, fields, chunk_size)
+
+
+def _share_invites(user_id):
+    def rows(queryset, chunk_size):
+        fields = (
+            "share__resource_type", "invited_user_id", "invited_by__username", "status", "created_at", "responded_at"
+        )
+        for row in _values(queryset, fields, chunk_size):
+            row["direction"] = "received" if row.pop("invited_user_id") == user_id else "sent"
+            yield row
+
+    return rows
+
+
+def count_records(user_id):
+    return sum(queryset.count() for _, queryset, _ in _sections(user_id))
+
+
+def _header(user_id):
+    user = User.objects.filter(pk=user_id).values("id", "username", "email", "date_joined").first()
+    return {"format": FORMAT, "version": FORMAT_VERSION, "generated_at": timezone.now(), "user": user}
+
+
+def _section_rows(user_id, progress=None):
+    """``(section, rows)`` pairs; ``progress(done)`` is called once per chunk of records across sections."""
+    chunk_size = _chunk_size()
+    done = 0
+
+    def counted(rows):
+        nonlocal done
+        for row in rows:
+            yield row
+            done += 1
+            if progress is not None and done % chunk_size == 0:
+                progress(done)
+
+    for name, queryset, rows in _sections(user_id):
+        yield name, counted(rows(queryset, chunk_size))
+
+
+def ndjson_stream(user_id, progress=None):
+    yield fastjson.dumps({"type": "header", **_header(user_id)}) + b"\n"
+    counts = {}
+    for name, rows in _section_rows(user_id, progress):
+        counts[name] = 0
+        for row in rows:
+            counts[name] += 1
+            yield fastjson.dumps({"type": name, "data": row}) + b"\n"
+    yield fastjson.dumps({"type": "end", "counts": counts}) + b"\n"
+
+
+class _Sink(io.RawIOBase):
+    """Write-only, non-seekable buffer: ``zipfile`` then writes entries without seeking back."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+    def drain(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def zip_stream(user_id, progress=None):
+    sink = _Sink()
+    header = _header(user_id)
+    counts = {}
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, rows in _section_rows(user_id, progress):
+            counts[name] = 0
+            with archive.open(f"{name}.ndjson", "w", force_zip64=True) as entry:
+                for row in rows:
+                    entry.write(fastjson.dumps(row) + b"\n")
+                    counts[name] += 1
+                    if len(sink.buffer) >= STREAM_BLOCK:
+                        yield sink.drain()
+            yield sink.drain()
+        archive.writestr("manifest.json", fastjson.dumps({**header, "counts": counts}))
+    yield sink.drain()
+
+
+def filename(as_zip):
+    return f"account-export-{timezone.now():%Y-%m-%d}.{'zip' if as_zip else 'ndjson'}"
+
+
+# Background exports
+
+def _root():
+    return Path(getattr(settings, "ACCOUNT_EXPORT_DIR", None) or Path(settings.BASE_DIR) / ".account_exports")
+
+
+def path_for(user_id, job_id):
+    """The finished export of job ``job_id`` for this user, or ``None``."""
+    if not JOB_ID.match(job_id or ""):
+        return None
+    directory = _root() / str(int(user_id))
+    for suffix in (".zip", ".ndjson"):
+        path = directory / f"{job_id}{suffix}"
+        if path.exists():
+            return path
+    return None
+
+
+def _sweep(root):
+    cutoff = time.time() - getattr(settings, "JOBS_RESULT_TTL", 24 * 3600)
+    for path in root.glob("*/*"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def build(job, user_id, as_zip):
+    """Background job: write the export to ``ACCOUNT_EXPORT_DIR`` for a resumable download."""
+    root = _root()
+    directory = root / str(int(user_id))
+    directory.mkdir(parents=True, exist_ok=True)
+    _sweep(root)
+    total = count_records(user_id)
+    job.progress(0, total)
+    progress = lambda done: job.progress(done, total)  # noqa: E731
+    stream = zip_stream(user_id, progress) if as_zip else ndjson_stream(user_id, progress)
+
+    handle, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as output:
+            for data in stream:
+                output.write(data)
+        path = directory / f"{job.id}.{'zip' if as_zip else 'ndjson'}"
+        os.replace(temporary, path)
+    except BaseException:
+        Path(temporary).unlink(missing_ok=True)
+        raise
+    job.progress(total, total)
+    return {"records": total, "bytes": path.stat().st_size, "download_url": f"/api/auth/export/{job.id}/"}
+
+
+def forget(user_id):
+    """Remove the user's finished exports (account deletion)."""
+    shutil.rmtree(_root() / str(int(user_id)), ignore_errors=True)
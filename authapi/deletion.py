@@ -0,0 +1,68 @@
+"""
+Background account deletion.
+
+``DeleteUserView`` deactivates the account and revokes its share links in the
+request, then hands the heavy part to ``delete_account`` as a background job
+through ``core.deletion.schedule``, which records it so ``resume_deletions``
+can finish it after a restart (the function is safe to run again).
+Rows are removed children-first in bounded batches (see
+``core.deletion.delete_in_batches``) so no single transaction holds locks on,
+or loads into memory, a heavy user's whole dataset. The ``User`` row itself
+goes last through the regular ``delete()`` for the remaining small relations.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Q
+
+from ai import export
+from ai.models import ChatHistory
+from core.authentication import invalidate_cached_user
+from core.deletion import delete_in_batches
+from notes.models import Note
+from search.models import Chunk
+from sharing import access
+from sharing.models import ShareInvite, ShareLink, ShareMember
+from . import data_export
+
+
+def _steps(user_id):
+    owned_share = Q(share__created_by_id=user_id)
+    return [
+        ("share_invites", ShareInvite.objects.filter(owned_share | Q(invited_user_id=user_id) | Q(invited_by_id=user_id))),
+        ("share_members", ShareMember.objects.filter(owned_share | Q(user_id=user_id))),
+        ("share_links", ShareLink.objects.filter(created_by_id=user_id)),
+        ("search_chunks", Chunk.objects.filter(user_id=user_id)),
+        ("notes", Note.objects.filter(user_id=user_id)),
+        ("chat_history", ChatHistory.objects.filter(user_id=user_id)),
+    ]
+
+
+def delete_account(job, user_id):
+    steps = _steps(user_id)
+    counts = {name: queryset.count() for name, queryset in steps}
+    total = sum(counts.values())
+    job.progress(0, total, step="revoking_shares")
+
+    # Signed share-access tokens skip the DB; make sure none outlive the shares.
+    batch_size = getattr(settings, "DELETION_BATCH_SIZE", 500)
+    tokens = ShareLink.objects.filter(created_by_id=user_id).values_list("token", flat=True)
+    for token in tokens.iterator(chunk_size=batch_size):
+        access.revoke_share(token)
+
+    done = 0
+    deleted = {}
+    for name, queryset in steps:
+        offset = done
+        deleted[name] = delete_in_batches(
+            queryset, batch_size, on_batch=lambda count: job.progress(offset + count, total, step=name)
+        )
+        done += deleted[name]
+
+    user = User.objects.filter(pk=user_id).first()
+    if user is not None:
+        user.delete()
+    invalidate_cached_user(user_id)
+    export.forget(user_id)
+    data_export.forget(user_id)
+    job.progress(done, total, step="done")
+    return {"deleted": deleted}
@@ -0,0 +1,78 @@
+"""
+Outbox builders for authentication emails.
+
+The request path only enqueues the submitted address; the user lookup and
+token generation happen here, in the sender, so the response does not depend
+on whether the account exists.
+"""
+import logging
+
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import EmailMessage
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from mailer.outbox import register
+from .lookups import users_with_email
+
+logger = logging.getLogger(__name__)
+
+
+def _resolve_reset_url_base():
+    explicit = (getattr(settings, "PASSWORD_RESET_URL", "") or "").strip()
+    if explicit:
+        return explicit
+
+    frontend_base = (getattr(settings, "FRONTEND_BASE_URL", "") or "").strip()
+    if frontend_base:
+        return frontend_base
+
+    # Safe fallback to trusted origins configured for this deployment.
+    for source in (
+        getattr(settings, "CSRF_TRUSTED_ORIGINS", []),
+        getattr(settings, "CORS_ALLOWED_ORIGINS", []),
+    ):
+        for origin in source:
+            if isinstance(origin, str) and origin.startswith(("http://", "https://")):
+                return origin.rstrip("/")
+    return ""
+
+
+def _build_reset_link(user):
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    token = default_token_generator.make_token(user)
+    base = _resolve_reset_url_base()
+    if not base:
+        return ""
+    separator = "&" if "?" in base else "?"
+    return f"{base}{separator}uid={uid}&token={token}"
+
+
+@register("password_reset")
+def build_password_reset(payload):
+    user = users_with_email(payload["email"]).first()
+    if user is None:
+        return None
+
+    reset_link = _build_reset_link(user)
+    if reset_link:
+        message = (
+            "You requested a password reset. "
+            f"Use this link to set a new password: {reset_link}"
+        )
+    else:
+        logger.error(
+            "Password reset email link not generated. Configure PASSWORD_RESET_URL or FRONTEND_BASE_URL."
+        )
+        message = (
+            "You requested a password reset. "
+            "Please contact support because reset URL configuration is missing."
+        )
+
+    return EmailMessage(
+        subject="Password reset request",
+        body=message,
+        from_email=getattr(settings, "DEFAULT_FROM_EMAIL", None),
+        to=[user.email],
+    )
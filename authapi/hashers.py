@@ -0,0 +1,64 @@
+"""
+Password hashers whose cost parameters come from settings.
+
+They keep Django's algorithm names, so existing hashes still verify. When the
+configured parameters differ from those stored in a hash, ``must_update``
+returns True and Django re-encodes the password on the next successful login
+(``User.check_password`` calls its setter), moving accounts onto the current
+profile without a reset. ``PASSWORD_HASHER_PROFILE`` picks which hasher new
+hashes use; see ``manage.py benchmark_hashers`` for per-profile cost.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    PBKDF2PasswordHasher,
+    ScryptPasswordHasher,
+)
+
+# OpenSSL refuses scrypt parameters needing more than 32 MiB unless maxmem is raised.
+_SCRYPT_DEFAULT_MAXMEM = 32 * 1024 * 1024
+
+
+def _setting(name, default):
+    value = getattr(settings, name, None)
+    return default if value is None else value
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return _setting("PASSWORD_PBKDF2_ITERATIONS", PBKDF2PasswordHasher.iterations)
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return _setting("PASSWORD_SCRYPT_WORK_FACTOR", ScryptPasswordHasher.work_factor)
+
+    @property
+    def block_size(self):
+        return _setting("PASSWORD_SCRYPT_BLOCK_SIZE", ScryptPasswordHasher.block_size)
+
+    @property
+    def parallelism(self):
+        return _setting("PASSWORD_SCRYPT_PARALLELISM", ScryptPasswordHasher.parallelism)
+
+    @property
+    def maxmem(self):
+        needed = 128 * self.work_factor * self.block_size * 2
+        return 0 if needed <= _SCRYPT_DEFAULT_MAXMEM else needed + 1024 * 1024
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        return _setting("PASSWORD_ARGON2_TIME_COST", Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return _setting("PASSWORD_ARGON2_MEMORY_COST", Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self):
+        return _setting("PASSWORD_ARGON2_PARALLELISM", Argon2PasswordHasher.parallelism)
+
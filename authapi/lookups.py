@@ -0,0 +1,19 @@
+"""
+Case-insensitive email lookups that can use ``auth_user_email_lower_idx``.
+
+``email__iexact`` compiles to ``UPPER(email) = UPPER(%s)`` on Postgres (and
+``LIKE ... ESCAPE`` on SQLite), which no plain index on ``email`` serves.
+Filtering on ``LOWER(email)`` against an already-lowercased value matches the
+functional index created in ``authapi/migrations/0001_email_lower_index.py``.
+"""
+from django.contrib.auth.models import User
+from django.db.models.functions import Lower
+
+
+def normalize_email(email):
+    return (email or "").strip().lower()
+
+
+def users_with_email(email, queryset=None):
+    queryset = User.objects.all() if queryset is None else queryset
+    return queryset.alias(email_lower=Lower("email")).filter(email_lower=normalize_email(email))
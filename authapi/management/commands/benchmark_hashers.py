@@ -0,0 +1,68 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand, CommandError
+
+from authapi.hashers import (
+    TunedArgon2PasswordHasher,
+    TunedPBKDF2PasswordHasher,
+    TunedScryptPasswordHasher,
+)
+
+PROFILES = {
+    "pbkdf2": TunedPBKDF2PasswordHasher,
+    "scrypt": TunedScryptPasswordHasher,
+    "argon2": TunedArgon2PasswordHasher,
+}
+
+
+def _parameters(hasher):
+    if isinstance(hasher, TunedPBKDF2PasswordHasher):
+        return {"iterations": hasher.iterations}
+    if isinstance(hasher, TunedScryptPasswordHasher):
+        return {"work_factor": hasher.work_factor, "block_size": hasher.block_size, "parallelism": hasher.parallelism}
+    return {"time_cost": hasher.time_cost, "memory_cost": hasher.memory_cost, "parallelism": hasher.parallelism}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the CPU cost of hashing one password with each hasher profile, using the "
+        "cost parameters from the current settings. Prints a JSON report (milliseconds)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profile", action="append", choices=sorted(PROFILES), help="Repeatable; default all.")
+        parser.add_argument("--rounds", type=int, default=10)
+
+    def handle(self, *args, **options):
+        if options["rounds"] < 1:
+            raise CommandError("--rounds must be at least 1.")
+
+        current = get_hasher("default")
+        report = {"default_algorithm": current.algorithm, "profiles": {}}
+        for name in options["profile"] or sorted(PROFILES):
+            hasher = PROFILES[name]()
+            try:
+                hasher.encode("warm-up password", hasher.salt())
+            except ValueError as exc:
+                # Argon2 without argon2-cffi installed.
+                report["profiles"][name] = {"error": str(exc)}
+                continue
+
+            samples = []
+            for _ in range(options["rounds"]):
+                salt = hasher.salt()
+                started = time.perf_counter()
+                hasher.encode("correct horse battery staple", salt)
+                samples.append((time.perf_counter() - started) * 1000)
+            samples.sort()
+            report["profiles"][name] = {
+                "parameters": _parameters(hasher),
+                "median_ms": round(statistics.median(samples), 2),
+                "max_ms": round(samples[-1], 2),
+                "logins_per_cpu_second": round(1000 / statistics.median(samples), 1),
+            }
+
+        self.stdout.write(json.dumps(report, indent=2, sort_keys=True))
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+INDEX_NAME = "auth_user_email_lower_idx"
+
+
+def create_index(apps, schema_editor):
+    # CONCURRENTLY avoids locking auth_user for writes while the index builds;
+    # it requires running outside a transaction (atomic = False below).
+    concurrently = "CONCURRENTLY " if schema_editor.connection.vendor == "postgresql" else ""
+    schema_editor.execute(
+        f"CREATE INDEX {concurrently}IF NOT EXISTS {INDEX_NAME} ON auth_user (LOWER(email))"
+    )
+
+
+def drop_index(apps, schema_editor):
+    schema_editor.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
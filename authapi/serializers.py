@@ -3,6 +3,8 @@ from django.contrib.auth.password_validation import validate_password
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
+from .lookups import normalize_email, users_with_email
+
 class RegisterSerializer(serializers.ModelSerializer):
     username = serializers.CharField(
         required=True,
@@ -10,17 +12,19 @@ class RegisterSerializer(serializers.ModelSerializer):
     )
     password = serializers.CharField(write_only=True)
     password_confirm = serializers.CharField(write_only=True)
-    email = serializers.EmailField(
-        required=True,
-        validators=[UniqueValidator(queryset=User.objects.all())],
-    )
+    email = serializers.EmailField(required=True)
 
     class Meta:
         model = User
         fields = ['username', 'email', 'password', 'password_confirm']
 
     def validate_email(self, value):
-        return value.strip().lower()
+        # Checked here rather than with UniqueValidator so the lookup is
+        # case-insensitive and served by the LOWER(email) index.
+        value = normalize_email(value)
+        if users_with_email(value).exists():
+            raise serializers.ValidationError("This field must be unique.")
+        return value
 
     def validate_password(self, value):
         validate_password(value)
@@ -1,3 +1,454 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ai import archive
+from ai.models import ChatHistory
+from core.models import PendingDeletion
+from core.query_guard import QueryCountTestCase
+from notes.models import Note
+from sharing import access
+from sharing.models import ShareLink, ShareMember
+from .lookups import users_with_email
+
+PASSWORD = "Correct-Horse-42"
+
+
+def _user_with_data(username, count):
+    """A user owning ``count`` notes, chat rows and shares (each with a member)."""
+    user = User.objects.create_user(username=username, email=f"{username}@example.com", password=PASSWORD)
+    notes = Note.objects.bulk_create(
+        [Note(user=user, title=f"Note {i}", subject="Maths", category="Revision", content="x") for i in range(count)]
+    )
+    ChatHistory.objects.bulk_create(
+        [
+            ChatHistory(user=user, mode="general", input_data={"question": "q", "session_id": f"s{i}"}, response_text="a")
+            for i in range(count)
+        ]
+    )
+    member = User.objects.create_user(username=f"{username}-member", password=PASSWORD)
+    shares = ShareLink.objects.bulk_create(
+        [ShareLink(created_by=user, resource_type="note", note=note) for note in notes]
+    )
+    ShareMember.objects.bulk_create([ShareMember(share=share, user=member, added_by=user) for share in shares])
+    return user
+
+
+@override_settings(
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    PASSWORD_RESET_URL="https://frontend.example.com/reset-password",
+)
+class AuthApiQueryCountTests(QueryCountTestCase):
+    urlconf = "authapi.urls"
+    url_prefix = "/api/auth/"
+    covered_routes = (
+        "",
+        "register/",
+        "login/",
+        "refresh/",
+        "password-reset/",
+        "password-reset/confirm/",
+        "me/",
+        "users/<int:pk>/set_password/",
+        "users/<int:pk>/delete/",
+        "export/",
+        "export/<str:job_id>/",
+    )
+
+    def test_index(self):
+        self.assertConstantQueries("", "get", lambda scale: (None, "", None))
+
+    def test_register(self):
+        self.assertConstantQueries(
+            "register/",
+            "post",
+            lambda scale: (
+                None,
+                "register/",
+                {
+                    "username": f"newuser{scale}",
+                    "email": f"newuser{scale}@example.com",
+                    "password": PASSWORD,
+                    "password_confirm": PASSWORD,
+                },
+            ),
+            expected_status=201,
+        )
+
+    def test_login(self):
+        def setup(scale):
+            user = _user_with_data(f"login{scale}", scale)
+            return None, "login/", {"username": user.username, "password": PASSWORD}
+
+        self.assertConstantQueries("login/", "post", setup)
+
+    def test_refresh(self):
+        def setup(scale):
+            user = _user_with_data(f"refresh{scale}", scale)
+            return None, "refresh/", {"refresh": str(RefreshToken.for_user(user))}
+
+        self.assertConstantQueries("refresh/", "post", setup)
+
+    def test_password_reset_request(self):
+        def setup(scale):
+            user = _user_with_data(f"reset{scale}", scale)
+            return None, "password-reset/", {"email": user.email}
+
+        self.assertConstantQueries("password-reset/", "post", setup)
+
+    def test_password_reset_confirm(self):
+        def setup(scale):
+            user = _user_with_data(f"confirm{scale}", scale)
+            return None, "password-reset/confirm/", {
+                "uid": urlsafe_base64_encode(force_bytes(user.pk)),
+                "token": default_token_generator.make_token(user),
+                "new_password": "Another-Horse-43",
+            }
+
+        self.assertConstantQueries("password-reset/confirm/", "post", setup)
+
+    def test_me(self):
+        self.assertConstantQueries("me/", "get", lambda scale: (_user_with_data(f"me{scale}", scale), "me/", None))
+
+    def test_set_password(self):
+        def setup(scale):
+            user = _user_with_data(f"setpw{scale}", scale)
+            return user, f"users/{user.id}/set_password/", {"new_password": "Another-Horse-43"}
+
+        self.assertConstantQueries("users/<int:pk>/set_password/", "post", setup)
+
+    def test_delete_user(self):
+        def setup(scale):
+            user = _user_with_data(f"delete{scale}", scale)
+            return user, f"users/{user.id}/delete/", None
+
+        self.assertConstantQueries("users/<int:pk>/delete/", "delete", setup, expected_status=202)
+
+    def test_export(self):
+        self.assertConstantQueries(
+            "export/", "get", lambda scale: (_user_with_data(f"export{scale}", scale), "export/", None)
+        )
+
+    def test_export_download(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+
+        def setup(scale):
+            user = _user_with_data(f"download{scale}", scale)
+            self.client.force_authenticate(user)
+            job_id = self.client.get("/api/auth/export/?background=1").data["job_id"]
+            return user, f"export/{job_id}/", None
+
+        with override_settings(ACCOUNT_EXPORT_DIR=directory, JOBS_ALWAYS_EAGER=True):
+            self.assertConstantQueries("export/<str:job_id>/", "get", setup)
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="cached", email="cached@example.com", password=PASSWORD)
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def _user_queries(self, path="/api/notes/"):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return [q["sql"] for q in context.captured_queries if 'FROM "auth_user"' in q["sql"]]
+
+    def test_second_request_skips_user_lookup(self):
+        self.assertEqual(len(self._user_queries()), 1)
+        self.assertEqual(self._user_queries(), [])
+
+    def test_only_auth_fields_are_cached(self):
+        self._user_queries()
+        self.assertEqual(
+            cache.get(f"jwt-user:{self.user.id}"),
+            {"id": self.user.id, "username": "cached", "email": "cached@example.com", "is_active": True,
+             "is_staff": False},
+        )
+        self.assertEqual(self._user_queries("/api/auth/me/"), [])
+        self.assertEqual(self.client.get("/api/auth/me/").data["username"], "cached")
+
+    def test_set_password_invalidates_cached_user(self):
+        self._user_queries()
+        response = self.client.post(
+            f"/api/auth/users/{self.user.id}/set_password/", {"new_password": "Another-Horse-43"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self._user_queries()), 1)
+
+    def test_deleted_user_is_not_served_from_cache(self):
+        self._user_queries()
+        response = self.client.delete(f"/api/auth/users/{self.user.id}/delete/")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.client.get("/api/notes/").status_code, 401)
+
+
+class EmailLookupTests(APITestCase):
+    def test_lookup_is_case_insensitive(self):
+        user = User.objects.create_user(username="mixed", email="Mixed.Case@Example.com")
+        self.assertEqual(list(users_with_email(" mixed.case@example.COM ")), [user])
+
+    def test_register_rejects_case_variant_duplicate(self):
+        User.objects.create_user(username="first", email="Taken@Example.com")
+        response = self.client.post(
+            "/api/auth/register/",
+            {"username": "second", "email": "taken@example.com", "password": PASSWORD, "password_confirm": PASSWORD},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("email", response.data)
+
+    def test_lookup_uses_functional_index(self):
+        sql, params = users_with_email("a@example.com").query.sql_with_params()
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            elif connection.vendor == "postgresql":
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute(f"EXPLAIN {sql}", params)
+            else:
+                self.skipTest(f"No plan check for {connection.vendor}")
+            plan = " ".join(str(row) for row in cursor.fetchall())
+        self.assertIn("auth_user_email_lower_idx", plan)
+
+
+@override_settings(
+    PASSWORD_HASHERS=["authapi.hashers.TunedScryptPasswordHasher", "authapi.hashers.TunedPBKDF2PasswordHasher"],
+    PASSWORD_SCRYPT_WORK_FACTOR=2**10,
+    PASSWORD_SCRYPT_PARALLELISM=1,
+    PASSWORD_PBKDF2_ITERATIONS=1000,
+)
+class PasswordHasherProfileTests(APITestCase):
+    def _login(self, user):
+        response = self.client.post("/api/auth/login/", {"username": user.username, "password": PASSWORD})
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        return user.password
+
+    def test_hash_from_other_profile_is_upgraded_on_login(self):
+        user = User.objects.create(username="legacy", password=make_password(PASSWORD, hasher="pbkdf2_sha256"))
+        self.assertTrue(self._login(user).startswith("scrypt$1024$"))
+
+    def test_hash_with_stale_parameters_is_upgraded_on_login(self):
+        user = User.objects.create(username="stale")
+        with self.settings(PASSWORD_SCRYPT_WORK_FACTOR=2**11):
+            user.set_password(PASSWORD)
+            user.save()
+        self.assertTrue(user.password.startswith("scrypt$2048$"))
+        self.assertTrue(self._login(user).startswith("scrypt$1024$"))
+
+
+@override_settings(JOBS_ALWAYS_EAGER=True, DELETION_BATCH_SIZE=3)
+class AccountDeletionTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_delete_removes_all_user_data_in_batches(self):
+        user = _user_with_data("heavy", 7)
+        other = User.objects.create_user(username="other")
+        kept = Note.objects.create(user=other, title="Mine", subject="S", category="C", content="x")
+        self.client.force_authenticate(user)
+
+        response = self.client.delete(f"/api/auth/users/{user.id}/delete/")
+        self.assertEqual(response.status_code, 202)
+
+        job = self.client.get(response.data["status_url"]).data
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["progress"]["done"], job["progress"]["total"])
+        self.assertEqual(
+            job["result"]["deleted"],
+            {
+                "share_invites": 0,
+                "share_members": 7,
+                "share_links": 7,
+                "search_chunks": 0,
+                "notes": 7,
+                "chat_history": 7,
+            },
+        )
+        self.assertFalse(User.objects.filter(pk=user.pk).exists())
+        self.assertEqual(list(Note.objects.all()), [kept])
+        self.assertFalse(ChatHistory.objects.exists())
+        self.assertFalse(ShareLink.objects.exists())
+        self.assertFalse(PendingDeletion.objects.exists())
+
+    @override_settings(JOBS_ALWAYS_EAGER=False)
+    def test_account_is_locked_out_before_the_job_runs(self):
+        user = _user_with_data("pending", 2)
+        token = RefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        response = self.client.delete(f"/api/auth/users/{user.id}/delete/")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.client.get(response.data["status_url"]).data["status"], "queued")
+        self.assertEqual(self.client.get("/api/notes/").status_code, 401)
+        self.assertFalse(ShareLink.objects.filter(created_by=user, revoked_at__isnull=True).exists())
+        self.assertEqual(PendingDeletion.objects.get().args, [user.id])
+
+    @override_settings(JOBS_ALWAYS_EAGER=False, SHARE_ACCESS_TOKENS_ENABLED=True)
+    def test_share_access_tokens_are_revoked_before_the_job_runs(self):
+        user = _user_with_data("tokens", 1)
+        share = ShareLink.objects.get(created_by=user)
+        member = User.objects.get(username="tokens-member")
+        request = RequestFactory().get("/", headers={access.HEADER: access.mint(share, member, "viewer")})
+        request.user = member
+        self.assertIsNotNone(access.claims_for(request, share.token))
+
+        self.client.force_authenticate(user)
+        # The job is queued but never runs.
+        with mock.patch("core.jobs._get_executor"), self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f"/api/auth/users/{user.id}/delete/").status_code, 202)
+        self.assertIsNone(access.claims_for(request, share.token))
+
+    @override_settings(JOBS_ALWAYS_EAGER=False)
+    def test_deletion_lost_in_a_restart_is_resumed(self):
+        user = _user_with_data("interrupted", 4)
+        self.client.force_authenticate(user)
+        # The job is queued but never runs, as when the worker is recycled.
+        self.assertEqual(self.client.delete(f"/api/auth/users/{user.id}/delete/").status_code, 202)
+        self.assertTrue(Note.objects.filter(user=user).exists())
+
+        with override_settings(JOBS_ALWAYS_EAGER=True):
+            call_command("resume_deletions", stdout=StringIO())
+            self.assertTrue(User.objects.filter(pk=user.pk).exists(), "fresh deletions are left to their own job")
+            out = StringIO()
+            call_command("resume_deletions", "--older-than", "0", stdout=out)
+
+        self.assertIn("Resumed 1 pending deletion(s).", out.getvalue())
+        self.assertFalse(User.objects.filter(pk=user.pk).exists())
+        self.assertFalse(Note.objects.filter(user_id=user.pk).exists())
+        self.assertFalse(PendingDeletion.objects.exists())
+
+
+def _lines(response):
+    return [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+
+
+@override_settings(JOBS_ALWAYS_EAGER=True)
+class AccountExportTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        settings_override = override_settings(ACCOUNT_EXPORT_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = _user_with_data("exporter", 3)
+        self.client.force_authenticate(self.user)
+
+    def test_ndjson_export_has_every_record_and_no_share_tokens(self):
+        old = ChatHistory.objects.filter(user=self.user).first()
+        ChatHistory.objects.filter(pk=old.pk).update(response_text="archived answer", created_at=old.created_at - timedelta(days=5))
+        archive.archive_batch(timedelta(days=1))
+
+        response = self.client.get("/api/auth/export/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertIn("attachment", response["Content-Disposition"])
+        lines = _lines(response)
+
+        self.assertEqual(lines[0]["type"], "header")
+        self.assertEqual(lines[0]["user"]["username"], "exporter")
+        self.assertEqual(
+            lines[-1],
+            {
+                "type": "end",
+                "counts": {"notes": 3, "chat_history": 3, "share_links": 3, "share_memberships": 0, "share_invites": 0},
+            },
+        )
+        answers = {line["data"]["response_text"] for line in lines if line["type"] == "chat_history"}
+        self.assertIn("archived answer", answers)
+        links = [line["data"] for line in lines if line["type"] == "share_links"]
+        self.assertTrue(all("token" not in link for link in links))
+
+    def test_zip_export_has_a_file_per_section_and_a_manifest(self):
+        response = self.client.get("/api/auth/export/?zip=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/zip")
+
+        with zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content))) as export:
+            manifest = json.loads(export.read("manifest.json"))
+            notes = export.read("notes.ndjson").splitlines()
+            self.assertEqual(
+                sorted(export.namelist()),
+                sorted(["manifest.json", "notes.ndjson", "chat_history.ndjson", "share_links.ndjson",
+                        "share_memberships.ndjson", "share_invites.ndjson"]),
+            )
+        self.assertEqual(manifest["counts"]["notes"], 3)
+        self.assertEqual(len(notes), 3)
+        self.assertEqual(json.loads(notes[0])["title"], "Note 0")
+
+    def test_streaming_reads_in_chunks_with_bounded_queries(self):
+        def consume(user):
+            self.client.force_authenticate(user)
+            with CaptureQueriesContext(connection) as context:
+                lines = _lines(self.client.get("/api/auth/export/"))
+            return lines[1:-1], len(context.captured_queries)
+
+        small = _user_with_data("small", 2)
+        large = _user_with_data("large", 60)
+        with override_settings(ACCOUNT_EXPORT_CHUNK_SIZE=100):
+            small_records, small_queries = consume(small)
+            large_records, large_queries = consume(large)
+        self.assertEqual(len(small_records), 2 * 3)
+        self.assertEqual(len(large_records), 60 * 3)
+        self.assertEqual(small_queries, large_queries)
+
+        # Keyset pages: notes, chat history and share links take 3 queries each (25 + 25 + 10 rows).
+        with override_settings(ACCOUNT_EXPORT_CHUNK_SIZE=25):
+            paged_records, paged_queries = consume(large)
+        self.assertEqual(paged_records, large_records)
+        self.assertEqual(paged_queries, large_queries + 3 * 2)
+
+    def test_large_accounts_are_exported_in_the_background_and_downloads_resume(self):
+        with override_settings(ACCOUNT_EXPORT_STREAM_MAX_ROWS=5):
+            response = self.client.get("/api/auth/export/")
+        self.assertEqual(response.status_code, 202)
+
+        job = self.client.get(response.data["status_url"]).data
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["result"]["records"], 9)
+        url = job["result"]["download_url"]
+
+        download = self.client.get(url)
+        self.assertEqual(download.status_code, 200)
+        self.assertEqual(download["Accept-Ranges"], "bytes")
+        body = b"".join(download.streaming_content)
+        download.close()
+        self.assertEqual(len(body), job["result"]["bytes"])
+        self.assertEqual(json.loads(body.splitlines()[-1])["type"], "end")
+
+        partial = self.client.get(url, HTTP_RANGE="bytes=10-", HTTP_IF_RANGE=download["ETag"])
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(b"".join(partial.streaming_content), body[10:])
+
+        self.client.force_authenticate(User.objects.create_user(username="someone-else"))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get("/api/auth/export/not-a-job/").status_code, 404)
+
+    def test_account_deletion_removes_finished_exports(self):
+        job_id = self.client.get("/api/auth/export/?background=1&zip=1").data["job_id"]
+        self.assertEqual(self.client.get(f"/api/auth/export/{job_id}/").status_code, 200)
+
+        self.client.delete(f"/api/auth/users/{self.user.id}/delete/")
+        self.assertEqual(list(Path(self.directory).iterdir()), [])
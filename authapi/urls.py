@@ -7,6 +7,8 @@ from .views import (
     SetPasswordView,
     DeleteUserView,
     UserProfileView,
+    AccountExportView,
+    AccountExportDownloadView,
 )
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
@@ -18,6 +20,8 @@ urlpatterns = [
     path('password-reset/', PasswordResetRequestView.as_view(), name='password_reset'),
     path('password-reset/confirm/', PasswordResetConfirmView.as_view(), name='password_reset_confirm'),
     path('me/', UserProfileView.as_view(), name='user_profile'),
+    path('export/', AccountExportView.as_view(), name='account_export'),
+    path('export/<str:job_id>/', AccountExportDownloadView.as_view(), name='account_export_download'),
     path('users/<int:pk>/set_password/', SetPasswordView.as_view(), name='set_password'),
     path('users/<int:pk>/delete/', DeleteUserView.as_view(), name='delete_user'),
 ]
@@ -1,17 +1,26 @@
 import logging
 import sys
-from django.db import DatabaseError, IntegrityError
+from functools import partial
 from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
 from django.contrib.auth.models import User
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import send_mail
-from django.utils.encoding import force_bytes
-from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header, quote_etag, urlsafe_base64_decode
 from rest_framework import generics, status
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from core import deletion, jobs, ranges
+from core.authentication import CachedJWTAuthentication, invalidate_cached_user
+from mailer import outbox
+from sharing import access
+from sharing.models import ShareLink
+from . import data_export
+from .deletion import delete_account
+from .lookups import normalize_email
 from .serializers import (
     RegisterSerializer,
     PasswordResetRequestSerializer,
@@ -22,36 +31,6 @@ from .serializers import (
 logger = logging.getLogger(__name__)
 
 
-def _resolve_reset_url_base():
-    explicit = (getattr(settings, "PASSWORD_RESET_URL", "") or "").strip()
-    if explicit:
-        return explicit
-
-    frontend_base = (getattr(settings, "FRONTEND_BASE_URL", "") or "").strip()
-    if frontend_base:
-        return frontend_base
-
-    # Safe fallback to trusted origins configured for this deployment.
-    for source in (
-        getattr(settings, "CSRF_TRUSTED_ORIGINS", []),
-        getattr(settings, "CORS_ALLOWED_ORIGINS", []),
-    ):
-        for origin in source:
-            if isinstance(origin, str) and origin.startswith(("http://", "https://")):
-                return origin.rstrip("/")
-    return ""
-
-
-def _build_reset_link(user):
-    uid = urlsafe_base64_encode(force_bytes(user.pk))
-    token = default_token_generator.make_token(user)
-    base = _resolve_reset_url_base()
-    if not base:
-        return ""
-    separator = "&" if "?" in base else "?"
-    return f"{base}{separator}uid={uid}&token={token}"
-
-
 class RegisterView(generics.CreateAPIView):
     serializer_class = RegisterSerializer
     permission_classes = [AllowAny]
@@ -88,42 +67,11 @@ class PasswordResetRequestView(APIView):
     def post(self, request):
         serializer = PasswordResetRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        email = serializer.validated_data["email"].strip().lower()
+        email = normalize_email(serializer.validated_data["email"])
 
-        user = User.objects.filter(email__iexact=email).first()
-        if user:
-            reset_link = _build_reset_link(user)
-
-            subject = "Password reset request"
-            if reset_link:
-                message = (
-                    "You requested a password reset. "
-                    f"Use this link to set a new password: {reset_link}"
-                )
-            else:
-                message = (
-                    "You requested a password reset. "
-                    "Please contact support because reset URL configuration is missing."
-                )
-
-            try:
-                if not reset_link:
-                    logger.error(
-                        "Password reset email link not generated. Configure PASSWORD_RESET_URL or FRONTEND_BASE_URL."
-                    )
-                send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email=getattr(settings, "DEFAULT_FROM_EMAIL", None),
-                    recipient_list=[user.email],
-                    fail_silently=False,
-                )
-            except Exception:
-                logger.exception("Failed to send password reset email")
-                return Response(
-                    {"detail": "Email service error"},
-                    status=status.HTTP_502_BAD_GATEWAY,
-                )
+        # Constant-time response: the user lookup and SMTP delivery happen in
+        # the outbox sender, never on the request path.
+        outbox.enqueue("password_reset", {"email": email})
 
         return Response(
             {"detail": "If an account exists for this email, a reset link has been sent."}
@@ -152,6 +100,7 @@ class PasswordResetConfirmView(APIView):
 
         user.set_password(new_password)
         user.save(update_fields=["password"])
+        invalidate_cached_user(user.pk)
 
         return Response({"detail": "Password has been reset successfully."})
 
@@ -160,17 +109,28 @@ class SetPasswordView(APIView):
     permission_classes = [IsAuthenticated]
     authentication_classes = [JWTAuthentication]
 
-    def post(self, request):
+    def post(self, request, pk=None):
+        user = request.user
+        if pk is not None and pk != user.id:
+            return Response(
+                {"detail": "You can only change your own password."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
         serializer = SetPasswordSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        user = request.user
         user.set_password(serializer.validated_data["new_password"])
         user.save(update_fields=["password"])
+        invalidate_cached_user(user.pk)
 
         return Response({"detail": "Password has been reset successfully."})
 
 
+def _revoke_access_tokens(share_tokens):
+    for token in share_tokens:
+        access.revoke_share(token)
+
+
 class DeleteUserView(APIView):
     permission_classes = [IsAuthenticated]
     authentication_classes = [JWTAuthentication]
@@ -182,20 +142,90 @@ class DeleteUserView(APIView):
                 {"detail": "You can only delete your own account."},
                 status=status.HTTP_403_FORBIDDEN,
             )
-        try:
-            user.delete()
-        except Exception:
-            logger.exception("Failed to delete user account")
+        # Lock the account out and take its shares offline right away; the
+        # rows themselves are removed in batches by a background job, which
+        # is recorded in the same transaction so a restart cannot lose it.
+        with transaction.atomic():
+            user.is_active = False
+            user.save(update_fields=["is_active"])
+            shares = ShareLink.objects.filter(created_by=user, revoked_at__isnull=True)
+            tokens = list(shares.values_list("token", flat=True))
+            shares.update(revoked_at=timezone.now())
+            # Signed share-access tokens skip the DB; revoke them now, not
+            # when the job gets to it.
+            transaction.on_commit(partial(_revoke_access_tokens, tokens))
+            job_id = deletion.schedule("account_deletion", delete_account, user.pk)
+        invalidate_cached_user(user.pk)
+
+        return Response(
+            {
+                "detail": "Account deletion has started.",
+                "job_id": job_id,
+                "status_url": f"/api/jobs/{job_id}/",
+            },
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class AccountExportView(APIView):
+    """
+    Export all of the user's data. Streams NDJSON (``?zip=1``: a zip of
+    NDJSON files) straight away for accounts of up to
+    ``ACCOUNT_EXPORT_STREAM_MAX_ROWS`` records; larger accounts, or
+    ``?background=1``, get 202 with a job whose result links to a file that
+    supports resumable (Range) downloads.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        as_zip = request.query_params.get("zip") in ("1", "true")
+        background = request.query_params.get("background") in ("1", "true")
+        user_id = request.user.id
+        limit = getattr(settings, "ACCOUNT_EXPORT_STREAM_MAX_ROWS", 5000)
+        if background or data_export.count_records(user_id) > limit:
+            job_id = jobs.submit("account_export", data_export.build, user_id, as_zip)
             return Response(
-                {"detail": "We could not delete your account right now. Please try again later."},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                {
+                    "detail": "The export is being prepared.",
+                    "job_id": job_id,
+                    "status_url": f"/api/jobs/{job_id}/",
+                },
+                status=status.HTTP_202_ACCEPTED,
             )
-        return Response({"detail": "Account has been deleted successfully."})
+
+        stream = data_export.zip_stream(user_id) if as_zip else data_export.ndjson_stream(user_id)
+        response = StreamingHttpResponse(
+            stream, content_type=data_export.ZIP_TYPE if as_zip else data_export.NDJSON_TYPE
+        )
+        response["Content-Disposition"] = content_disposition_header(True, data_export.filename(as_zip))
+        response["Cache-Control"] = "private, no-store"
+        return response
+
+
+class AccountExportDownloadView(APIView):
+    """Download the file of a finished background export; resumable with Range requests."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        path = data_export.path_for(request.user.id, job_id)
+        if path is None:
+            state = jobs.get(job_id) if data_export.JOB_ID.match(job_id) else None
+            if state is not None and state["kind"] == "account_export" and state["status"] in ("queued", "running"):
+                return Response({"detail": "The export is not ready yet."}, status=409)
+            return Response({"detail": "Export not found."}, status=404)
+        as_zip = path.suffix == ".zip"
+        return ranges.file_response(
+            request,
+            path,
+            data_export.ZIP_TYPE if as_zip else data_export.NDJSON_TYPE,
+            data_export.filename(as_zip),
+            quote_etag(job_id),
+        )
 
 
 class UserProfileView(APIView):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
 
     def get(self, request):
         user = request.user
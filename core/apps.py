@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "core"
+
+    def ready(self):
+        from . import caching, dbpool, instrumentation
+
+        instrumentation.register_collector(dbpool.collect)
+        instrumentation.register_collector(caching.collect)
@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from . import routers
+from .instrumentation import timed
+
+# What authentication and permission checks read. Only these are cached (never
+# the password hash); any other field is loaded from the database on access.
+CACHED_FIELDS = ("id", "username", "email", "is_active", "is_staff")
+
+
+def _user_cache_key(user_id):
+    return f"jwt-user:{user_id}"
+
+
+def invalidate_cached_user(user_id):
+    """Drop the cached auth entry for a user (after a password change, deactivation or deletion)."""
+    cache.delete(_user_cache_key(user_id))
+
+
+def _cached_user(fields):
+    model = get_user_model()
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in fields]
+    # Like a queryset with .only(CACHED_FIELDS): save() writes just these fields.
+    return model.from_db(router.db_for_read(model), names, [fields[name] for name in names])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    ``JWTAuthentication`` that keeps the ``CACHED_FIELDS`` of the resolved
+    ``User`` in the cache for ``JWT_USER_CACHE_TTL`` seconds, keyed by user id,
+    so polling clients skip the per-request user query.
+    """
+
+    def authenticate(self, request):
+        with timed("auth"):
+            result = super().authenticate(request)
+        if result is not None:
+            routers.pin_if_recent_write(result[0].id)
+        return result
+
+    def get_user(self, validated_token):
+        ttl = getattr(settings, "JWT_USER_CACHE_TTL", 60)
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if not ttl or user_id is None:
+            return self._get_user_from_primary(validated_token)
+
+        key = _user_cache_key(user_id)
+        fields = cache.get(key)
+        if fields is not None:
+            return _cached_user(fields)
+        user = self._get_user_from_primary(validated_token)
+        cache.set(key, {name: getattr(user, name) for name in CACHED_FIELDS}, ttl)
+        return user
+
+    def _get_user_from_primary(self, validated_token):
+        # A lagging replica could still show a user as active (or with the
+        # old password) right after deactivation or a password change.
+        with routers.primary():
+            return super().get_user(validated_token)
@@ -0,0 +1,297 @@
+"""
+Helpers for the ``bench_api`` management command.
+
+Seeding creates a realistic, reproducible dataset (users with notes, chat
+sessions and shares between them). The driver replays HTTP scenarios
+against a live WSGI server at a fixed concurrency and summarises latency,
+throughput and per-request query counts (read back from the
+``Server-Timing`` header written by ``InstrumentationMiddleware``).
+"""
+import http.client
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ai.models import ChatHistory
+from notes.models import Note
+from sharing.models import ShareLink, ShareMember
+
+SUBJECTS = ["Mathematics", "Geography", "Computer Science", "English", "Heritage Studies", "Biology"]
+CATEGORIES = ["Revision", "Lecture", "Homework", "Project"]
+WORDS = (
+    "photosynthesis equation erosion algorithm variable census rainfall budget "
+    "harvest energy network climate survey analysis fraction triangle velocity "
+    "drought heritage literature culture community market profit evidence method"
+).split()
+
+_QUERIES_RE = re.compile(r'db;[^,]*desc="(\d+) queries"')
+_DB_DUR_RE = re.compile(r"db;dur=([\d.]+)")
+
+
+@contextmanager
+def throwaway_database():
+    """Run the block against a freshly created test database, never real data."""
+    if connection.vendor == "sqlite":
+        handle, db_path = tempfile.mkstemp(prefix="bench-", suffix=".sqlite3")
+        os.close(handle)
+        connection.settings_dict.setdefault("TEST", {})["NAME"] = db_path
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def _text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def seed(users=20, notes_per_user=25, sessions_per_user=5, messages_per_session=8,
+         members_per_share=3, answer_words=400, seed_value=1):
+    """Create benchmark data and return per-user fixtures for the scenarios."""
+    rng = random.Random(seed_value)
+    password = make_password("bench-password-123")
+    User.objects.bulk_create(
+        [
+            User(username=f"bench_user_{i}", email=f"bench_user_{i}@example.com", password=password)
+            for i in range(users)
+        ]
+    )
+    # bulk_create does not return PKs on every backend; re-read in a stable order.
+    created_users = list(User.objects.filter(username__startswith="bench_user_").order_by("id"))
+
+    notes = []
+    histories = []
+    for user in created_users:
+        for n in range(notes_per_user):
+            notes.append(
+                Note(
+                    user=user,
+                    title=f"{rng.choice(SUBJECTS)} note {n}",
+                    subject=rng.choice(SUBJECTS),
+                    category=rng.choice(CATEGORIES),
+                    tags=", ".join(rng.sample(WORDS, 3)),
+                    content=_text(rng, answer_words),
+                )
+            )
+        for s in range(sessions_per_user):
+            session_id = f"bench-{user.id}-{s}"
+            for _ in range(messages_per_session):
+                histories.append(
+                    ChatHistory(
+                        user=user,
+                        mode=rng.choice(["general", "study", "project"]),
+                        input_data={"question": _text(rng, 20), "session_id": session_id},
+                        response_text=_text(rng, answer_words),
+                    )
+                )
+    Note.objects.bulk_create(notes, batch_size=500)
+    ChatHistory.objects.bulk_create(histories, batch_size=500)
+
+    note_ids = {}
+    for note_id, user_id in Note.objects.filter(user__in=created_users).values_list("id", "user_id"):
+        note_ids.setdefault(user_id, []).append(note_id)
+
+    shares = []
+    for user in created_users:
+        shares.append(ShareLink(created_by=user, resource_type="chat", session_id=f"bench-{user.id}-0", permission="collab"))
+        if note_ids.get(user.id):
+            shares.append(ShareLink(created_by=user, resource_type="note", note_id=note_ids[user.id][0], permission="collab"))
+    ShareLink.objects.bulk_create(shares)
+
+    position = {user.id: index for index, user in enumerate(created_users)}
+    members = []
+    for share in shares:
+        owner_index = position[share.created_by_id]
+        for offset in range(1, min(members_per_share, len(created_users) - 1) + 1):
+            member = created_users[(owner_index + offset) % len(created_users)]
+            members.append(ShareMember(share=share, user=member, added_by_id=share.created_by_id))
+    ShareMember.objects.bulk_create(members)
+
+    fixtures = []
+    for user in created_users:
+        member_of = ShareMember.objects.filter(user=user).select_related("share")
+        fixtures.append(
+            {
+                "user_id": user.id,
+                "token": str(RefreshToken.for_user(user).access_token),
+                "note_ids": note_ids.get(user.id, []),
+                "chat_shares": [str(m.share.token) for m in member_of if m.share.resource_type == "chat"],
+                "note_shares": [str(m.share.token) for m in member_of if m.share.resource_type == "note"],
+            }
+        )
+    return fixtures
+
+
+def _scenario_notes_list(fx, rng):
+    return "GET", "/api/notes/", None
+
+
+def _scenario_notes_create(fx, rng):
+    return "POST", "/api/notes/", {
+        "title": "Bench note",
+        "subject": rng.choice(SUBJECTS),
+        "category": rng.choice(CATEGORIES),
+        "tags": rng.sample(WORDS, 2),
+        "content": _text(rng, 200),
+    }
+
+
+def _scenario_notes_update(fx, rng):
+    note_id = rng.choice(fx["note_ids"])
+    return "PUT", f"/api/notes/{note_id}/", {
+        "title": "Bench note (edited)",
+        "subject": rng.choice(SUBJECTS),
+        "category": rng.choice(CATEGORIES),
+        "tags": rng.sample(WORDS, 2),
+        "content": _text(rng, 200),
+    }
+
+
+def _scenario_notes_detail(fx, rng):
+    return "GET", f"/api/notes/{rng.choice(fx['note_ids'])}/", None
+
+
+def _scenario_notes_list_summary(fx, rng):
+    return "GET", "/api/notes/?summary=1", None
+
+
+def _scenario_history_list(fx, rng):
+    return "GET", "/api/ai/history/", None
+
+
+def _scenario_history_list_summary(fx, rng):
+    return "GET", "/api/ai/history/?summary=1", None
+
+
+def _scenario_share_list(fx, rng):
+    return "GET", "/api/share/links/", None
+
+
+def _scenario_share_detail(fx, rng):
+    return "GET", f"/api/share/links/{rng.choice(fx['chat_shares'])}/", None
+
+
+def _scenario_shared_chat(fx, rng):
+    return "GET", f"/api/share/links/{rng.choice(fx['chat_shares'])}/chat/", None
+
+
+def _scenario_shared_note(fx, rng):
+    return "GET", f"/api/share/links/{rng.choice(fx['note_shares'])}/note/", None
+
+
+def _scenario_ai_general(fx, rng):
+    return "POST", "/api/ai/general/", {"question": f"Explain {rng.choice(WORDS)} briefly."}
+
+
+def _scenario_ai_study(fx, rng):
+    return "POST", "/api/ai/study/", {"notes": _text(rng, 150), "task": "summarize"}
+
+
+SCENARIOS = {
+    "notes_list": _scenario_notes_list,
+    "notes_list_summary": _scenario_notes_list_summary,
+    "notes_detail": _scenario_notes_detail,
+    "notes_create": _scenario_notes_create,
+    "notes_update": _scenario_notes_update,
+    "history_list": _scenario_history_list,
+    "history_list_summary": _scenario_history_list_summary,
+    "share_list": _scenario_share_list,
+    "share_detail": _scenario_share_detail,
+    "shared_chat": _scenario_shared_chat,
+    "shared_note": _scenario_shared_note,
+    "ai_general": _scenario_ai_general,
+    "ai_study": _scenario_ai_study,
+}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _request(host, port, method, path, token, body):
+    conn = http.client.HTTPConnection(host, port, timeout=60)
+    headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
+    payload = None
+    if body is not None:
+        payload = json.dumps(body).encode()
+        headers["Content-Type"] = "application/json"
+    started = time.perf_counter()
+    try:
+        conn.request(method, path, body=payload, headers=headers)
+        response = conn.getresponse()
+        content = response.read()
+        elapsed = time.perf_counter() - started
+        timing = response.getheader("Server-Timing") or ""
+    finally:
+        conn.close()
+    queries = _QUERIES_RE.search(timing)
+    db_time = _DB_DUR_RE.search(timing)
+    return {
+        "status": response.status,
+        "elapsed": elapsed,
+        "bytes": len(content),
+        "queries": int(queries.group(1)) if queries else None,
+        "db_ms": float(db_time.group(1)) if db_time else None,
+    }
+
+
+def run_scenario(name, fixtures, host, port, requests=200, concurrency=8, seed_value=1):
+    builder = SCENARIOS[name]
+    rng_lock = threading.Lock()
+    rng = random.Random(f"{seed_value}:{name}")
+
+    def one(index):
+        with rng_lock:
+            fx = fixtures[index % len(fixtures)]
+            method, path, body = builder(fx, rng)
+        return _request(host, port, method, path, fx["token"], body)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+    return summarize(results, wall, concurrency)
+
+
+def summarize(results, wall, concurrency):
+    latencies = sorted(r["elapsed"] * 1000 for r in results)
+    queries = [r["queries"] for r in results if r["queries"] is not None]
+    db_ms = [r["db_ms"] for r in results if r["db_ms"] is not None]
+    statuses = {}
+    for r in results:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    return {
+        "requests": len(results),
+        "concurrency": concurrency,
+        "statuses": statuses,
+        "throughput_rps": round(len(results) / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(latencies[-1], 2) if latencies else 0.0,
+        },
+        "queries": {
+            "mean": round(sum(queries) / len(queries), 2) if queries else None,
+            "max": max(queries) if queries else None,
+        },
+        "db_ms_mean": round(sum(db_ms) / len(db_ms), 2) if db_ms else None,
+        "response_bytes_mean": round(sum(r["bytes"] for r in results) / len(results)) if results else 0,
+    }
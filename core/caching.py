@@ -0,0 +1,275 @@
+"""
+Two-tier cache for computed values.
+
+``TieredCache`` keeps a bounded in-process LRU (L1) in front of a shared
+Django cache (L2, ``CACHES["default"]``)::
+
+    notes_cache = caching.tiered("notes")
+    data = notes_cache.get_or_set(
+        f"summary:{user.id}", lambda: build_summary(user), 300, tags=[f"user:{user.id}"]
+    )
+    notes_cache.invalidate(f"user:{user.id}")
+
+* Keys are namespaced and versioned (``version=``, plus ``CACHE_VERSION``
+  for everything at once).
+* Tags: each tag has a version in L2 and every entry records the versions
+  it was built under, so ``invalidate(tag)`` drops all its entries with one
+  write. Entries whose tag moved on count as misses.
+* Stampede protection: concurrent misses for a key in one process compute
+  once, and ``get_or_set`` recomputes hot entries early with probability
+  rising towards expiry (XFetch), so other processes keep being served the
+  current value instead of all missing at the same moment.
+* L1 entries and tag versions are reused for ``CACHE_L1_TTL`` seconds;
+  changes made by another process reach this one within that window.
+  Cache only what may be that stale, and never access decisions.
+
+Hits, misses and recomputations are exported through ``core.instrumentation``.
+"""
+import math
+import random
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .instrumentation import _format_labels, _format_value
+
+_MISSING = object()
+
+
+class _LRU:
+    """Thread-safe LRU of ``key -> (value, expires_at)`` on the monotonic clock."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISSING
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if self.max_entries <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache:
+    STATS = ("l1_hits", "l2_hits", "misses", "early_recomputes", "invalidations")
+
+    def __init__(self, namespace, alias="default", max_entries=None, l1_ttl=None, beta=None):
+        self.namespace = namespace
+        self.alias = alias
+        self.l1_ttl = getattr(settings, "CACHE_L1_TTL", 5.0) if l1_ttl is None else l1_ttl
+        self.beta = getattr(settings, "CACHE_EARLY_RECOMPUTE_BETA", 1.0) if beta is None else beta
+        self._l1 = _LRU(getattr(settings, "CACHE_L1_MAX_ENTRIES", 1024) if max_entries is None else max_entries)
+        self._locks = weakref.WeakValueDictionary()
+        self._locks_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = dict.fromkeys(self.STATS, 0)
+        _instances.add(self)
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def _tag_key(self, tag):
+        return f"{self.namespace}:tag:{tag}"
+
+    def _count(self, stat):
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    # Tags
+
+    def _tag_versions(self, tags):
+        """Current version of each tag, creating versions for new tags."""
+        versions, missing = {}, []
+        for tag in tags:
+            version = self._l1.get(("tag", tag))
+            if version is _MISSING:
+                missing.append(tag)
+            else:
+                versions[tag] = version
+        if missing:
+            stored = self.backend.get_many([self._tag_key(tag) for tag in missing])
+            for tag in missing:
+                version = stored.get(self._tag_key(tag))
+                if version is None:
+                    # add(), not set(): a concurrent invalidate() must win.
+                    self.backend.add(self._tag_key(tag), time.time_ns(), None)
+                    version = self.backend.get(self._tag_key(tag))
+                versions[tag] = version
+                self._l1.set(("tag", tag), version, self.l1_ttl)
+        return versions
+
+    def invalidate(self, *tags):
+        """Expire every entry stored with any of ``tags``, in all processes."""
+        for tag in tags:
+            self.backend.set(self._tag_key(tag), time.time_ns(), None)
+            self._l1.delete(("tag", tag))
+            self._count("invalidations")
+
+    # Entries are ``(value, expires_at, delta, tag_versions)``: the wall-clock
+    # expiry (None for no timeout), the seconds the value took to compute and
+    # the versions of its tags when it was stored.
+
+    def _valid(self, entry):
+        tag_versions = entry[3]
+        return not tag_versions or self._tag_versions(tag_versions) == tag_versions
+
+    def _lookup(self, key, version, count=True):
+        l1_key = (key, version)
+        entry = self._l1.get(l1_key)
+        if entry is not _MISSING and self._valid(entry):
+            if count:
+                self._count("l1_hits")
+            return entry
+        entry = self.backend.get(self._key(key), version=version)
+        if entry is not None and self._valid(entry):
+            if count:
+                self._count("l2_hits")
+            self._l1.set(l1_key, entry, self._l1_ttl(entry))
+            return entry
+        if count:
+            self._count("misses")
+        return None
+
+    def _l1_ttl(self, entry):
+        expires_at = entry[1]
+        return self.l1_ttl if expires_at is None else min(self.l1_ttl, expires_at - time.time())
+
+    def _store(self, key, value, timeout, tag_versions, version, delta=0.0):
+        expires_at = None if timeout is None else time.time() + timeout
+        entry = (value, expires_at, delta, tag_versions)
+        self.backend.set(self._key(key), entry, timeout, version=version)
+        self._l1.set((key, version), entry, self._l1_ttl(entry))
+
+    def get(self, key, default=None, version=None):
+        entry = self._lookup(key, version)
+        return default if entry is None else entry[0]
+
+    def set(self, key, value, timeout, tags=(), version=None):
+        self._store(key, value, timeout, self._tag_versions(tags), version)
+
+    def delete(self, key, version=None):
+        self.backend.delete(self._key(key), version=version)
+        self._l1.delete((key, version))
+
+    def _should_recompute_early(self, entry):
+        _, expires_at, delta, _ = entry
+        if expires_at is None or not delta or self.beta <= 0:
+            return False
+        # XFetch: -log(U) is exponentially distributed, so the chance of an
+        # early recompute grows as expiry nears and with the compute cost.
+        return time.time() - delta * self.beta * math.log(1.0 - random.random()) >= expires_at
+
+    def get_or_set(self, key, compute, timeout, tags=(), version=None):
+        """Return the cached value of ``key``, computing and storing it with ``compute()`` on a miss."""
+        entry = self._lookup(key, version)
+        if entry is not None:
+            if not self._should_recompute_early(entry):
+                return entry[0]
+            self._count("early_recomputes")
+
+        with self._locks_lock:
+            lock = self._locks.setdefault((key, version), threading.Lock())
+        with lock:
+            # Another thread may have stored a fresh value while this one waited.
+            current = self._lookup(key, version, count=False)
+            if current is not None and (entry is None or current[1] != entry[1]):
+                return current[0]
+            # Tag versions from before compute(): an invalidate() while it
+            # runs leaves the new entry already stale.
+            tag_versions = self._tag_versions(tags)
+            started = time.perf_counter()
+            value = compute()
+            self._store(key, value, timeout, tag_versions, version, delta=time.perf_counter() - started)
+            return value
+
+    def clear_local(self):
+        """Drop this process's L1 (tests, or after bulk changes made elsewhere)."""
+        self._l1.clear()
+
+
+_instances = weakref.WeakSet()
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def tiered(namespace):
+    """The process-wide ``TieredCache`` for ``namespace``."""
+    with _registry_lock:
+        instance = _registry.get(namespace)
+        if instance is None:
+            instance = _registry[namespace] = TieredCache(namespace)
+        return instance
+
+
+_LOOKUP_RESULTS = (("l1_hits", "l1_hit"), ("l2_hits", "l2_hit"), ("misses", "miss"))
+
+
+def _series(lines, name, kind, documentation, instances, value):
+    lines.append(f"# HELP {name} {documentation}")
+    lines.append(f"# TYPE {name} {kind}")
+    for instance in instances:
+        lines.append(f"{name}{_format_labels([('namespace', instance.namespace)])} {_format_value(value(instance))}")
+
+
+def _hit_ratio(instance):
+    stats = instance.stats
+    lookups = stats["l1_hits"] + stats["l2_hits"] + stats["misses"]
+    return (stats["l1_hits"] + stats["l2_hits"]) / lookups if lookups else 0.0
+
+
+def collect():
+    instances = sorted(_instances, key=lambda instance: instance.namespace)
+    if not instances:
+        return []
+    lines = [
+        "# HELP cache_lookups_total TieredCache lookups by result (l1_hit, l2_hit, miss).",
+        "# TYPE cache_lookups_total counter",
+    ]
+    for instance in instances:
+        for stat, result in _LOOKUP_RESULTS:
+            labels = _format_labels([("namespace", instance.namespace), ("result", result)])
+            lines.append(f"cache_lookups_total{labels} {_format_value(instance.stats[stat])}")
+    _series(lines, "cache_hit_ratio", "gauge", "Share of lookups served from either tier since start.", instances,
+            _hit_ratio)
+    _series(lines, "cache_early_recomputes_total", "counter", "Entries recomputed before expiry (XFetch).", instances,
+            lambda instance: instance.stats["early_recomputes"])
+    _series(lines, "cache_tag_invalidations_total", "counter", "Tags invalidated.", instances,
+            lambda instance: instance.stats["invalidations"])
+    _series(lines, "cache_l1_entries", "gauge", "Entries held in the in-process cache.", instances,
+            lambda instance: len(instance._l1))
+    return lines
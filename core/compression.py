@@ -0,0 +1,41 @@
+"""
+Byte codecs shared by compressed storage (``core.fields``, ``ai.archive``).
+
+zstd is used when the optional ``zstandard`` package is installed; zlib
+is always available and is the fallback.
+"""
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODECS = ("zstd", "zlib")
+
+
+def preferred_codec(configured=""):
+    """``configured`` if usable, else the best available codec."""
+    if configured == "zlib" or (configured == "zstd" and zstandard is not None):
+        return configured
+    return "zstd" if zstandard is not None else "zlib"
+
+
+def compress(data, codec):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed")
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, 9)
+    raise ValueError(f"Unknown codec {codec!r}")
+
+
+def decompress(data, codec):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed data")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    raise ValueError(f"Unknown codec {codec!r}")
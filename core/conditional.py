@@ -0,0 +1,98 @@
+"""
+Conditional GET for JSON read endpoints.
+
+Views derive an ETag/Last-Modified pair from a cheap query (one aggregate
+over the rows the response is built from) *before* building the body. When
+the client's ``If-None-Match``/``If-Modified-Since`` still matches, the view
+answers 304 with no body and skips serialization entirely, so clients that
+poll history, notes or shared transcripts only pay for a round trip.
+
+Changes the aggregate cannot see (an UPDATE that touches no timestamp) must
+``bump`` a version that the view includes in its validators.
+
+Access checks must run before ``respond`` so a 304 is never served to a
+caller who could not read the full response.
+"""
+import hashlib
+import time
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+class Validators(NamedTuple):
+    etag: str
+    last_modified: Optional[datetime]
+
+
+def validators(request, *parts, last_modified=None):
+    """
+    Validators for a response identified by the request path (including the
+    query string, so ``?summary=1`` gets its own ETag) and ``parts``.
+    """
+    key = repr((request.get_full_path(), *parts)).encode()
+    return Validators(quote_etag(hashlib.blake2b(key, digest_size=16).hexdigest()), last_modified)
+
+
+def _version_key(scope):
+    return f"etag-version:{scope}"
+
+
+def version(scope):
+    """
+    Current version of ``scope``. A missing (or evicted) entry is replaced
+    with a fresh value, so eviction costs a full response, never a stale 304.
+    """
+    key = _version_key(scope)
+    current = cache.get(key)
+    if current is None:
+        cache.add(key, time.time_ns(), None)
+        current = cache.get(key)
+    return current
+
+
+def bump(scope):
+    cache.set(_version_key(scope), time.time_ns(), None)
+
+
+def for_queryset(request, queryset, timestamp_field, *parts):
+    """
+    Validators for a list built from ``queryset``: row count, highest pk and
+    newest ``timestamp_field`` change whenever a row is added, removed or
+    (for ``auto_now`` fields) edited.
+    """
+    state = queryset.order_by().aggregate(count=Count("pk"), last_pk=Max("pk"), last=Max(timestamp_field))
+    return validators(request, *parts, state["count"], state["last_pk"], state["last"], last_modified=state["last"])
+
+
+def for_instance(request, instance, timestamp_field, *parts):
+    changed = getattr(instance, timestamp_field)
+    return validators(request, *parts, instance.pk, changed, last_modified=changed)
+
+
+def respond(request, validators, build):
+    """
+    Return a 304 when the request's preconditions match ``validators``,
+    otherwise the response from ``build()``; either way with the validators
+    attached.
+    """
+    last_modified = validators.last_modified
+    response = get_conditional_response(
+        request,
+        etag=validators.etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if response is None:
+        response = build()
+    if response.status_code in (200, 304):
+        response["ETag"] = validators.etag
+        if last_modified:
+            response["Last-Modified"] = http_date(last_modified.timestamp())
+        # Per-user data: browsers may keep it, but must revalidate each time.
+        response["Cache-Control"] = "private, no-cache"
+        patch_vary_headers(response, ("Authorization",))
+    return response
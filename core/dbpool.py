@@ -0,0 +1,57 @@
+"""
+Prometheus metrics for psycopg3 connection pools (``OPTIONS["pool"]``).
+
+psycopg_pool keeps running totals per pool. ``collect`` is registered with
+``core.instrumentation`` and exposes them as counters and gauges labelled by
+database alias, so pool exhaustion shows up as growing wait time and queued
+requests before it shows up as timeouts.
+"""
+from django.db import connections
+
+from .instrumentation import _format_labels, _format_value
+
+# psycopg_pool stat -> (metric, type, help, scale)
+_METRICS = {
+    "pool_min": ("db_pool_min_size", "gauge", "Configured minimum pool size.", 1),
+    "pool_max": ("db_pool_max_size", "gauge", "Configured maximum pool size.", 1),
+    "pool_size": ("db_pool_connections", "gauge", "Connections currently managed by the pool.", 1),
+    "pool_available": ("db_pool_available_connections", "gauge", "Idle connections ready to hand out.", 1),
+    "requests_waiting": ("db_pool_requests_waiting", "gauge", "Requests currently queued for a connection.", 1),
+    "requests_num": ("db_pool_requests_total", "counter", "Connections requested from the pool.", 1),
+    "requests_queued": ("db_pool_requests_queued_total", "counter", "Requests that had to wait for a connection.", 1),
+    "requests_wait_ms": (
+        "db_pool_request_wait_seconds_total", "counter", "Time queued requests spent waiting for a connection.", 0.001,
+    ),
+    "requests_errors": ("db_pool_request_errors_total", "counter", "Requests that timed out or failed.", 1),
+    "usage_ms": ("db_pool_connection_usage_seconds_total", "counter", "Time connections were checked out.", 0.001),
+    "connections_num": ("db_pool_connects_total", "counter", "Connection attempts to the server.", 1),
+    "connections_errors": ("db_pool_connect_errors_total", "counter", "Failed connection attempts.", 1),
+    "connections_lost": ("db_pool_connections_lost_total", "counter", "Connections found broken by a check.", 1),
+    "returns_bad": ("db_pool_returns_bad_total", "counter", "Connections returned in a bad state.", 1),
+}
+
+
+def pools():
+    """``(alias, pool)`` for every pool that has been created in this process."""
+    for alias in connections:
+        wrapper = connections[alias]
+        # Not ``wrapper.pool``: that property would create the pool.
+        pool = getattr(type(wrapper), "_connection_pools", {}).get(alias)
+        if pool is not None:
+            yield alias, pool
+
+
+def collect():
+    samples = {}
+    for alias, pool in pools():
+        for stat, value in pool.get_stats().items():
+            if stat in _METRICS:
+                samples.setdefault(stat, []).append((alias, value))
+    lines = []
+    for stat, series in samples.items():
+        name, kind, documentation, scale = _METRICS[stat]
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {kind}")
+        for alias, value in series:
+            lines.append(f"{name}{_format_labels([('alias', alias)])} {_format_value(value * scale)}")
+    return lines
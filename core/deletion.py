@@ -0,0 +1,129 @@
+"""
+Bounded-batch deletion for large per-user datasets.
+
+``QuerySet.delete()`` collects every row (and every cascaded row) into memory
+and deletes them in one transaction. ``delete_in_batches`` instead walks the
+queryset by primary key in ``DELETION_BATCH_SIZE`` chunks, each in its own
+short transaction. When Django's collector says a chunk can be fast-deleted
+(no signals, no cascades) it is removed with a single raw ``DELETE``;
+otherwise the chunk goes through the normal ``delete()`` so cascades and
+signals still run, just on a bounded number of rows. Callers delete children
+before parents to keep most models on the fast path.
+
+Deletions that run as background jobs go through ``schedule``, which first
+writes a ``PendingDeletion`` row in the caller's transaction. Job state only
+lives in the cache and the job on an in-process thread, so a restart between
+the 202 and the end of the job would otherwise lose the deletion for good;
+``resume`` (``manage.py resume_deletions``) restarts any row whose job has
+not reported progress for ``DELETION_RESUME_AFTER`` seconds. Deletion
+functions must therefore be safe to run again from the start.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models.deletion import Collector
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import jobs
+from .models import PendingDeletion
+
+logger = logging.getLogger(__name__)
+
+# Seconds between refreshes of ``PendingDeletion.claimed_at`` while a job runs.
+HEARTBEAT_SECONDS = 30
+
+
+def _batch_size():
+    return getattr(settings, "DELETION_BATCH_SIZE", 500)
+
+
+def delete_in_batches(queryset, batch_size=None, on_batch=None):
+    """
+    Delete every row matched by ``queryset``; returns the number deleted.
+    ``on_batch(deleted_so_far)`` is called after each committed batch.
+    """
+    batch_size = batch_size or _batch_size()
+    model = queryset.model
+    using = router.db_for_write(model)
+    base = model._base_manager.using(using)
+    fast = Collector(using=using, origin=queryset).can_fast_delete(queryset)
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by("pk").values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        chunk = base.filter(pk__in=ids)
+        with transaction.atomic(using=using):
+            if fast:
+                deleted += chunk._raw_delete(using)
+            else:
+                # Only the key is needed to cascade; don't load wide rows.
+                deleted += chunk.only("pk").delete()[1].get(model._meta.label, 0)
+        if on_batch is not None:
+            on_batch(deleted)
+
+
+class _Heartbeat:
+    """Wraps the job handle so progress reports also keep the pending row claimed."""
+
+    def __init__(self, job, pending_id):
+        self.job = job
+        self.pending_id = pending_id
+        self.last = time.monotonic()
+
+    @property
+    def id(self):
+        return self.job.id
+
+    def progress(self, done, total=None, **extra):
+        self.job.progress(done, total, **extra)
+        if time.monotonic() - self.last >= HEARTBEAT_SECONDS:
+            self.last = time.monotonic()
+            PendingDeletion.objects.filter(pk=self.pending_id).update(claimed_at=timezone.now())
+
+
+def _run(job, pending_id):
+    pending = PendingDeletion.objects.filter(pk=pending_id).first()
+    if pending is None:
+        # Finished by another process in the meantime.
+        return None
+    result = import_string(pending.func)(_Heartbeat(job, pending_id), *pending.args)
+    pending.delete()
+    return result
+
+
+def schedule(kind, func, *args):
+    """
+    Record the deletion durably, then run ``func(job, *args)`` as a background
+    job (see ``core.jobs.submit``); returns the job id. ``func`` must be a
+    module-level function and ``args`` JSON-serialisable, so the deletion can
+    be resumed by another process.
+    """
+    pending = PendingDeletion.objects.create(kind=kind, func=f"{func.__module__}.{func.__qualname__}", args=list(args))
+    return jobs.submit(kind, _run, pending.pk)
+
+
+def resume(older_than=None):
+    """Restart deletions whose job has stopped reporting progress; returns their job ids."""
+    if older_than is None:
+        older_than = timedelta(seconds=getattr(settings, "DELETION_RESUME_AFTER", 900))
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            PendingDeletion.objects.select_for_update(skip_locked=True)
+            .filter(claimed_at__lte=now - older_than)
+            .order_by("id")
+        )
+        for row in rows:
+            row.attempts += 1
+            row.claimed_at = now
+        PendingDeletion.objects.bulk_update(rows, ["attempts", "claimed_at"])
+        job_ids = []
+        for row in rows:
+            logger.warning("Resuming %s (pending deletion %s, attempt %s)", row.kind, row.pk, row.attempts)
+            job_ids.append(jobs.submit(row.kind, _run, row.pk))
+    return job_ids
@@ -0,0 +1,75 @@
+"""
+msgspec-backed JSON for DRF responses and request bodies.
+
+``MsgspecJSONRenderer`` and ``MsgspecJSONParser`` use ``dumps``/``loads``
+for every request. Endpoints that return large lists go one step further:
+they build ``msgspec.Struct`` rows straight from ``values()`` and encode them
+once with ``encode``; the result is an ``EncodedJSON`` that the renderer
+passes through untouched.
+
+Output follows DRF's ``JSONRenderer`` defaults (compact, UTF-8, ``Z`` for
+UTC datetimes, U+2028/U+2029 escaped) and is identical for what serializers
+produce: strings, ints, bools, ``None``, datetimes, dates, UUIDs, ordinary
+floats and the lazy strings and containers ``enc_hook`` converts. Types
+msgspec encodes natively never reach ``enc_hook``, so a few raw values come
+out differently:
+
+- ``bytes`` as base64 (``"YWJj"``, DRF ``"abc"``);
+- ``timedelta`` as ISO 8601 (``"PT5S"``, DRF ``"5.0"``);
+- ``Decimal`` with its digits kept (``1.10``, DRF ``1.1``);
+- float exponents without ``+`` or padding (``1e20``, DRF ``1e+20``).
+
+Serializer fields already turn durations and decimals into strings, so
+these only matter for views that put such values in ``Response`` directly.
+"""
+import msgspec
+from django.db.models.query import QuerySet
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+
+from .instrumentation import timed
+
+_LINE_SEPARATOR = "\u2028".encode()
+_PARAGRAPH_SEPARATOR = "\u2029".encode()
+
+
+def enc_hook(obj):
+    # str subclasses (ErrorDetail, SafeString) and lazy translations.
+    if isinstance(obj, str):
+        return str.__str__(obj)
+    if isinstance(obj, Promise):
+        return force_str(obj)
+    if isinstance(obj, QuerySet):
+        return list(obj)
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if hasattr(obj, "__getitem__") and hasattr(obj, "keys"):
+        return dict(obj)
+    if hasattr(obj, "__iter__"):
+        return list(obj)
+    raise NotImplementedError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+_encoder = msgspec.json.Encoder(enc_hook=enc_hook, decimal_format="number")
+_decoder = msgspec.json.Decoder()
+
+
+class EncodedJSON(bytes):
+    """A response body that is already JSON."""
+
+
+def dumps(obj):
+    body = _encoder.encode(obj)
+    # Same as DRF: keep the output safe to embed in a <script> tag.
+    if _LINE_SEPARATOR in body or _PARAGRAPH_SEPARATOR in body:
+        body = body.replace(_LINE_SEPARATOR, b"\\u2028").replace(_PARAGRAPH_SEPARATOR, b"\\u2029")
+    return body
+
+
+def loads(data):
+    return _decoder.decode(data)
+
+
+def encode(obj):
+    with timed("serialize"):
+        return EncodedJSON(dumps(obj))
@@ -0,0 +1,143 @@
+"""
+``CompressedTextField``: a ``TextField`` that stores large values compressed.
+
+Values of at least ``threshold`` characters are saved as
+``"\\x01<codec>:" + base64(compressed utf-8)``, which stays valid in a text
+column, so switching a ``TextField`` over needs no schema change. Shorter
+values are stored as-is. Rows are read without decoding; the text is
+decompressed the first time the attribute is accessed on an instance and
+then cached there, and ``defer()``/``only()`` work as for any field.
+
+``values()``/``values_list()`` bypass model attributes and return the stored
+form; pass such values through ``CompressedTextField.decode``.
+"""
+import base64
+
+from django.conf import settings
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+from . import compression
+
+MARKER = "\x01"
+
+
+class _Stored(str):
+    """A compressed value exactly as read from the database."""
+
+
+def _encode(text, codec):
+    payload = base64.b64encode(compression.compress(text.encode("utf-8"), codec)).decode("ascii")
+    return f"{MARKER}{codec}:{payload}"
+
+
+class _CompressedTextDescriptor(DeferredAttribute):
+    # A data descriptor (unlike DeferredAttribute), so reads go through
+    # __get__ even once the stored value is in the instance __dict__.
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, _Stored):
+            value = CompressedTextField.decode(value)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+
+class CompressedTextField(models.TextField):
+    descriptor_class = _CompressedTextDescriptor
+
+    def __init__(self, *args, threshold=None, codec=None, **kwargs):
+        self.threshold = threshold
+        self.codec = codec
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.threshold is not None:
+            kwargs["threshold"] = self.threshold
+        if self.codec is not None:
+            kwargs["codec"] = self.codec
+        return name, path, args, kwargs
+
+    @staticmethod
+    def decode(value):
+        if not (isinstance(value, str) and value.startswith(MARKER)):
+            return value
+        codec, _, payload = value[1:].partition(":")
+        return compression.decompress(base64.b64decode(payload), codec).decode("utf-8")
+
+    def _threshold(self):
+        if self.threshold is not None:
+            return self.threshold
+        return getattr(settings, "COMPRESSED_TEXT_THRESHOLD", 2048)
+
+    def from_db_value(self, value, expression, connection):
+        # Tag compressed values so they are decoded on access; text a user
+        # assigns is never mistaken for a stored value, whatever it contains.
+        if isinstance(value, str) and value.startswith(MARKER):
+            return _Stored(value)
+        return value
+
+    def to_python(self, value):
+        if isinstance(value, _Stored):
+            return self.decode(value)
+        return super().to_python(value)
+
+    def get_prep_value(self, value):
+        if isinstance(value, _Stored):
+            return str(value)
+        value = super().get_prep_value(value)
+        if not isinstance(value, str):
+            return value
+        # Plain text that happens to start with the marker is always
+        # compressed so that decoding stays unambiguous.
+        if len(value) >= self._threshold() or value.startswith(MARKER):
+            codec = compression.preferred_codec(
+                self.codec or getattr(settings, "COMPRESSED_TEXT_CODEC", "")
+            )
+            return _encode(value, codec)
+        return value
+
+
+def _batches(model, attname, batch_size):
+    last_pk = None
+    while True:
+        queryset = model._base_manager.order_by("pk")
+        if last_pk is not None:
+            queryset = queryset.filter(pk__gt=last_pk)
+        rows = list(queryset.values_list("pk", attname)[:batch_size])
+        if not rows:
+            return
+        last_pk = rows[-1][0]
+        yield rows
+
+
+def compress_existing(model, field_name, batch_size=500):
+    """
+    Re-save stored values of ``field_name`` so they follow the field's
+    compression rule. Walks the table by primary key in ``batch_size`` chunks,
+    reading only the key and the column; for use from data migrations.
+    """
+    field = model._meta.get_field(field_name)
+    for rows in _batches(model, field.attname, batch_size):
+        changed = []
+        for pk, stored in rows:
+            text = CompressedTextField.decode(stored)
+            if text is not None and field.get_prep_value(text) != stored:
+                changed.append(model(pk=pk, **{field.attname: text}))
+        if changed:
+            model._base_manager.bulk_update(changed, [field.attname])
+
+
+def decompress_existing(model, field_name, batch_size=500):
+    """Reverse of ``compress_existing``: write every stored value back as plain text."""
+    field = model._meta.get_field(field_name)
+    for rows in _batches(model, field.attname, batch_size):
+        for pk, stored in rows:
+            if isinstance(stored, str) and stored.startswith(MARKER):
+                plain = models.Value(CompressedTextField.decode(stored), output_field=models.TextField())
+                model._base_manager.filter(pk=pk).update(**{field.attname: plain})
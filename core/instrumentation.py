@@ -0,0 +1,215 @@
+"""
+Lightweight request instrumentation.
+
+A sampled request gets a ``RequestTimings`` record bound to the current
+context. Code on the hot path reports into it with ``timed("phase")`` and
+the middleware turns the record into a ``Server-Timing`` header and
+Prometheus histogram observations. When a request is not sampled every
+helper here is a no-op.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+DEFAULT_DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+DEFAULT_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+class RequestTimings:
+    """Per-request accumulator of phase durations and DB query stats."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.db_queries = 0
+        self.db_time = 0.0
+
+    def add(self, phase, duration):
+        self.phases[phase] = self.phases.get(phase, 0.0) + duration
+
+    def add_query(self, duration):
+        self.db_queries += 1
+        self.db_time += duration
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self, total=None):
+        total = self.elapsed() if total is None else total
+        parts = [
+            f"total;dur={total * 1000:.1f}",
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.db_queries} queries"',
+        ]
+        for phase, duration in sorted(self.phases.items()):
+            parts.append(f"{phase};dur={duration * 1000:.1f}")
+        return ", ".join(parts)
+
+
+def current():
+    return _current.get()
+
+
+def start():
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    """``connection.execute_wrapper`` hook counting queries and DB time."""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(time.perf_counter() - started)
+
+
+@contextmanager
+def timed(phase):
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - started)
+
+
+def timed_call(phase):
+    """Decorator form of ``timed``."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(phase):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class Histogram:
+    """Minimal thread-safe Prometheus histogram with label support."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def collect(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            snapshot = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        for key, counts, total, count in sorted(snapshot):
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {cumulative}"
+                )
+            lines.append(f'{self.name}_bucket{_format_labels(labels + [("le", "+Inf")])} {count}')
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+def _format_value(value):
+    return repr(float(value))
+
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Wall time spent handling a request.",
+    ("route", "method", "status"),
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries executed per request.",
+    ("route",),
+    buckets=DEFAULT_COUNT_BUCKETS,
+)
+REQUEST_DB_DURATION = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent in database queries per request.",
+    ("route",),
+)
+REQUEST_PHASE_DURATION = Histogram(
+    "http_request_phase_duration_seconds",
+    "Time spent in an instrumented phase (serialize, external, ...) per request.",
+    ("route", "phase"),
+)
+
+_histograms = [REQUEST_DURATION, REQUEST_DB_QUERIES, REQUEST_DB_DURATION, REQUEST_PHASE_DURATION]
+_collectors = []
+
+
+def register_collector(collector):
+    """Register a callable returning extra exposition lines for the metrics endpoint."""
+    if collector not in _collectors:
+        _collectors.append(collector)
+    return collector
+
+
+def observe_request(timings, route, method, status, total):
+    REQUEST_DURATION.observe(total, route=route, method=method, status=status)
+    REQUEST_DB_QUERIES.observe(timings.db_queries, route=route)
+    REQUEST_DB_DURATION.observe(timings.db_time, route=route)
+    for phase, duration in timings.phases.items():
+        REQUEST_PHASE_DURATION.observe(duration, route=route, phase=phase)
+
+
+def render_metrics():
+    lines = []
+    for histogram in _histograms:
+        lines.extend(histogram.collect())
+    for collector in _collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
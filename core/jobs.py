@@ -0,0 +1,118 @@
+"""
+In-process background jobs with progress reporting.
+
+``submit(kind, func, *args)`` returns a job id immediately and runs
+``func(job, *args)`` on a small thread pool; the function reports progress
+with ``job.progress(done, total)``. Job state lives in the Django cache under
+``job:<id>`` for ``JOBS_RESULT_TTL`` seconds, so it is visible to other
+processes only when the cache is shared (e.g. Redis). Job ids are random and
+act as the capability for reading status through ``/api/jobs/<id>/``; state
+therefore holds counts and outcomes, never user content.
+
+With ``JOBS_ALWAYS_EAGER`` (used by tests) jobs run synchronously inside
+``submit``.
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connections, transaction
+
+from . import routers
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _key(job_id):
+    return f"job:{job_id}"
+
+
+def _ttl():
+    return getattr(settings, "JOBS_RESULT_TTL", 24 * 3600)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "JOBS_MAX_WORKERS", 2),
+                thread_name_prefix="job",
+            )
+        return _executor
+
+
+def get(job_id):
+    return cache.get(_key(job_id))
+
+
+def _save(state):
+    state["updated_at"] = time.time()
+    cache.set(_key(state["id"]), state, _ttl())
+
+
+class Job:
+    """Handle passed to job functions for progress reporting."""
+
+    def __init__(self, state):
+        self.state = state
+
+    @property
+    def id(self):
+        return self.state["id"]
+
+    def progress(self, done, total=None, **extra):
+        self.state["progress"]["done"] = done
+        if total is not None:
+            self.state["progress"]["total"] = total
+        self.state["progress"].update(extra)
+        _save(self.state)
+
+
+def _run(job, func, args):
+    close_old_connections()
+    job.state["status"] = "running"
+    _save(job.state)
+    try:
+        # Jobs act on what the request just wrote; never read it from a replica.
+        with routers.primary():
+            result = func(job, *args)
+    except Exception as exc:
+        logger.exception("Background job %s (%s) failed", job.id, job.state["kind"])
+        job.state.update(status="failed", error=type(exc).__name__)
+    else:
+        job.state.update(status="done", result=result)
+    finally:
+        _save(job.state)
+        if not getattr(settings, "JOBS_ALWAYS_EAGER", False):
+            connections.close_all()
+
+
+def submit(kind, func, *args):
+    """
+    Queue ``func(job, *args)`` and return its job id. The job starts after the
+    current transaction commits, so it sees everything the caller wrote.
+    """
+    state = {
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        "status": "queued",
+        "progress": {"done": 0, "total": None},
+        "result": None,
+        "error": None,
+        "created_at": time.time(),
+    }
+    _save(state)
+    job = Job(state)
+    if getattr(settings, "JOBS_ALWAYS_EAGER", False):
+        _run(job, func, args)
+    else:
+        transaction.on_commit(lambda: _get_executor().submit(_run, job, func, args))
+    return state["id"]
@@ -0,0 +1,33 @@
+"""
+Keyset pagination for reading large querysets in bounded chunks.
+
+``.iterator(chunk_size=...)`` only bounds memory with server-side cursors.
+Behind the transaction-mode pooler (``DISABLE_SERVER_SIDE_CURSORS``),
+PostgreSQL sends the whole result set to the worker at once. ``pages``
+instead runs one ``WHERE key > last ORDER BY key LIMIT n`` query per chunk,
+which keeps memory flat with any cursor and stays cheap with an index on
+the key. Rows must be unique on the key.
+"""
+
+
+def pages(queryset, chunk_size, key, field="pk"):
+    """
+    Lists of up to ``chunk_size`` rows of ``queryset`` in ``field`` order;
+    ``key(row)`` returns the row's ``field`` value (so ``values()`` and
+    ``values_list()`` querysets work as well as model instances).
+    """
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(**{f"{field}__gt": last})
+        rows = list(page.order_by(field)[:chunk_size])
+        if rows:
+            last = key(rows[-1])
+            yield rows
+        if len(rows) < chunk_size:
+            return
+
+
+def rows(queryset, chunk_size, key, field="pk"):
+    """The rows of ``pages``, one at a time."""
+    for page in pages(queryset, chunk_size, key, field):
+        yield from page
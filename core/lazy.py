@@ -0,0 +1,48 @@
+"""
+Deferred imports for heavy SDKs.
+
+``lazy_import("openai")`` returns a stand-in module whose first attribute
+access imports the real one, so importing a view module (which happens for
+every URL pattern the first time URLs are resolved) does not pay for SDKs
+that only some requests use. Optional packages that are not installed give
+``None``, like the ``try: import x / except ImportError: x = None`` idiom
+elsewhere.
+
+The real import goes through ``importlib.import_module`` under a lock, so
+request and job threads touching a module for the first time at once all
+wait for it to finish initialising. (``importlib.util.LazyLoader`` is not
+safe for that: concurrent first accesses could see a half-run module.)
+"""
+import importlib
+import importlib.util
+import sys
+import threading
+import types
+
+
+class _LazyModule(types.ModuleType):
+    def __init__(self, name):
+        super().__init__(name)
+        self._lazy_module = None
+        self._lazy_lock = threading.Lock()
+
+    def _load(self):
+        module = self._lazy_module
+        if module is None:
+            with self._lazy_lock:
+                module = self._lazy_module
+                if module is None:
+                    module = self._lazy_module = importlib.import_module(self.__name__)
+        return module
+
+    def __getattr__(self, attribute):
+        # Only called for attributes the stand-in itself lacks.
+        return getattr(self._load(), attribute)
+
+
+def lazy_import(name):
+    if name in sys.modules:
+        return sys.modules[name]
+    if importlib.util.find_spec(name) is None:
+        return None
+    return _LazyModule(name)
@@ -0,0 +1,117 @@
+"""
+Local stand-in for an OpenAI-compatible chat completions API.
+
+Used by the benchmark harness (and handy in tests) so AI endpoints can be
+exercised without network access or API keys. Responses are deterministic:
+the reply is built from the last user message and padded to the requested
+token count, and latency is ``latency + tokens / token_rate`` seconds.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            payload = {}
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": "Unknown endpoint"}})
+            return
+
+        config = self.server.stub_config
+        tokens = config["tokens"]
+        delay = config["latency"] + (tokens / config["token_rate"] if config["token_rate"] else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+        messages = payload.get("messages") or []
+        prompt = next(
+            (m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"),
+            "",
+        )
+        words = ("Stub answer for: " + prompt[:200]).split()
+        filler = ["lorem", "ipsum", "dolor", "sit", "amet"]
+        while len(words) < tokens:
+            words.append(filler[len(words) % len(filler)])
+        content = " ".join(words[:tokens])
+
+        self.server.request_count += 1
+        self._send(
+            200,
+            {
+                "id": f"chatcmpl-stub-{self.server.request_count}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": payload.get("model") or "stub-model",
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": sum(len((m.get("content") or "").split()) for m in messages),
+                    "completion_tokens": tokens,
+                    "total_tokens": tokens,
+                },
+            },
+        )
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StubLLMServer:
+    """Runs the stub API on a background thread; use as a context manager."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.05, token_rate=200.0, tokens=120):
+        self.httpd = ThreadingHTTPServer((host, port), _StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.request_count = 0
+        self.httpd.stub_config = {
+            "latency": float(latency),
+            "token_rate": float(token_rate),
+            "tokens": int(tokens),
+        }
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def request_count(self):
+        return self.httpd.request_count
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,173 @@
+import json
+import subprocess
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from core import benchmarking
+from core.llm_stub import StubLLMServer
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except Exception:
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the API hot paths against a throwaway test database and a local "
+        "stub LLM server. Prints (or writes) a JSON report that can be diffed between commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--notes-per-user", type=int, default=25)
+        parser.add_argument("--sessions-per-user", type=int, default=5)
+        parser.add_argument("--messages-per-session", type=int, default=8)
+        parser.add_argument("--members-per-share", type=int, default=3)
+        parser.add_argument("--answer-words", type=int, default=400)
+        parser.add_argument("--requests", type=int, default=200, help="Requests per scenario.")
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            help="Concurrent clients. Defaults to 8, or 1 on SQLite, which cannot take concurrent writers.",
+        )
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=sorted(benchmarking.SCENARIOS),
+            help="Scenario to run (repeatable). Defaults to all.",
+        )
+        parser.add_argument("--llm-latency", type=float, default=0.05, help="Stub LLM base latency (s).")
+        parser.add_argument("--llm-token-rate", type=float, default=400.0, help="Stub LLM tokens/second.")
+        parser.add_argument("--llm-tokens", type=int, default=120, help="Stub LLM completion tokens.")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--output", help="Write the JSON report to this path.")
+
+    def handle(self, *args, **options):
+        if options["users"] < 2:
+            raise CommandError("--users must be at least 2 so shares have members.")
+        # SQLite locks the whole database for each write, so concurrent
+        # clients and the background jobs they start fail with "database is
+        # locked" instead of measuring anything.
+        if options["concurrency"] is None:
+            options["concurrency"] = 1 if connection.vendor == "sqlite" else 8
+        elif options["concurrency"] > 1 and connection.vendor == "sqlite":
+            raise CommandError("--concurrency above 1 needs PostgreSQL; SQLite serialises writers.")
+        scenarios = options["scenario"] or list(benchmarking.SCENARIOS)
+
+        # Keep the benchmark off real data: run against a dedicated test database.
+        with benchmarking.throwaway_database(), StubLLMServer(
+            latency=options["llm_latency"],
+            token_rate=options["llm_token_rate"],
+            tokens=options["llm_tokens"],
+        ) as llm:
+            report = self._run(options, scenarios, llm)
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as fh:
+                fh.write(output + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def _run(self, options, scenarios, llm):
+        # Throttles stay in the request path (their cache lookups are part of the
+        # cost being measured) but with a rate the benchmark cannot exhaust.
+        throttle_rates = {scope: "1000000/min" for scope in SimpleRateThrottle.THROTTLE_RATES}
+        overrides = override_settings(
+            OPENROUTER_API_KEY="bench-key",
+            OPENROUTER_BASE_URL=llm.base_url,
+            INSTRUMENTATION_SAMPLE_RATE=1.0,
+            INSTRUMENTATION_SERVER_TIMING=True,
+            SECURE_SSL_REDIRECT=False,
+            ALLOWED_HOSTS=["127.0.0.1", "localhost"],
+        )
+        original_rates = SimpleRateThrottle.THROTTLE_RATES
+        SimpleRateThrottle.THROTTLE_RATES = throttle_rates
+        try:
+            with overrides:
+                return self._seed_and_drive(options, scenarios, llm)
+        finally:
+            SimpleRateThrottle.THROTTLE_RATES = original_rates
+
+    def _seed_and_drive(self, options, scenarios, llm):
+        fixtures = benchmarking.seed(
+            users=options["users"],
+            notes_per_user=options["notes_per_user"],
+            sessions_per_user=options["sessions_per_user"],
+            messages_per_session=options["messages_per_session"],
+            members_per_share=options["members_per_share"],
+            answer_words=options["answer_words"],
+            seed_value=options["seed"],
+        )
+        # Seeding connections must not leak into the server threads.
+        connection.close()
+
+        server = ThreadedWSGIServer(("127.0.0.1", 0), _QuietHandler, allow_reuse_address=False)
+        server.set_app(get_wsgi_application())
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        host, port = server.server_address[:2]
+
+        results = {}
+        try:
+            for name in scenarios:
+                self.stderr.write(f"Running {name} ...")
+                results[name] = benchmarking.run_scenario(
+                    name,
+                    fixtures,
+                    host,
+                    port,
+                    requests=options["requests"],
+                    concurrency=options["concurrency"],
+                    seed_value=options["seed"],
+                )
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        return {
+            "meta": {
+                "git_revision": _git_revision(),
+                "database_vendor": connection.vendor,
+                "dataset": {
+                    key: options[key]
+                    for key in (
+                        "users",
+                        "notes_per_user",
+                        "sessions_per_user",
+                        "messages_per_session",
+                        "members_per_share",
+                        "answer_words",
+                    )
+                },
+                "llm": {
+                    "latency": options["llm_latency"],
+                    "token_rate": options["llm_token_rate"],
+                    "tokens": options["llm_tokens"],
+                    "requests_served": llm.request_count,
+                },
+                "seed": options["seed"],
+            },
+            "scenarios": results,
+        }
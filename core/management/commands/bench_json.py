@@ -0,0 +1,81 @@
+import io
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from ai.models import ChatHistory
+from ai.serializers import ChatHistorySerializer
+from core import benchmarking
+from core.parsers import MsgspecJSONParser
+from core.renderers import MsgspecJSONRenderer
+from notes.models import Note
+from notes.serializers import NoteSerializer
+from sharing.models import ShareLink
+from sharing.serializers import ShareLinkSerializer
+
+
+def _best(func, rounds):
+    best = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _compare(baseline, candidate, rounds):
+    base, fast = _best(baseline, rounds), _best(candidate, rounds)
+    return {"stdlib_ms": round(base * 1000, 3), "msgspec_ms": round(fast * 1000, 3), "speedup": round(base / fast, 2)}
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark DRF's stdlib JSONRenderer/JSONParser against the msgspec pair on "
+        "serialized ChatHistory, Note and ShareLink payloads from a throwaway database. "
+        "Prints a JSON report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=500, help="Rows per payload.")
+        parser.add_argument("--answer-words", type=int, default=300)
+        parser.add_argument("--rounds", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rounds = options["rounds"]
+        with benchmarking.throwaway_database():
+            fixtures = benchmarking.seed(
+                users=2,
+                notes_per_user=options["rows"],
+                sessions_per_user=1,
+                messages_per_session=options["rows"],
+                members_per_share=1,
+                answer_words=options["answer_words"],
+                seed_value=options["seed"],
+            )
+            user_id = fixtures[0]["user_id"]
+            payloads = {
+                "chat_history": ChatHistorySerializer(ChatHistory.objects.filter(user_id=user_id), many=True).data,
+                "notes": NoteSerializer(Note.objects.filter(user_id=user_id), many=True).data,
+                "share_links": ShareLinkSerializer(ShareLink.objects.all(), many=True).data,
+            }
+
+        stdlib_renderer, msgspec_renderer = JSONRenderer(), MsgspecJSONRenderer()
+        stdlib_parser, msgspec_parser = JSONParser(), MsgspecJSONParser()
+        report = {}
+        for name, data in payloads.items():
+            body = stdlib_renderer.render(data)
+            assert msgspec_renderer.render(data) == body, f"{name}: msgspec output differs from JSONRenderer"
+            report[name] = {
+                "objects": len(data),
+                "bytes": len(body),
+                "render": _compare(lambda: stdlib_renderer.render(data), lambda: msgspec_renderer.render(data), rounds),
+                "parse": _compare(
+                    lambda: stdlib_parser.parse(io.BytesIO(body)), lambda: msgspec_parser.parse(io.BytesIO(body)), rounds
+                ),
+            }
+        self.stdout.write(json.dumps(report, indent=2, sort_keys=True))
@@ -0,0 +1,133 @@
+import datetime
+import json
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from core import benchmarking
+from sharing.models import ShareInvite, ShareLink
+
+ENDPOINTS = {
+    "notes_list": "/api/notes/",
+    "notes_list_summary": "/api/notes/?summary=1",
+    "history_list": "/api/ai/history/",
+    "history_list_summary": "/api/ai/history/?summary=1",
+    "share_list": "/api/share/links/",
+    "invite_list": "/api/share/invites/",
+}
+
+
+def _value_size(value):
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return 8
+    return len(str(value))
+
+
+class _CountingCursor:
+    """Proxy for a DB-API cursor that adds up the size of every fetched value."""
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def _count(self, rows):
+        for row in rows:
+            self._stats["rows"] += 1
+            self._stats["bytes"] += sum(_value_size(value) for value in row)
+        return rows
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._count([row])
+        return row
+
+    def fetchmany(self, *args):
+        return self._count(self._cursor.fetchmany(*args))
+
+    def fetchall(self):
+        return self._count(self._cursor.fetchall())
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def _measure(client, path, rounds):
+    stats = {"queries": 0, "rows": 0, "bytes": 0}
+
+    def wrapper(execute, sql, params, many, context):
+        stats["queries"] += 1
+        result = execute(sql, params, many, context)
+        context["cursor"].cursor = _CountingCursor(context["cursor"].cursor, stats)
+        return result
+
+    peaks = []
+    for _ in range(rounds):
+        tracemalloc.start()
+        with connection.execute_wrapper(wrapper):
+            response = client.get(path)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        assert response.status_code == 200, (path, response.status_code)
+    return {
+        "queries": stats["queries"] // rounds,
+        "db_rows": stats["rows"] // rounds,
+        "db_bytes": stats["bytes"] // rounds,
+        "python_peak_kib": round(min(peaks) / 1024, 1),
+        "response_bytes": len(response.content),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure DB bytes fetched and Python memory allocated per request for the list "
+        "endpoints, on a throwaway database. Prints a JSON report; run it on two commits to "
+        "compare."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--notes", type=int, default=100, help="Notes (and chat rows) for the measured user.")
+        parser.add_argument("--answer-words", type=int, default=600)
+        parser.add_argument("--rounds", type=int, default=3)
+        parser.add_argument("--endpoint", action="append", choices=sorted(ENDPOINTS))
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        with benchmarking.throwaway_database(), override_settings(SECURE_SSL_REDIRECT=False, ALLOWED_HOSTS=["*"]):
+            fixtures = benchmarking.seed(
+                users=4,
+                notes_per_user=options["notes"],
+                sessions_per_user=1,
+                messages_per_session=options["notes"],
+                members_per_share=3,
+                answer_words=options["answer_words"],
+                seed_value=options["seed"],
+            )
+            user = User.objects.get(pk=fixtures[0]["user_id"])
+            # Pending invites for the measured user from everyone else's shares.
+            ShareInvite.objects.bulk_create(
+                [
+                    ShareInvite(share=share, invited_user=user, invited_by_id=share.created_by_id)
+                    for share in ShareLink.objects.exclude(created_by=user)
+                ]
+            )
+            client = APIClient()
+            client.force_authenticate(user)
+            report = {
+                name: _measure(client, ENDPOINTS[name], options["rounds"])
+                for name in options["endpoint"] or sorted(ENDPOINTS)
+            }
+        self.stdout.write(json.dumps({"meta": {"database_vendor": connection.vendor}, "endpoints": report}, indent=2, sort_keys=True))
@@ -0,0 +1,96 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from ai.archive import rehydrate
+from ai.models import ChatHistory
+from ai.serializers import ChatHistorySerializer
+from ai.structs import history_rows
+from core import benchmarking, fastjson
+from notes.models import Note
+from notes.serializers import NoteSerializer
+from notes.structs import note_rows
+from sharing.structs import chat_messages
+
+
+def _serializer_chat_messages(session_id):
+    """The shared chat transcript built from model instances, as before the fast path."""
+    items = rehydrate(list(ChatHistory.objects.filter(input_data__session_id=session_id).select_related("user").order_by("created_at")))
+    messages = []
+    for item in items:
+        question = item.input_data.get("question") or item.input_data.get("notes") or item.input_data.get("project_name") or ""
+        messages.append({"id": item.id, "role": "user", "content": question, "created_at": item.created_at, "username": item.user.username})
+        messages.append({"id": f"{item.id}-assistant", "role": "assistant", "content": item.response_text, "created_at": item.created_at, "username": "REE AI"})
+    return messages
+
+
+def _rate(func, objects, rounds):
+    best = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        body = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return {"objects_per_sec": round(objects / best), "ms": round(best * 1000, 2), "bytes": len(body)}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare objects/sec of the DRF serializer path and the msgspec fast path for the notes "
+        "list, chat history list and shared chat transcript (query + serialize + encode), on a "
+        "throwaway database. Prints a JSON report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=500, help="Notes and chat rows for the measured user.")
+        parser.add_argument("--answer-words", type=int, default=300)
+        parser.add_argument("--rounds", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        rounds = options["rounds"]
+        with benchmarking.throwaway_database():
+            fixtures = benchmarking.seed(
+                users=2,
+                notes_per_user=options["rows"],
+                sessions_per_user=1,
+                messages_per_session=options["rows"],
+                members_per_share=1,
+                answer_words=options["answer_words"],
+                seed_value=options["seed"],
+            )
+            user_id = fixtures[0]["user_id"]
+            notes = Note.objects.filter(user_id=user_id).order_by("-created_at")
+            history = ChatHistory.objects.filter(user_id=user_id).order_by("-created_at")
+            session_id = f"bench-{user_id}-0"
+            cases = {
+                "notes_list": (
+                    notes.count(),
+                    lambda: renderer.render(NoteSerializer(notes.all(), many=True).data),
+                    lambda: fastjson.encode(note_rows(notes.all())),
+                ),
+                "history_list": (
+                    history.count(),
+                    lambda: renderer.render(ChatHistorySerializer(history.all(), many=True).data),
+                    lambda: fastjson.encode(history_rows(history.all())),
+                ),
+                "shared_chat": (
+                    2 * ChatHistory.objects.filter(input_data__session_id=session_id).count(),
+                    lambda: renderer.render({"messages": _serializer_chat_messages(session_id)}),
+                    lambda: fastjson.encode({"messages": chat_messages(session_id)}),
+                ),
+            }
+            report = {}
+            for name, (objects, serializer_path, fast_path) in cases.items():
+                baseline = _rate(serializer_path, objects, rounds)
+                fast = _rate(fast_path, objects, rounds)
+                report[name] = {
+                    "objects": objects,
+                    "serializer": baseline,
+                    "msgspec": fast,
+                    "speedup": round(fast["objects_per_sec"] / baseline["objects_per_sec"], 2),
+                }
+        self.stdout.write(json.dumps(report, indent=2, sort_keys=True))
@@ -0,0 +1,100 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from ai.models import ChatHistory
+from core import benchmarking
+from core.fields import compress_existing
+from notes.models import Note
+
+TARGETS = ((Note, "content"), (ChatHistory, "response_text"))
+DATASET_OPTIONS = ("users", "notes_per_user", "messages_per_user", "answer_words", "seed")
+
+
+def _stored_bytes(model, column):
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(column)
+    if connection.vendor == "postgresql":
+        sql = f"SELECT COALESCE(SUM(pg_column_size({column})), 0), pg_total_relation_size('{model._meta.db_table}') FROM {table}"
+    else:
+        sql = f"SELECT COALESCE(SUM(LENGTH(CAST({column} AS BLOB))), 0), NULL FROM {table}"
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        column_bytes, table_bytes = cursor.fetchone()
+    return column_bytes, table_bytes
+
+
+def _scan_ms(queryset, read=None, rounds=3):
+    best = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for obj in queryset.iterator(chunk_size=500):
+            if read:
+                getattr(obj, read)
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 2)
+
+
+def _measure():
+    report = {}
+    for model, field in TARGETS:
+        column_bytes, table_bytes = _stored_bytes(model, model._meta.get_field(field).column)
+        report[model._meta.label] = {
+            "rows": model.objects.count(),
+            "column_bytes": column_bytes,
+            "table_bytes": table_bytes,
+            # Full scan that decodes every value, and a list-style scan that defers it.
+            "full_scan_ms": _scan_ms(model.objects.all(), read=field),
+            "deferred_scan_ms": _scan_ms(model.objects.defer(field)),
+        }
+    return report
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare stored size and scan time of note content and chat answers stored as plain "
+        "text versus CompressedTextField, on a throwaway database. Prints a JSON report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--notes-per-user", type=int, default=50)
+        parser.add_argument("--messages-per-user", type=int, default=50)
+        parser.add_argument("--answer-words", type=int, default=1500)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        with benchmarking.throwaway_database():
+            # Seed with compression effectively disabled to get the "before" layout.
+            with override_settings(COMPRESSED_TEXT_THRESHOLD=10**12):
+                benchmarking.seed(
+                    users=options["users"],
+                    notes_per_user=options["notes_per_user"],
+                    sessions_per_user=1,
+                    messages_per_session=options["messages_per_user"],
+                    members_per_share=1,
+                    answer_words=options["answer_words"],
+                    seed_value=options["seed"],
+                )
+                before = _measure()
+
+            started = time.perf_counter()
+            for model, field in TARGETS:
+                compress_existing(model, field)
+            migrate_ms = round((time.perf_counter() - started) * 1000, 2)
+            after = _measure()
+
+        report = {
+            "meta": {
+                "database_vendor": connection.vendor,
+                "dataset": {key: options[key] for key in DATASET_OPTIONS},
+                "migrate_ms": migrate_ms,
+            },
+            "before": before,
+            "after": after,
+        }
+        self.stdout.write(json.dumps(report, indent=2, sort_keys=True, ))
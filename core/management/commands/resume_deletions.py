@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core import deletion
+
+
+class Command(BaseCommand):
+    help = (
+        "Restart account and chat-history deletions left unfinished by a restarted or "
+        "crashed process. Run it on deploy or from cron; it waits for the deletions to finish."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=None,
+            help="Seconds without progress before a deletion counts as abandoned (default: DELETION_RESUME_AFTER).",
+        )
+
+    def handle(self, *args, **options):
+        older_than = options["older_than"]
+        job_ids = deletion.resume(None if older_than is None else timedelta(seconds=older_than))
+        # The job threads are joined at interpreter exit, so the command
+        # returns only once the resumed deletions are done.
+        self.stdout.write(f"Resumed {len(job_ids)} pending deletion(s).")
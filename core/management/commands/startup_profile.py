@@ -0,0 +1,112 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter, so every number is a cold start. Prints one
+# JSON line; ``-X importtime`` output goes to stderr.
+CHILD = r"""
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+urls = time.perf_counter()
+from django.test import Client
+response = Client(HTTP_HOST=sys.argv[2]).get(sys.argv[1], secure=True)
+served = time.perf_counter()
+heavy = [name for name in sys.argv[3].split(",") if name]
+print(json.dumps({
+    "setup_ms": (setup - started) * 1000,
+    "urls_ms": (urls - setup) * 1000,
+    "first_request_ms": (served - urls) * 1000,
+    "total_ms": (served - started) * 1000,
+    "status": response.status_code,
+    # A lazily imported module sits in sys.modules as _LazyModule until used.
+    "loaded": sorted(
+        name for name in heavy
+        if name in sys.modules and type(sys.modules[name]).__name__ != "_LazyModule"
+    ),
+}))
+"""
+
+
+def _parse_importtime(stderr):
+    """``{top-level package: cumulative µs}`` from ``-X importtime`` output."""
+    totals = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        try:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            cumulative = int(cumulative)
+        except ValueError:
+            continue  # header line
+        if name.startswith("  "):
+            continue  # nested import, already counted in its parent
+        totals[name.strip().split(".")[0]] += cumulative
+    return totals
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure cold start in fresh interpreters: django.setup(), URL loading and the first "
+        "served request, plus -X importtime cumulative import cost per top-level package and "
+        "whether heavy optional SDKs were loaded. Prints a JSON report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=3)
+        parser.add_argument("--path", default="/api/auth/", help="Path of the first request.")
+        parser.add_argument("--top", type=int, default=15, help="Packages to list by import cost.")
+        parser.add_argument(
+            "--heavy",
+            default="openai,httpx,numpy,pypdf,docx",
+            help="Comma-separated modules that should not be loaded by startup or the first request.",
+        )
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+        env.setdefault("DJANGO_SETTINGS_MODULE", os.environ.get("DJANGO_SETTINGS_MODULE", "zimproject_backend.settings"))
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS and settings.ALLOWED_HOSTS[0] != "*" else "localhost"
+
+        runs, imports = [], defaultdict(list)
+        for _ in range(options["runs"]):
+            result = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", CHILD, options["path"], host, options["heavy"]],
+                capture_output=True,
+                text=True,
+                env=env,
+                cwd=settings.BASE_DIR,
+            )
+            if result.returncode != 0:
+                raise CommandError(result.stderr.strip().splitlines()[-1] if result.stderr else "startup failed")
+            runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+            for package, micros in _parse_importtime(result.stderr).items():
+                imports[package].append(micros)
+
+        def median(key):
+            return round(statistics.median(run[key] for run in runs), 1)
+
+        by_cost = sorted(imports.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+        report = {
+            "runs": len(runs),
+            "path": options["path"],
+            "status": runs[-1]["status"],
+            "setup_ms": median("setup_ms"),
+            "urls_ms": median("urls_ms"),
+            "first_request_ms": median("first_request_ms"),
+            "total_ms": median("total_ms"),
+            "heavy_modules_loaded": runs[-1]["loaded"],
+            "imports_ms": {
+                package: round(statistics.median(micros) / 1000, 1) for package, micros in by_cost[: options["top"]]
+            },
+        }
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,209 @@
+import random
+import re
+import zlib
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+from . import instrumentation, routers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _route_for(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return "/" + match.route if match.route else match.view_name or "unknown"
+
+
+class InstrumentationMiddleware:
+    """
+    Records wall time, DB query count/time and instrumented phases for a
+    sampled fraction of requests (``INSTRUMENTATION_SAMPLE_RATE``).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = float(getattr(settings, "INSTRUMENTATION_SAMPLE_RATE", 0.0))
+        self.server_timing = getattr(settings, "INSTRUMENTATION_SERVER_TIMING", True)
+
+    def __call__(self, request):
+        if self.sample_rate <= 0 or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return self.get_response(request)
+
+        timings, token = instrumentation.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(instrumentation.query_wrapper))
+                response = self.get_response(request)
+            total = timings.elapsed()
+        finally:
+            instrumentation.stop(token)
+
+        instrumentation.observe_request(
+            timings,
+            route=_route_for(request),
+            method=request.method,
+            status=response.status_code,
+            total=total,
+        )
+        if self.server_timing:
+            response["Server-Timing"] = timings.server_timing(total)
+        return response
+
+
+class ReplicaPinningMiddleware:
+    """
+    Keeps unsafe requests on the primary database and, after a user's
+    successful write, pins their reads to it for a short window (see
+    ``core.routers``). A no-op without read replicas.
+    """
+
+    SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not routers.enabled():
+            return self.get_response(request)
+
+        writing = request.method not in self.SAFE_METHODS
+        with routers.scope(pinned=writing):
+            response = self.get_response(request)
+        # DRF stores the authenticated user on the underlying request.
+        user = getattr(request, "user", None)
+        if writing and response.status_code < 400 and user is not None and user.is_authenticated:
+            routers.record_write(user.id)
+        return response
+
+
+def _accepted_encodings(header):
+    """``{"gzip": 1.0, "br": 0.5, ...}`` from an Accept-Encoding header."""
+    accepted = {}
+    for item in header.split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name.strip():
+            accepted[name.strip().lower()] = quality
+    return accepted
+
+
+PRECOMPRESSED_TYPES = (
+    "application/zip",
+    "application/pdf",
+    "application/vnd.openxmlformats-officedocument.",
+    "image/",
+)
+
+
+class CompressionMiddleware:
+    """
+    Compresses response bodies with brotli (when the optional ``brotli``
+    package is installed and the client prefers or accepts it) or gzip.
+
+    Bodies smaller than ``COMPRESSION_MIN_SIZE`` are sent as is. Streaming
+    responses are compressed chunk by chunk and flushed after every chunk, so
+    the client still sees each chunk as it is produced. Server-sent events,
+    Range requests and partial responses are never compressed: proxies and
+    browsers expect those byte-for-byte. Formats that are compressed already
+    (zip containers such as .docx, images, PDFs) are sent as is.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = int(getattr(settings, "COMPRESSION_MIN_SIZE", 1024))
+        self.gzip_level = int(getattr(settings, "COMPRESSION_GZIP_LEVEL", 6))
+        self.brotli_quality = int(getattr(settings, "COMPRESSION_BROTLI_QUALITY", 5))
+        # Same BREACH mitigation as django.middleware.gzip.GZipMiddleware.
+        self.max_random_bytes = 100
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self._compressible(request, response):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = self._negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self._compress_async(response.streaming_content, encoding)
+            else:
+                response.streaming_content = self._compress_stream(response.streaming_content, encoding)
+            del response["Content-Length"]
+        else:
+            if encoding == "br":
+                compressed = brotli.compress(response.content, quality=self.brotli_quality)
+            else:
+                compressed = compress_string(response.content, max_random_bytes=self.max_random_bytes)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response["Content-Length"] = str(len(compressed))
+
+        # The encoded body is no longer byte-identical to the original.
+        if response.has_header("ETag"):
+            response["ETag"] = re.sub(r'^"', 'W/"', response["ETag"])
+        response["Content-Encoding"] = encoding
+        return response
+
+    def _compressible(self, request, response):
+        if response.has_header("Content-Encoding") or response.status_code == 206:
+            return False
+        if request.META.get("HTTP_RANGE") or response.has_header("Content-Range"):
+            return False
+        content_type = response.get("Content-Type", "")
+        if content_type.startswith("text/event-stream") or content_type.startswith(PRECOMPRESSED_TYPES):
+            return False
+        return response.streaming or len(response.content) >= self.min_size
+
+    def _negotiate(self, header):
+        accepted = _accepted_encodings(header)
+        fallback = accepted.get("*", 0.0)
+        candidates = [("br", 2)] if brotli is not None else []
+        candidates.append(("gzip", 1))
+        quality, _, encoding = max(
+            (accepted.get(name, fallback), preference, name) for name, preference in candidates
+        )
+        return encoding if quality > 0 else None
+
+    def _compressor(self, encoding):
+        """``(compress, flush, finish)`` callables for one streamed body."""
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            return compressor.process, compressor.flush, compressor.finish
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+    def _compress_stream(self, chunks, encoding):
+        compress, flush, finish = self._compressor(encoding)
+        for chunk in chunks:
+            data = compress(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+
+    async def _compress_async(self, chunks, encoding):
+        compress, flush, finish = self._compressor(encoding)
+        async for chunk in chunks:
+            data = compress(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
@@ -0,0 +1,19 @@
+from django.db import models
+from django.utils import timezone
+
+
+class PendingDeletion(models.Model):
+    """
+    Durable record of a background deletion (see ``core.deletion.schedule``).
+    The row is removed when the job finishes; rows left behind by a process
+    that died mid-job are picked up again by ``manage.py resume_deletions``.
+    """
+
+    kind = models.CharField(max_length=40)
+    func = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Refreshed while the job makes progress; a stale value means no live
+    # process is working on the row.
+    claimed_at = models.DateTimeField(default=timezone.now, db_index=True)
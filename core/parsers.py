@@ -0,0 +1,21 @@
+import msgspec
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+from . import fastjson
+
+
+class MsgspecJSONParser(JSONParser):
+    """Drop-in ``JSONParser`` that decodes request bodies with msgspec."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        try:
+            data = stream.read() if stream is not None else b""
+            if encoding.lower().replace("-", "") != "utf8":
+                data = data.decode(encoding).encode()
+            return fastjson.loads(data)
+        except (msgspec.DecodeError, UnicodeError) as exc:
+            raise ParseError(f"JSON parse error - {exc}")
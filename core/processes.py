@@ -0,0 +1,45 @@
+"""
+A shared pool of worker processes for CPU-heavy work.
+
+Parsing uploaded documents (``notes.ingestion``) and rendering exports
+(``ai.export``) run here rather than on request or job threads, where they
+would hold the GIL. The pool has ``PROCESS_POOL_WORKERS`` processes, started
+with ``spawn`` (the parent runs request and job threads, so forking it is
+unsafe) and recycled every ``MAX_TASKS_PER_CHILD`` tasks because document
+libraries can leak. Task functions must live in modules that import nothing
+from Django, such as ``notes.extraction`` and ``ai.rendering``.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+MAX_TASKS_PER_CHILD = 100
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, "PROCESS_POOL_WORKERS", 2),
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=MAX_TASKS_PER_CHILD,
+            )
+        return _pool
+
+
+def discard(pool):
+    """Replace a pool whose workers are stuck: the next task starts fresh ones."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    # ProcessPoolExecutor cannot cancel running tasks; stop the workers.
+    for process in list((getattr(pool, "_processes", None) or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
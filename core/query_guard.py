@@ -0,0 +1,107 @@
+"""
+Test helpers for guarding endpoints against N+1 query regressions.
+
+``QueryCountTestCase`` runs the same request against fixtures built at
+several scales (1, 10 and 100 related rows by default) and fails when the
+number of SQL queries changes with the scale, printing a diff of the
+captured SQL so the offending lazy load is easy to spot.
+"""
+import difflib
+import importlib
+import re
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APITestCase
+
+_NUMBER_RE = re.compile(r"\b\d+\b")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_IN_LIST_RE = re.compile(r"IN \((?:\?, )*\?\)")
+_UUID_RE = re.compile(r"\b[0-9a-f]{32}\b|\b[0-9a-f]{8}(?:-[0-9a-f]{4}){3}-[0-9a-f]{12}\b")
+
+
+def normalize_sql(sql):
+    """Strip literals so queries from different scales line up in a diff."""
+    sql = _UUID_RE.sub("?", sql)
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    return _IN_LIST_RE.sub("IN (...)", sql)
+
+
+def urlconf_routes(urlconf):
+    module = importlib.import_module(urlconf)
+    return {str(pattern.pattern) for pattern in module.urlpatterns}
+
+
+class QueryCountTestCase(APITestCase):
+    """
+    Subclasses set ``urlconf``, ``url_prefix`` and ``covered_routes`` and call
+    ``assertConstantQueries`` once per route/method they guard.
+    """
+
+    urlconf = None
+    url_prefix = ""
+    covered_routes = ()
+    scales = (1, 10, 100)
+
+    def setUp(self):
+        super().setUp()
+        # Throttle history lives in the cache; keep request budgets per test.
+        cache.clear()
+
+    def test_every_route_is_guarded(self):
+        if self.urlconf is None:
+            return
+        missing = urlconf_routes(self.urlconf) - set(self.covered_routes)
+        self.assertFalse(
+            missing,
+            f"{self.urlconf} has routes without a query-count guard: {sorted(missing)}",
+        )
+
+    def assertConstantQueries(self, route, method, setup, expected_status=200, scales=None, format="json"):
+        """
+        ``setup(scale)`` builds fixtures with ``scale`` related rows and returns
+        ``(user, path, data)``; ``path`` is relative to ``url_prefix``. Uploads
+        pass ``format="multipart"``.
+        """
+        self.assertIn(route, self.covered_routes, f"{route!r} is not listed in covered_routes")
+        scales = scales or self.scales
+        captured = {}
+        for scale in scales:
+            user, path, data = setup(scale)
+            client = APIClient()
+            if user is not None:
+                client.force_authenticate(user)
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                response = getattr(client, method)(f"{self.url_prefix}{path}", data, format=format)
+            # Streaming bodies (file downloads) have no ``content`` to show.
+            body = getattr(response, "data", None) if response.streaming else getattr(response, "data", response.content)
+            response.close()
+            self.assertEqual(
+                response.status_code,
+                expected_status,
+                f"{method.upper()} {route} at scale={scale} returned {response.status_code}: {body!r}",
+            )
+            captured[scale] = [query["sql"] for query in context.captured_queries]
+
+        baseline_scale = scales[0]
+        baseline = captured[baseline_scale]
+        for scale in scales[1:]:
+            queries = captured[scale]
+            if len(queries) == len(baseline):
+                continue
+            diff = "\n".join(
+                difflib.unified_diff(
+                    [normalize_sql(sql) for sql in baseline],
+                    [normalize_sql(sql) for sql in queries],
+                    fromfile=f"scale={baseline_scale} ({len(baseline)} queries)",
+                    tofile=f"scale={scale} ({len(queries)} queries)",
+                    lineterm="",
+                )
+            )
+            self.fail(
+                f"{method.upper()} {route}: query count grew from {len(baseline)} to "
+                f"{len(queries)} when related rows went from {baseline_scale} to {scale}.\n{diff}"
+            )
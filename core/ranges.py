@@ -0,0 +1,88 @@
+"""
+Serving files from disk with HTTP Range support.
+
+``file_response`` answers a download with 304 when ``If-None-Match`` still
+matches, 206 with the requested bytes for a single ``Range: bytes=...``
+(only when ``If-Range``, if sent, names the current ETag), 416 when the
+range lies outside the file, and the whole file otherwise. Multi-range
+requests get the whole file, as RFC 9110 allows. Bodies are streamed from
+the file, never read into memory.
+"""
+import os
+import re
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import content_disposition_header
+
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+BLOCK_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+    """``(start, end)`` inclusive for a single byte range, ``None`` to send everything, ``False`` if unsatisfiable."""
+    match = RANGE.match((header or "").replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes.
+        length = int(last)
+        return (max(0, size - length), size - 1) if length and size else False
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read(path, start, length):
+    with open(path, "rb") as stream:
+        stream.seek(start)
+        while length > 0:
+            block = stream.read(min(BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def _headers(response, etag, filename, content_type):
+    response["ETag"] = etag
+    response["Accept-Ranges"] = "bytes"
+    response["Content-Type"] = content_type
+    response["Content-Disposition"] = content_disposition_header(True, filename)
+    # Per-user files: browsers may keep them, but must revalidate each time.
+    response["Cache-Control"] = "private, no-cache"
+    patch_vary_headers(response, ("Authorization",))
+    return response
+
+
+def not_modified(request, etag, filename, content_type):
+    """A 304 when the client's ``If-None-Match`` matches ``etag``, else ``None``; lets views skip producing the file."""
+    response = get_conditional_response(request, etag=etag)
+    return _headers(response, etag, filename, content_type) if response is not None else None
+
+
+def file_response(request, path, content_type, filename, etag):
+    """Serve ``path`` as an attachment named ``filename``; ``etag`` must change whenever the file does."""
+    cached = not_modified(request, etag, filename, content_type)
+    if cached is not None:
+        return cached
+
+    size = os.path.getsize(path)
+    if_range = request.META.get("HTTP_IF_RANGE")
+    byte_range = parse_range(request.META.get("HTTP_RANGE"), size) if if_range in (None, etag) else None
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return _headers(response, etag, filename, content_type)
+    if byte_range is None:
+        response = FileResponse(open(path, "rb"), as_attachment=True, filename=filename)
+        return _headers(response, etag, filename, content_type)
+
+    start, end = byte_range
+    response = StreamingHttpResponse(_read(path, start, end - start + 1), status=206)
+    response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Content-Length"] = str(end - start + 1)
+    return _headers(response, etag, filename, content_type)
@@ -0,0 +1,25 @@
+import msgspec
+from rest_framework.renderers import JSONRenderer
+
+from . import fastjson
+from .instrumentation import timed
+
+
+class MsgspecJSONRenderer(JSONRenderer):
+    """
+    Drop-in ``JSONRenderer`` that encodes with msgspec, reports encoding time
+    as the ``serialize`` phase and passes ``EncodedJSON`` bodies through
+    without re-encoding.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if isinstance(data, fastjson.EncodedJSON):
+            return bytes(data)
+        with timed("serialize"):
+            body = fastjson.dumps(data)
+            indent = self.get_indent(accepted_media_type, renderer_context or {})
+            if indent:
+                body = msgspec.json.format(body, indent=indent)
+            return body
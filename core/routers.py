@@ -0,0 +1,98 @@
+"""
+Primary/replica database routing.
+
+With read replicas configured (``DATABASE_REPLICA_URLS``), ``ReplicaRouter``
+sends reads to a random replica and every write to ``default``. Reads stay on
+the primary whenever a replica could return something older than what the
+caller just wrote:
+
+* for the whole of an unsafe (POST/PUT/PATCH/DELETE) request, and inside
+  ``primary()`` blocks (background jobs run in one);
+* inside a transaction on the primary;
+* for ``DATABASE_REPLICA_PIN_SECONDS`` after a user's own successful write.
+  ``ReplicaPinningMiddleware`` records the write in the cache and
+  ``CachedJWTAuthentication`` pins the user's later requests. Like share
+  access tokens, this needs a cache shared by all workers.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_pinned = contextvars.ContextVar("replica_pinned", default=False)
+
+
+def replica_aliases():
+    return [alias for alias in connections if alias.startswith("replica")]
+
+
+def enabled():
+    return bool(replica_aliases())
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+def pin():
+    """Send the rest of the current ``scope()`` (the request) to the primary."""
+    _pinned.set(True)
+
+
+@contextmanager
+def scope(pinned=False):
+    """
+    Isolate pinning: ``pin()`` inside the block is undone when it exits. WSGI
+    worker threads reuse their context across requests, so every request
+    runs in one.
+    """
+    token = _pinned.set(pinned)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def primary():
+    return scope(pinned=True)
+
+
+def _pin_key(user_id):
+    return f"replica-pin:{user_id}"
+
+
+def record_write(user_id):
+    ttl = getattr(settings, "DATABASE_REPLICA_PIN_SECONDS", 5)
+    if ttl and enabled():
+        cache.set(_pin_key(user_id), True, ttl)
+
+
+def pin_if_recent_write(user_id):
+    if enabled() and not is_pinned() and cache.get(_pin_key(user_id)):
+        pin()
+
+
+class ReplicaRouter:
+    def __init__(self, replicas=None):
+        self.replicas = replica_aliases() if replicas is None else list(replicas)
+
+    def db_for_read(self, model, **hints):
+        # DatabaseCache entries: a stale read would undo deletes and revocations.
+        if model._meta.app_label == "django_cache":
+            return DEFAULT_DB_ALIAS
+        if not self.replicas or _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,26 @@
+"""
+Test runner: ``DiscoverRunner`` with the default cache in process memory
+and without the HTTPS redirect.
+
+The configured cache is shared (a directory, a table or Redis), so without
+this the suite would write job states, throttle counters and cached users
+from the test database into the developer's real cache. The test client
+sends plain-http requests, which ``SECURE_SSL_REDIRECT`` (on unless
+``DEBUG``) would answer with a 301.
+"""
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._test_settings = override_settings(
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests"}},
+            SECURE_SSL_REDIRECT=False,
+        )
+        self._test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._test_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,464 @@
+import gzip
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import caching, dbpool, fastjson, instrumentation, keyset, ranges, routers
+from .lazy import lazy_import
+from .middleware import CompressionMiddleware
+from .parsers import MsgspecJSONParser
+from .renderers import MsgspecJSONRenderer
+
+
+class MsgspecJSONTests(SimpleTestCase):
+    def test_renders_like_drf_renderer(self):
+        data = {
+            "token": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            "created_at": datetime(2026, 10, 19, 8, 30, 0, 123456, tzinfo=timezone.utc),
+            "day": date(2026, 10, 19),
+            "score": Decimal("1.5"),
+            "label": gettext_lazy("Notes"),
+            "errors": [ErrorDetail("This field is required.", code="required")],
+            "text": "ünïcode line",
+            "nested": [{"a": None, "b": True, "c": 1.25}],
+        }
+        self.assertEqual(MsgspecJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_natively_encoded_types_differ_from_drf(self):
+        # Documented in core.fastjson; a change here is a visible API change.
+        cases = [
+            (b"abc", b'"YWJj"', b'"abc"'),
+            (timedelta(seconds=5), b'"PT5S"', b'"5.0"'),
+            (Decimal("1.10"), b"1.10", b"1.1"),
+            (1e20, b"1e20", b"1e+20"),
+        ]
+        for value, msgspec_body, drf_body in cases:
+            with self.subTest(value=value):
+                self.assertEqual(MsgspecJSONRenderer().render([value]), b"[" + msgspec_body + b"]")
+                self.assertEqual(JSONRenderer().render([value]), b"[" + drf_body + b"]")
+
+    def test_encoded_json_and_indent(self):
+        renderer = MsgspecJSONRenderer()
+        self.assertEqual(renderer.render(fastjson.encode({"a": 1})), b'{"a":1}')
+        self.assertEqual(renderer.render(None), b"")
+        self.assertEqual(renderer.render({"a": 1}, "application/json; indent=2"), b'{\n  "a": 1\n}')
+
+    def test_parser(self):
+        parser = MsgspecJSONParser()
+        self.assertEqual(parser.parse(io.BytesIO('{"q": "ü", "n": [1, 2.5]}'.encode())), {"q": "ü", "n": [1, 2.5]})
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"q": '))
+
+
+class MsgspecJSONApiTests(APITestCase):
+    def test_malformed_body_is_a_400(self):
+        response = self.client.post("/api/auth/login/", data=b'{"username": ', content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("JSON parse error", response.json()["detail"])
+
+
+@override_settings(COMPRESSION_MIN_SIZE=200)
+class CompressionMiddlewareTests(SimpleTestCase):
+    body = b'{"answer": "Rivers erode their banks."}' * 50
+
+    def _get(self, response, **headers):
+        request = RequestFactory().get("/api/ai/history/", HTTP_ACCEPT_ENCODING="gzip, deflate", **headers)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_large_body_is_gzipped(self):
+        original = HttpResponse(self.body, content_type="application/json")
+        original["ETag"] = '"abc"'
+        response = self._get(original)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["ETag"], 'W/"abc"')
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_small_sse_range_and_precompressed_responses_are_untouched(self):
+        docx = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        cases = {
+            "small": (HttpResponse(b"{}", content_type="application/json"), {}),
+            "sse": (StreamingHttpResponse(iter([self.body]), content_type="text/event-stream"), {}),
+            "range": (HttpResponse(self.body, content_type="application/json"), {"HTTP_RANGE": "bytes=0-99"}),
+            "docx": (StreamingHttpResponse(iter([self.body]), content_type=docx), {}),
+        }
+        for name, (original, headers) in cases.items():
+            with self.subTest(name):
+                self.assertFalse(self._get(original, **headers).has_header("Content-Encoding"))
+
+    def test_streaming_body_is_flushed_per_chunk(self):
+        chunks = [b"x" * 300, b"y" * 300]
+        response = self._get(StreamingHttpResponse(iter(chunks), content_type="application/json"))
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        parts = list(response.streaming_content)
+        self.assertGreaterEqual(len(parts), 3)
+        self.assertEqual(gzip.decompress(b"".join(parts)), b"".join(chunks))
+
+    def test_identity_only_client(self):
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip;q=0, identity")
+        response = CompressionMiddleware(lambda request: HttpResponse(self.body))(request)
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+
+class RangeResponseTests(SimpleTestCase):
+    body = bytes(range(256)) * 4
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        with os.fdopen(handle, "wb") as stream:
+            stream.write(self.body)
+        self.addCleanup(os.remove, self.path)
+
+    def _get(self, **headers):
+        request = RequestFactory().get("/download/", **headers)
+        response = ranges.file_response(request, self.path, "application/octet-stream", "file.bin", '"v1"')
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_parse_range(self):
+        self.assertEqual(ranges.parse_range("bytes=0-99", 1024), (0, 99))
+        self.assertEqual(ranges.parse_range("bytes=1000-", 1024), (1000, 1023))
+        self.assertEqual(ranges.parse_range("bytes=-24", 1024), (1000, 1023))
+        self.assertEqual(ranges.parse_range("bytes=10-5000", 1024), (10, 1023))
+        self.assertIs(ranges.parse_range("bytes=2000-", 1024), False)
+        self.assertIsNone(ranges.parse_range("bytes=0-1,5-6", 1024))
+        self.assertIsNone(ranges.parse_range(None, 1024))
+
+    def test_whole_file_partial_and_unsatisfiable(self):
+        response, body = self._get()
+        self.assertEqual((response.status_code, body), (200, self.body))
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn('attachment; filename="file.bin"', response["Content-Disposition"])
+
+        response, body = self._get(HTTP_RANGE="bytes=100-199")
+        self.assertEqual((response.status_code, body), (206, self.body[100:200]))
+        self.assertEqual(response["Content-Range"], "bytes 100-199/1024")
+        self.assertEqual(response["Content-Length"], "100")
+
+        response, _ = self._get(HTTP_RANGE="bytes=5000-")
+        self.assertEqual((response.status_code, response["Content-Range"]), (416, "bytes */1024"))
+
+    def test_validators(self):
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH='"v1"')[0].status_code, 304)
+        response, body = self._get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"v0"')
+        self.assertEqual((response.status_code, body), (200, self.body))
+        self.assertEqual(self._get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"v1"')[0].status_code, 206)
+
+
+class TestRunnerTests(SimpleTestCase):
+    def test_tests_never_touch_the_configured_cache(self):
+        self.assertEqual(type(caches["default"]).__name__, "LocMemCache")
+
+    def test_plain_http_requests_are_not_redirected(self):
+        self.assertNotEqual(self.client.get("/api/notes/").status_code, 301)
+        # The production default, which the runner switches off.
+        with override_settings(SECURE_SSL_REDIRECT=True):
+            self.assertEqual(self.client_class().get("/api/notes/").status_code, 301)
+
+
+class KeysetTests(APITestCase):
+    def test_pages_walk_the_key_with_one_bounded_query_each(self):
+        users = User.objects.bulk_create([User(username=f"keyset{i}") for i in range(7)])
+        queryset = User.objects.filter(username__startswith="keyset").values_list("id", "username")
+        with CaptureQueriesContext(connection) as context:
+            pages = list(keyset.pages(queryset, 3, lambda row: row[0], "id"))
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual([row[1] for page in pages for row in page], [user.username for user in users])
+        self.assertEqual(len(context.captured_queries), 3)
+        self.assertTrue(all("LIMIT 3" in query["sql"] for query in context.captured_queries))
+
+
+class LazyImportTests(SimpleTestCase):
+    def test_module_runs_on_first_attribute_access(self):
+        self.assertIsNone(lazy_import("no_such_package_for_tests"))
+        sys.modules.pop("colorsys", None)
+        module = lazy_import("colorsys")
+        self.assertEqual(type(module).__name__, "_LazyModule")
+        self.assertEqual(module.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+
+    def test_concurrent_first_use_sees_the_initialised_module(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        directory = temporary.name
+        with open(os.path.join(directory, "slow_module_for_tests.py"), "w") as source:
+            source.write("import time\ntime.sleep(0.2)\nVALUE = 42\n")
+        sys.path.insert(0, directory)
+        self.addCleanup(sys.path.remove, directory)
+        self.addCleanup(sys.modules.pop, "slow_module_for_tests", None)
+
+        module = lazy_import("slow_module_for_tests")
+        results = []
+        start = threading.Barrier(8)
+
+        def read():
+            start.wait()
+            try:
+                results.append(module.VALUE)
+            except AttributeError as exc:
+                results.append(exc)
+
+        threads = [threading.Thread(target=read) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [42] * 8)
+
+
+class InstrumentationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="timed")
+        for histogram in instrumentation._histograms:
+            self.addCleanup(histogram.reset)
+
+    def _get(self, path="/api/notes/", **headers):
+        # The middleware reads its settings once, when a client first loads it.
+        client = self.client_class()
+        client.force_authenticate(self.user)
+        return client.get(path, **headers)
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1.0)
+    def test_sampled_request_gets_server_timing(self):
+        header = self._get()["Server-Timing"]
+        self.assertRegex(header, r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="[1-9]\d* queries"')
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=0)
+    def test_unsampled_request_has_no_header(self):
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("Server-Timing"))
+
+    def test_histogram_exposition(self):
+        histogram = instrumentation.Histogram("t_seconds", "Test.", ("route",), buckets=(1.0, 0.1))
+        histogram.observe(0.05, route="a")
+        histogram.observe(0.5, route="a")
+        histogram.observe(5, route="a")
+        self.assertEqual(
+            histogram.collect(),
+            [
+                "# HELP t_seconds Test.",
+                "# TYPE t_seconds histogram",
+                't_seconds_bucket{route="a",le="0.1"} 1',
+                't_seconds_bucket{route="a",le="1.0"} 2',
+                't_seconds_bucket{route="a",le="+Inf"} 3',
+                't_seconds_sum{route="a"} 5.55',
+                't_seconds_count{route="a"} 3',
+            ],
+        )
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1.0, METRICS_TOKEN="scrape-token")
+    def test_metrics_require_the_bearer_token(self):
+        self._get()
+        response = self.client.get("/api/metrics/", HTTP_AUTHORIZATION="Bearer scrape-token")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn('http_request_duration_seconds_bucket{route="', response.content.decode())
+        self.assertIn('le="+Inf"}', response.content.decode())
+        for headers in ({}, {"HTTP_AUTHORIZATION": "Bearer wrong"}):
+            with self.subTest(headers=headers):
+                self.assertEqual(self.client.get("/api/metrics/", **headers).status_code, 403)
+
+    @override_settings(METRICS_TOKEN="")
+    def test_metrics_fall_back_to_staff_users(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 403)
+        self.user.is_staff = True
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 200)
+
+
+class BenchApiTests(SimpleTestCase):
+    def test_short_run_reports_every_scenario(self):
+        # A separate process: the command creates and drops its own database.
+        result = subprocess.run(
+            [
+                sys.executable, "manage.py", "bench_api", "--users", "2", "--notes-per-user", "2",
+                "--sessions-per-user", "1", "--messages-per-session", "2", "--members-per-share", "1",
+                "--requests", "3", "--concurrency", "1", "--llm-latency", "0",
+                "--scenario", "notes_list", "--scenario", "ai_general",
+            ],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=120,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        scenarios = json.loads(result.stdout)["scenarios"]
+        self.assertEqual(set(scenarios), {"notes_list", "ai_general"})
+        for report in scenarios.values():
+            self.assertEqual(report["statuses"], {"200": 3})
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite only")
+    def test_concurrency_is_refused_on_sqlite(self):
+        with self.assertRaisesMessage(CommandError, "--concurrency above 1 needs PostgreSQL"):
+            call_command("bench_api", concurrency=2)
+
+
+class DatabasePoolMetricsTests(SimpleTestCase):
+    class FakePool:
+        def get_stats(self):
+            return {"pool_size": 4, "requests_num": 120, "requests_wait_ms": 2500, "unknown_stat": 1}
+
+    def test_pool_stats_are_exposed(self):
+        self.assertEqual(dbpool.collect(), [])
+        pools = {"default": self.FakePool()}
+        with mock.patch.object(type(connections["default"]), "_connection_pools", pools, create=True):
+            lines = dbpool.collect()
+        self.assertIn('db_pool_connections{alias="default"} 4.0', lines)
+        self.assertIn('db_pool_requests_total{alias="default"} 120.0', lines)
+        self.assertIn('db_pool_request_wait_seconds_total{alias="default"} 2.5', lines)
+        self.assertIn("# TYPE db_pool_request_wait_seconds_total counter", lines)
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Primary and replica as two separate SQLite files; the replica never
+    receives writes, so a row only visible on the primary shows where a read went.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added after the runner's database checks, which only know "default".
+        handle, cls.replica_path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(handle)
+        default = connections.settings["default"]
+        connections.settings["replica"] = {
+            **default,
+            "NAME": cls.replica_path,
+            "TEST": {**default["TEST"], "MIRROR": None},
+        }
+        cls.databases = {"default", "replica"}
+        call_command("migrate", database="replica", verbosity=0)
+        cls.routing = override_settings(DATABASE_ROUTERS=["core.routers.ReplicaRouter"], JOBS_ALWAYS_EAGER=True)
+        cls.routing.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.routing.disable()
+        super().tearDownClass()
+        connections["replica"].close()
+        del connections.settings["replica"]
+        del cls.databases
+        os.remove(cls.replica_path)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="writer")
+
+    def test_reads_go_to_replica_unless_pinned(self):
+        self.assertFalse(User.objects.filter(username="writer").exists())
+        with routers.primary():
+            self.assertTrue(User.objects.filter(username="writer").exists())
+        with transaction.atomic():
+            self.assertTrue(User.objects.filter(username="writer").exists())
+
+    def test_own_write_pins_following_reads(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        # Authentication always reads the user from the primary.
+        self.assertEqual(client.get("/api/notes/").json(), [])
+
+        response = client.post("/api/notes/", {"title": "T", "subject": "S", "category": "C", "content": "x"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(client.get("/api/notes/").json()), 1)
+
+        cache.clear()  # pin expired: back to the replica, which has no notes
+        self.assertEqual(client.get("/api/notes/").json(), [])
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.tiered = caching.TieredCache("tests", max_entries=2)
+        self.calls = 0
+
+    def compute(self, value="value"):
+        def build():
+            self.calls += 1
+            return value
+
+        return build
+
+    def test_hits_come_from_l1_then_l2(self):
+        self.assertEqual(self.tiered.get_or_set("key", self.compute(), 60), "value")
+        self.assertEqual(self.tiered.get_or_set("key", self.compute(), 60), "value")
+        self.tiered.clear_local()
+        self.assertEqual(self.tiered.get("key"), "value")
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(
+            {stat: self.tiered.stats[stat] for stat in ("l1_hits", "l2_hits", "misses")},
+            {"l1_hits": 1, "l2_hits": 1, "misses": 1},
+        )
+        self.assertIn('cache_lookups_total{namespace="tests",result="l1_hit"} 1.0', caching.collect())
+
+    def test_versions_and_lru_bound(self):
+        self.tiered.set("key", "v1", 60, version=1)
+        self.tiered.set("key", "v2", 60, version=2)
+        self.tiered.set("other", "x", 60)
+        self.assertEqual(len(self.tiered._l1), 2)
+        self.assertEqual((self.tiered.get("key", version=1), self.tiered.get("key", version=2)), ("v1", "v2"))
+        self.tiered.delete("key", version=1)
+        self.assertIsNone(self.tiered.get("key", version=1))
+
+    def test_tag_invalidation_reaches_other_processes(self):
+        other = caching.TieredCache("tests", l1_ttl=0)  # another worker with no L1 reuse
+        self.tiered.get_or_set("a", self.compute("a"), 60, tags=["user:1"])
+        self.tiered.get_or_set("b", self.compute("b"), 60, tags=["user:2"])
+        self.assertEqual(other.get("a"), "a")
+
+        other.invalidate("user:1")
+        self.assertIsNone(other.get("a"))
+        self.assertEqual(other.get("b"), "b")
+        # This process sees the new tag version once its L1 copy expires.
+        self.tiered.clear_local()
+        self.assertEqual(self.tiered.get_or_set("a", self.compute("a2"), 60, tags=["user:1"]), "a2")
+        self.assertEqual(self.calls, 3)
+
+    def test_hot_entry_is_recomputed_before_expiry(self):
+        eager = caching.TieredCache("tests", beta=1e9)
+        eager.get_or_set("key", lambda: time.sleep(0.01) or "old", 60)
+        self.assertEqual(eager.get_or_set("key", self.compute("new"), 60), "new")
+        self.assertEqual(eager.stats["early_recomputes"], 1)
+        lazy = caching.TieredCache("tests", beta=0)
+        self.assertEqual(lazy.get_or_set("key", self.compute("newer"), 60), "new")
+
+    def test_concurrent_misses_compute_once(self):
+        barrier = threading.Barrier(4)
+
+        def slow():
+            self.calls += 1
+            time.sleep(0.05)
+            return "value"
+
+        def worker():
+            barrier.wait()
+            self.tiered.get_or_set("key", slow, 60)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
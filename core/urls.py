@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import JobStatusView, MetricsView
+
+urlpatterns = [
+    path("metrics/", MetricsView.as_view(), name="metrics"),
+    path("jobs/<str:job_id>/", JobStatusView.as_view(), name="job-status"),
+]
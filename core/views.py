@@ -0,0 +1,61 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.permissions import AllowAny, BasePermission
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import jobs
+from .instrumentation import render_metrics
+
+
+class HasMetricsAccess(BasePermission):
+    """
+    Allow scrapers presenting ``Authorization: Bearer <METRICS_TOKEN>``,
+    or staff users when no token is configured.
+    """
+
+    def has_permission(self, request, view):
+        expected = getattr(settings, "METRICS_TOKEN", "")
+        if expected:
+            header = request.META.get("HTTP_AUTHORIZATION", "")
+            supplied = header[len("Bearer "):] if header.startswith("Bearer ") else ""
+            return hmac.compare_digest(supplied.encode(), expected.encode())
+        return bool(request.user and request.user.is_staff)
+
+
+class MetricsView(APIView):
+    permission_classes = [HasMetricsAccess]
+    throttle_classes = []
+
+    def get_authenticators(self):
+        # A scraper token is not a JWT; skip JWT decoding when one is configured.
+        if getattr(settings, "METRICS_TOKEN", ""):
+            return []
+        return super().get_authenticators()
+
+    def get(self, request):
+        return HttpResponse(
+            render_metrics(),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
+
+
+class JobStatusView(APIView):
+    """
+    Progress of a background job. The random job id is the capability: it is
+    only handed to the user who started the job, and account-deletion jobs
+    must stay readable after the account can no longer authenticate.
+    """
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request, job_id):
+        state = jobs.get(job_id)
+        if state is None:
+            return Response({"detail": "Job not found."}, status=404)
+        return Response(
+            {key: state[key] for key in ("id", "kind", "status", "progress", "result", "error")}
+        )
@@ -0,0 +1,42 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from mailer import outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Send queued outbound email. Runs once by default; use --loop for a dedicated "
+        "worker (set EMAIL_OUTBOX_AUTOSTART=false on web processes in that case)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Keep polling the outbox.")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds between polls with --loop.")
+        parser.add_argument("--batch-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        smtp = get_connection(fail_silently=False)
+        requeued_at = None
+        try:
+            while True:
+                close_old_connections()
+                if requeued_at is None or time.monotonic() - requeued_at >= outbox.REQUEUE_EVERY_SECONDS:
+                    requeued_at = time.monotonic()
+                    requeued = outbox.requeue_stale()
+                    if requeued:
+                        self.stdout.write(f"Requeued {requeued} stale message(s).")
+                sent = outbox.send_pending(batch_size=options["batch_size"], smtp=smtp)
+                if sent:
+                    self.stdout.write(f"Processed {sent} message(s).")
+                if not options["loop"]:
+                    break
+                if not sent:
+                    # Don't hold an idle SMTP session open between polls.
+                    smtp.close()
+                    time.sleep(options["interval"])
+        finally:
+            smtp.close()
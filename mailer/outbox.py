@@ -0,0 +1,200 @@
+"""
+DB-backed outbound mail queue.
+
+Request handlers call ``enqueue`` (a single INSERT) and return immediately.
+A sender drains the queue in batches over one persistent SMTP connection,
+retrying failures with exponential backoff. The sender runs either as a
+daemon thread inside the web process (started after the enqueuing
+transaction commits) or as a dedicated worker via ``manage.py send_outbox``.
+
+Message content is built at send time by a builder registered for the row's
+``kind``, so request paths never do per-recipient work such as user lookups.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+_builders = {}
+
+# How often a long-running sender returns rows stuck in ``sending`` (left by
+# a process that died mid-send) to the queue.
+REQUEUE_EVERY_SECONDS = 60
+
+
+def register(kind):
+    """
+    Register ``builder(payload) -> EmailMessage | None`` for ``kind``.
+    Returning ``None`` marks the row as skipped (nothing to send).
+    """
+
+    def decorator(builder):
+        _builders[kind] = builder
+        return builder
+
+    return decorator
+
+
+@register("raw")
+def _build_raw(payload):
+    return EmailMessage(
+        subject=payload["subject"],
+        body=payload["body"],
+        from_email=payload.get("from_email") or getattr(settings, "DEFAULT_FROM_EMAIL", None),
+        to=payload["to"],
+    )
+
+
+def enqueue(kind, payload):
+    email = OutboundEmail.objects.create(kind=kind, payload=payload)
+    if getattr(settings, "EMAIL_OUTBOX_AUTOSTART", True):
+        transaction.on_commit(wake)
+    return email
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _backoff(attempts):
+    base = _setting("EMAIL_OUTBOX_RETRY_BASE_SECONDS", 30)
+    cap = _setting("EMAIL_OUTBOX_RETRY_MAX_SECONDS", 3600)
+    return timedelta(seconds=min(cap, base * (2 ** max(attempts - 1, 0))))
+
+
+def _claim_batch(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status="pending", next_attempt_at__lte=now)
+            .order_by("id")[:batch_size]
+        )
+        if rows:
+            # next_attempt_at doubles as the claim time so requeue_stale can
+            # recover rows from a sender that died mid-batch.
+            OutboundEmail.objects.filter(id__in=[row.id for row in rows]).update(
+                status="sending", next_attempt_at=now
+            )
+    return rows
+
+
+def _mark_failed(row, exc):
+    row.attempts += 1
+    row.last_error = f"{type(exc).__name__}: {exc}"[:2000]
+    if row.attempts >= _setting("EMAIL_OUTBOX_MAX_ATTEMPTS", 5):
+        row.status = "failed"
+        logger.error("Giving up on outbound email %s after %s attempts", row.id, row.attempts)
+    else:
+        row.status = "pending"
+        row.next_attempt_at = timezone.now() + _backoff(row.attempts)
+    row.save(update_fields=["attempts", "last_error", "status", "next_attempt_at"])
+
+
+def send_pending(batch_size=None, max_batches=None, smtp=None):
+    """
+    Send due messages; returns the number of rows processed. ``smtp`` lets a
+    long-running worker keep one backend connection open across calls.
+    """
+    batch_size = batch_size or _setting("EMAIL_OUTBOX_BATCH_SIZE", 50)
+    own_connection = smtp is None
+    smtp = smtp or get_connection(fail_silently=False)
+    processed = 0
+    batches = 0
+    try:
+        while max_batches is None or batches < max_batches:
+            rows = _claim_batch(batch_size)
+            if not rows:
+                break
+            batches += 1
+            for row in rows:
+                processed += 1
+                builder = _builders.get(row.kind)
+                try:
+                    if builder is None:
+                        raise LookupError(f"No outbox builder registered for {row.kind!r}")
+                    message = builder(row.payload)
+                    if message is None:
+                        row.status = "skipped"
+                        row.save(update_fields=["status"])
+                        continue
+                    message.connection = smtp
+                    smtp.open()
+                    smtp.send_messages([message])
+                except Exception as exc:
+                    logger.warning("Failed to send outbound email %s: %s", row.id, exc)
+                    # The SMTP session may be unusable after an error; reconnect lazily.
+                    smtp.close()
+                    _mark_failed(row, exc)
+                    continue
+                row.status = "sent"
+                row.sent_at = timezone.now()
+                row.attempts += 1
+                row.save(update_fields=["status", "sent_at", "attempts"])
+    finally:
+        if own_connection:
+            smtp.close()
+    return processed
+
+
+def requeue_stale(older_than=timedelta(minutes=10)):
+    """Return rows stuck in ``sending`` to the queue."""
+    cutoff = timezone.now() - older_than
+    return OutboundEmail.objects.filter(status="sending", next_attempt_at__lte=cutoff).update(status="pending")
+
+
+class _Sender(threading.Thread):
+    def __init__(self):
+        super().__init__(name="mail-outbox", daemon=True)
+        self.event = threading.Event()
+        self.requeued_at = None
+
+    def drain(self, smtp):
+        """Requeue stale rows (on the first pass, then every ``REQUEUE_EVERY_SECONDS``) and send what is due."""
+        now = time.monotonic()
+        if self.requeued_at is None or now - self.requeued_at >= REQUEUE_EVERY_SECONDS:
+            self.requeued_at = now
+            requeued = requeue_stale()
+            if requeued:
+                logger.warning("Requeued %s outbound email(s) left in 'sending'", requeued)
+        while send_pending(smtp=smtp):
+            pass
+
+    def run(self):
+        poll = _setting("EMAIL_OUTBOX_POLL_SECONDS", 30)
+        smtp = get_connection(fail_silently=False)
+        while True:
+            self.event.wait(poll)
+            self.event.clear()
+            try:
+                close_old_connections()
+                self.drain(smtp)
+            except Exception:
+                logger.exception("Mail outbox sender loop failed")
+            finally:
+                # Idle: release the SMTP session and the DB connection.
+                smtp.close()
+                connection.close()
+
+
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def wake():
+    """Start the in-process sender if needed and nudge it to drain the queue."""
+    global _sender
+    with _sender_lock:
+        if _sender is None or not _sender.is_alive():
+            _sender = _Sender()
+            _sender.start()
+    _sender.event.set()
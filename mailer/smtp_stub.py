@@ -0,0 +1,135 @@
+"""
+Local stand-in SMTP server.
+
+Speaks just enough plain SMTP (no TLS/AUTH) for Django's SMTP backend, and
+records every accepted message so tests can assert on what was delivered and
+how many connections the sender opened. ``fail_next`` makes the next N DATA
+commands fail with a 451 to exercise the retry path.
+"""
+import email
+import socketserver
+import threading
+import time
+from email import policy
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connection_count += 1
+        self.reply("220 stub.smtp ESMTP ready")
+        sender, recipients = None, []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            command, _, argument = raw.decode("utf-8", "replace").strip().partition(" ")
+            command = command.upper()
+            if command == "EHLO":
+                self.wfile.write(b"250-stub.smtp\r\n250-8BITMIME\r\n250 SMTPUTF8\r\n")
+            elif command == "HELO":
+                self.reply("250 stub.smtp")
+            elif command == "MAIL":
+                sender, recipients = argument.partition(":")[2].strip(" <>"), []
+                self.reply("250 OK")
+            elif command == "RCPT":
+                recipients.append(argument.partition(":")[2].strip(" <>"))
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line in (b".\r\n", b".\n"):
+                        break
+                    lines.append(line[1:] if line.startswith(b"..") else line)
+                if server.delay:
+                    time.sleep(server.delay)
+                with server.lock:
+                    if server.fail_next:
+                        server.fail_next -= 1
+                        self.reply("451 Temporary failure")
+                        continue
+                    server.messages.append(
+                        {
+                            "from": sender,
+                            "to": recipients,
+                            "message": email.message_from_bytes(b"".join(lines), policy=policy.default),
+                        }
+                    )
+                self.reply("250 OK queued")
+            elif command in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class _SMTPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class StubSMTPServer:
+    """Runs the stub server on a background thread; use as a context manager."""
+
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0):
+        self.server = _SMTPServer((host, port), _SMTPHandler)
+        self.server.lock = threading.Lock()
+        self.server.messages = []
+        self.server.connection_count = 0
+        self.server.fail_next = 0
+        self.server.delay = float(delay)
+        self._thread = None
+
+    @property
+    def host(self):
+        return self.server.server_address[0]
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    @property
+    def messages(self):
+        return self.server.messages
+
+    @property
+    def connection_count(self):
+        return self.server.connection_count
+
+    def fail_next(self, count=1):
+        self.server.fail_next = count
+
+    def settings(self):
+        """Settings for ``override_settings`` pointing Django's SMTP backend here."""
+        return {
+            "EMAIL_BACKEND": "django.core.mail.backends.smtp.EmailBackend",
+            "EMAIL_HOST": self.host,
+            "EMAIL_PORT": self.port,
+            "EMAIL_HOST_USER": "",
+            "EMAIL_HOST_PASSWORD": "",
+            "EMAIL_USE_TLS": False,
+            "EMAIL_USE_SSL": False,
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,142 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.mail import get_connection
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from . import outbox
+from .models import OutboundEmail
+from .smtp_stub import StubSMTPServer
+
+
+class _StubSMTPMixin:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.smtp = StubSMTPServer().start()
+        cls.smtp_settings = override_settings(
+            **cls.smtp.settings(),
+            PASSWORD_RESET_URL="https://frontend.example.com/reset-password",
+            EMAIL_OUTBOX_MAX_ATTEMPTS=2,
+        )
+        cls.smtp_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.smtp_settings.disable()
+        cls.smtp.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.smtp.messages.clear()
+        self.smtp.server.connection_count = 0
+        self.smtp.fail_next(0)
+
+
+def _raw(to):
+    return {"subject": "Hello", "body": "Body", "to": [to]}
+
+
+class OutboxSenderTests(_StubSMTPMixin, TestCase):
+    def test_batch_is_sent_over_one_connection(self):
+        for i in range(5):
+            outbox.enqueue("raw", _raw(f"user{i}@example.com"))
+
+        self.assertEqual(outbox.send_pending(batch_size=2), 5)
+
+        self.assertEqual(len(self.smtp.messages), 5)
+        self.assertEqual(self.smtp.connection_count, 1)
+        self.assertEqual(OutboundEmail.objects.filter(status="sent").count(), 5)
+
+    def test_failure_is_retried_with_backoff(self):
+        email = outbox.enqueue("raw", _raw("retry@example.com"))
+        self.smtp.fail_next(1)
+
+        outbox.send_pending()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ("pending", 1))
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertIn("451", email.last_error)
+
+        # Not due yet: nothing is sent.
+        self.assertEqual(outbox.send_pending(), 0)
+
+        OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        outbox.send_pending()
+        email.refresh_from_db()
+        self.assertEqual(email.status, "sent")
+        self.assertEqual([m["to"] for m in self.smtp.messages], [["retry@example.com"]])
+
+    def test_gives_up_after_max_attempts(self):
+        email = outbox.enqueue("raw", _raw("broken@example.com"))
+        self.smtp.fail_next(5)
+        for _ in range(2):
+            OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+            outbox.send_pending()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ("failed", 2))
+
+    def test_sender_loop_requeues_rows_left_in_sending(self):
+        # A worker killed mid-send leaves its claimed row behind.
+        stuck = OutboundEmail.objects.create(
+            kind="raw", payload=_raw("stuck@example.com"), status="sending",
+            next_attempt_at=timezone.now() - timedelta(hours=1),
+        )
+        sender = outbox._Sender()
+        smtp = get_connection(fail_silently=False)
+        sender.drain(smtp)
+        stuck.refresh_from_db()
+        self.assertEqual(stuck.status, "sent")
+        self.assertEqual([m["to"] for m in self.smtp.messages], [["stuck@example.com"]])
+
+        # Later passes requeue again once REQUEUE_EVERY_SECONDS have gone by.
+        OutboundEmail.objects.filter(pk=stuck.pk).update(
+            status="sending", next_attempt_at=timezone.now() - timedelta(hours=1)
+        )
+        sender.drain(smtp)
+        self.assertEqual(OutboundEmail.objects.get(pk=stuck.pk).status, "sending")
+        sender.requeued_at -= outbox.REQUEUE_EVERY_SECONDS
+        sender.drain(smtp)
+        smtp.close()
+        self.assertEqual(OutboundEmail.objects.get(pk=stuck.pk).status, "sent")
+
+    def test_enqueue_wakes_sender_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            outbox.enqueue("raw", _raw("wake@example.com"))
+        self.assertEqual(callbacks, [outbox.wake])
+
+
+class PasswordResetOutboxTests(_StubSMTPMixin, APITestCase):
+    def _request(self, email):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post("/api/auth/password-reset/", {"email": email})
+        self.assertEqual(response.status_code, 200)
+        return response, context.captured_queries
+
+    def test_response_does_not_depend_on_account(self):
+        User.objects.create_user(username="known", email="known@example.com")
+        known, known_queries = self._request("Known@example.com")
+        unknown, unknown_queries = self._request("nobody@example.com")
+
+        self.assertEqual(known.data, unknown.data)
+        self.assertEqual(len(known_queries), len(unknown_queries))
+        self.assertFalse(any("auth_user" in q["sql"] for q in known_queries))
+
+    def test_sender_delivers_reset_link_and_skips_unknown_address(self):
+        user = User.objects.create_user(username="known", email="known@example.com")
+        self._request("known@example.com")
+        self._request("nobody@example.com")
+
+        outbox.send_pending()
+
+        self.assertEqual(len(self.smtp.messages), 1)
+        delivered = self.smtp.messages[0]
+        self.assertEqual(delivered["to"], [user.email])
+        self.assertIn("https://frontend.example.com/reset-password?uid=", delivered["message"].get_content())
+        self.assertEqual(
+            sorted(OutboundEmail.objects.values_list("status", flat=True)), ["sent", "skipped"]
+        )
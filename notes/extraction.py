@@ -0,0 +1,117 @@
+"""
+Text extraction from uploaded PDF and DOCX files.
+
+These functions run in the worker processes of ``core.processes``, which
+are started with ``spawn``, so this module imports nothing from Django and
+loads the parsing libraries only when a worker first needs them. PDF text
+comes from pypdfium2 (fast, C) with pdfplumber as a fallback; DOCX from
+python-docx.
+"""
+import signal
+from contextlib import contextmanager
+
+from core.lazy import lazy_import
+
+pdfium = lazy_import("pypdfium2")
+pdfplumber = lazy_import("pdfplumber")
+docx = lazy_import("docx")
+
+PDF = "pdf"
+DOCX = "docx"
+
+
+class ExtractionTimeout(Exception):
+    pass
+
+
+def sniff(head, filename=""):
+    """``PDF``, ``DOCX`` or ``None`` from a file's first bytes (and its name, to tell DOCX from other zips)."""
+    if head.startswith(b"%PDF-"):
+        return PDF
+    if head.startswith(b"PK\x03\x04") and filename.lower().endswith(".docx"):
+        return DOCX
+    return None
+
+
+@contextmanager
+def _deadline(seconds):
+    # Workers run tasks on their main thread, so SIGALRM can interrupt a
+    # parser stuck in Python code. The parent also waits with a timeout, for
+    # parsers stuck inside C code or platforms without SIGALRM.
+    if not seconds or not hasattr(signal, "SIGALRM"):
+        yield
+        return
+
+    def expire(signum, frame):
+        raise ExtractionTimeout()
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def pdf_page_count(path):
+    if pdfium is not None:
+        document = pdfium.PdfDocument(path)
+        try:
+            return len(document)
+        finally:
+            document.close()
+    with pdfplumber.open(path) as document:
+        return len(document.pages)
+
+
+def _pdfium_page(document, number):
+    page = document[number]
+    try:
+        textpage = page.get_textpage()
+        try:
+            return textpage.get_text_range()
+        finally:
+            textpage.close()
+    finally:
+        page.close()
+
+
+def pdf_pages(path, first, last, timeout=None):
+    """
+    Text of pages ``first``..``last - 1`` as ``(page_number, text)`` pairs; a
+    page that fails or runs out of its ``timeout`` seconds gives ``None``.
+    """
+    results = []
+    if pdfium is not None:
+        document = pdfium.PdfDocument(path)
+        read = lambda number: _pdfium_page(document, number)  # noqa: E731
+        close = document.close
+    else:
+        document = pdfplumber.open(path)
+        read = lambda number: document.pages[number].extract_text() or ""  # noqa: E731
+        close = document.close
+    try:
+        for number in range(first, last):
+            try:
+                with _deadline(timeout):
+                    text = read(number)
+            except Exception:
+                text = None
+            results.append((number, text))
+    finally:
+        close()
+    return results
+
+
+def docx_paragraphs(path, timeout=None):
+    """Non-empty paragraphs of a DOCX file, then its table rows (cells joined by `` | ``)."""
+    with _deadline(timeout):
+        document = docx.Document(path)
+        paragraphs = [paragraph.text for paragraph in document.paragraphs if paragraph.text.strip()]
+        for table in document.tables:
+            for row in table.rows:
+                cells = [cell.text.strip() for cell in row.cells]
+                if any(cells):
+                    paragraphs.append(" | ".join(cells))
+    return paragraphs
@@ -0,0 +1,243 @@
+"""
+Importing PDF and DOCX files into notes.
+
+``NoteImportView`` reads the upload through ``StreamingUploadHandler``,
+which writes it to a temporary file chunk by chunk (hashing it on the way)
+instead of holding it in memory, and ``submit`` moves that file into
+``NOTES_IMPORT_DIR`` and starts ``import_document`` as a background job
+(``core.jobs``). The request never parses the document.
+
+The job hands the CPU-heavy parsing (``notes.extraction``) to the shared
+worker processes of ``core.processes``. PDFs
+are split into tasks of ``NOTES_IMPORT_PAGES_PER_TASK`` pages so one large
+book uses every worker, and progress is reported per finished task. A page
+that fails or exceeds ``NOTES_IMPORT_PAGE_TIMEOUT`` seconds is skipped and
+counted; if no task finishes for a whole task's worth of timeouts the pool
+is replaced and the remaining pages are counted as failed.
+
+The text is saved as one note, or as several of at most
+``NOTES_IMPORT_NOTE_CHARS`` characters split at page/paragraph boundaries.
+Notes are keyed by ``client_id`` (given, or derived from the file's
+SHA-256), so importing the same file again updates the same notes.
+"""
+import hashlib
+import logging
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from django.db import transaction
+from django.db.models import Q
+
+from core import jobs, processes
+from search import indexing
+from . import extraction
+from .models import Note
+
+logger = logging.getLogger(__name__)
+
+IMPORT_TAG = "imported"
+
+
+class NoTextFound(Exception):
+    """The document has no extractable text (e.g. a scan without OCR)."""
+
+
+class StreamingUploadHandler(TemporaryFileUploadHandler):
+    """
+    Writes every upload to a temporary file, whatever its size, and records
+    its SHA-256 as ``file.sha256``. Files over ``NOTES_IMPORT_MAX_BYTES`` are
+    dropped and flagged with ``too_large``.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.too_large = False
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > getattr(settings, "NOTES_IMPORT_MAX_BYTES", 50 * 1024 * 1024):
+            self.too_large = True
+            self.file.close()
+            raise SkipFile()
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.digest.hexdigest()
+        return file
+
+
+def _page_timeout():
+    return getattr(settings, "NOTES_IMPORT_PAGE_TIMEOUT", 10)
+
+
+def _extract_pdf(job, path):
+    pool = processes.get_pool()
+    timeout = _page_timeout()
+    try:
+        total = pool.submit(extraction.pdf_page_count, path).result(timeout=timeout)
+    except FutureTimeout:
+        processes.discard(pool)
+        raise
+    job.progress(0, total, step="extracting")
+
+    per_task = max(1, getattr(settings, "NOTES_IMPORT_PAGES_PER_TASK", 8))
+    pending = {
+        pool.submit(extraction.pdf_pages, path, first, min(first + per_task, total), timeout): first
+        for first in range(0, total, per_task)
+    }
+    pages = {}
+    # Each task stops its own slow pages; this only catches a worker that
+    # stopped responding altogether.
+    stall = timeout * per_task + 5
+    while pending:
+        done, _ = wait(pending, timeout=stall, return_when=FIRST_COMPLETED)
+        if not done:
+            logger.warning("PDF import stalled with %d page task(s) left; restarting the pool", len(pending))
+            processes.discard(pool)
+            break
+        for future in done:
+            first = pending.pop(future)
+            try:
+                pages.update(future.result())
+            except Exception:
+                logger.exception("PDF page task starting at page %d failed", first)
+        job.progress(len(pages), total, step="extracting")
+
+    texts = [pages.get(number) for number in range(total)]
+    failed = [number + 1 for number, text in enumerate(texts) if text is None]
+    return [text for text in texts if text], total, failed
+
+
+def _extract_docx(job, path):
+    job.progress(0, 1, step="extracting")
+    pool = processes.get_pool()
+    timeout = _page_timeout() * 10
+    try:
+        paragraphs = pool.submit(extraction.docx_paragraphs, path, timeout).result(timeout=timeout + 5)
+    except FutureTimeout:
+        processes.discard(pool)
+        raise
+    job.progress(1, 1, step="extracting")
+    # A DOCX has no fixed pages; its paragraphs are the blocks notes split between.
+    return paragraphs, 1, []
+
+
+def _clean(text):
+    # PostgreSQL text cannot hold NUL; pdfium ends lines with CRLF.
+    return text.replace("\x00", "").replace("\r\n", "\n").replace("\r", "\n").strip()
+
+
+def split_parts(blocks, limit):
+    """Join text blocks into parts of at most ``limit`` characters, breaking between blocks where possible."""
+    parts, current = [], ""
+    for block in blocks:
+        while len(block) > limit:
+            if current:
+                parts.append(current)
+                current = ""
+            cut = block.rfind("\n", 0, limit)
+            cut = cut if cut > limit // 2 else limit
+            parts.append(block[:cut].rstrip())
+            block = block[cut:].lstrip()
+        if not block:
+            continue
+        if current and len(current) + 2 + len(block) > limit:
+            parts.append(current)
+            current = ""
+        current = f"{current}\n\n{block}" if current else block
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _part_client_id(base, number):
+    return base if number == 1 else f"{base}:{number}"
+
+
+def _save_notes(user_id, parts, title, subject, category, client_id):
+    with transaction.atomic():
+        existing = {
+            note.client_id: note
+            for note in Note.objects.select_for_update().filter(
+                Q(client_id=client_id) | Q(client_id__startswith=f"{client_id}:"), user_id=user_id
+            )
+        }
+        notes = []
+        for number, content in enumerate(parts, start=1):
+            part_client_id = _part_client_id(client_id, number)
+            note = existing.pop(part_client_id, None) or Note(user_id=user_id, client_id=part_client_id)
+            note.title = (title if len(parts) == 1 else f"{title} ({number}/{len(parts)})")[:200]
+            note.subject = subject
+            note.category = category
+            note.tags = note.tags or IMPORT_TAG
+            note.content = content
+            note.save()
+            indexing.schedule(note)
+            notes.append(note)
+        # Parts left over from an earlier, longer version of the document.
+        if existing:
+            Note.objects.filter(pk__in=[note.pk for note in existing.values()]).delete()
+            transaction.on_commit(lambda: indexing.forget(user_id))
+    return [note.pk for note in notes]
+
+
+def import_document(job, user_id, path, kind, title, subject, category, client_id):
+    try:
+        extract = _extract_pdf if kind == extraction.PDF else _extract_docx
+        blocks, pages, failed = extract(job, path)
+        blocks = [text for text in map(_clean, blocks) if text]
+        if not blocks:
+            raise NoTextFound()
+        job.progress(pages - len(failed), pages, step="saving")
+        parts = split_parts(blocks, getattr(settings, "NOTES_IMPORT_NOTE_CHARS", 100_000))
+        note_ids = _save_notes(user_id, parts, title, subject, category, client_id)
+    finally:
+        Path(path).unlink(missing_ok=True)
+    return {
+        "note_ids": note_ids,
+        "pages": pages,
+        "failed_pages": failed[:100],
+        "failed_page_count": len(failed),
+        "characters": sum(len(part) for part in parts),
+    }
+
+
+def _import_dir():
+    directory = Path(getattr(settings, "NOTES_IMPORT_DIR", None) or Path(settings.BASE_DIR) / ".imports")
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def _sweep(directory):
+    # Files whose job never ran (process restarted before it started).
+    cutoff = time.time() - getattr(settings, "JOBS_RESULT_TTL", 24 * 3600)
+    for path in directory.iterdir():
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def submit(user_id, upload, kind, title, subject, category, client_id=None):
+    """Move ``upload`` (a ``TemporaryUploadedFile``) out of the request and start its import; returns the job id."""
+    directory = _import_dir()
+    _sweep(directory)
+    path = directory / f"{uuid.uuid4().hex}.{kind}"
+    file_move_safe(upload.temporary_file_path(), path)
+    upload.close()
+    client_id = client_id or f"import-{upload.sha256[:32]}"
+    return jobs.submit("note_import", import_document, user_id, str(path), kind, title, subject, category, client_id)
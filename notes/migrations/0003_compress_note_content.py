@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-19 02:40
+
+import core.fields
+from django.db import migrations
+
+
+def compress_content(apps, schema_editor):
+    core.fields.compress_existing(apps.get_model("notes", "Note"), "content")
+
+
+def decompress_content(apps, schema_editor):
+    core.fields.decompress_existing(apps.get_model("notes", "Note"), "content")
+
+
+class Migration(migrations.Migration):
+
+    # Each batch commits on its own so large tables are not converted in
+    # one long transaction.
+    atomic = False
+
+    dependencies = [
+        ('notes', '0002_note_client_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='note',
+            name='content',
+            field=core.fields.CompressedTextField(),
+        ),
+        migrations.RunPython(compress_content, decompress_content),
+    ]
@@ -4,6 +4,8 @@ from django.db import models
 from django.db import models
 from django.contrib.auth.models import User
 
+from core.fields import CompressedTextField
+
 class Note(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     client_id = models.CharField(max_length=64, null=True, blank=True, db_index=True)
@@ -11,8 +13,9 @@ class Note(models.Model):
     subject = models.CharField(max_length=100)
     category = models.CharField(max_length=50)
     tags = models.TextField(blank=True)
-    content = models.TextField()
+    content = CompressedTextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         constraints = [
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Note
+from .structs import split_tags
 
 
 class NoteSerializer(serializers.ModelSerializer):
@@ -12,11 +13,7 @@ class NoteSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        raw_tags = (instance.tags or "").strip()
-        if raw_tags:
-            data["tags"] = [t for t in (tag.strip() for tag in raw_tags.split(",")) if t]
-        else:
-            data["tags"] = []
+        data["tags"] = split_tags(instance.tags)
         return data
 
     def validate_tags(self, value):
@@ -55,3 +52,10 @@ class NoteSerializer(serializers.ModelSerializer):
             instance.tags = ", ".join(tags)
         instance.save()
         return instance
+
+
+class NoteListSerializer(NoteSerializer):
+    """List-mode representation (``?summary=1``): everything except ``content``."""
+
+    class Meta(NoteSerializer.Meta):
+        fields = ["id", "client_id", "title", "subject", "category", "tags", "created_at"]
@@ -0,0 +1,65 @@
+"""
+msgspec rows for the notes list (see ``core.fastjson``).
+
+Field order matches ``NoteSerializer``/``NoteListSerializer`` so the encoded
+JSON is identical to what the serializers produce.
+"""
+from datetime import datetime
+from operator import itemgetter
+from typing import Optional
+
+import msgspec
+
+from core import keyset
+from core.fields import CompressedTextField
+
+
+def split_tags(raw):
+    raw = (raw or "").strip()
+    if not raw:
+        return []
+    return [t for t in (tag.strip() for tag in raw.split(",")) if t]
+
+
+class NoteSummaryRow(msgspec.Struct):
+    id: int
+    client_id: Optional[str]
+    title: str
+    subject: str
+    category: str
+    tags: list
+    created_at: datetime
+
+
+class NoteRow(msgspec.Struct):
+    id: int
+    client_id: Optional[str]
+    title: str
+    subject: str
+    category: str
+    tags: list
+    content: str
+    created_at: datetime
+
+
+SUMMARY_FIELDS = ("id", "client_id", "title", "subject", "category", "tags", "created_at")
+FIELDS = SUMMARY_FIELDS + ("content",)
+
+
+def note_rows(queryset, summary=False):
+    if summary:
+        return [
+            NoteSummaryRow(id, client_id, title, subject, category, split_tags(tags), created_at)
+            for id, client_id, title, subject, category, tags, created_at in queryset.values_list(*SUMMARY_FIELDS)
+        ]
+    return [_note_row(*values) for values in queryset.values_list(*FIELDS)]
+
+
+def iter_note_rows(queryset, chunk_size):
+    """``NoteRow``s in id order, fetched ``chunk_size`` rows per query, for exports that must not hold every note."""
+    for values in keyset.rows(queryset.values_list(*FIELDS), chunk_size, itemgetter(0), "id"):
+        yield _note_row(*values)
+
+
+def _note_row(id, client_id, title, subject, category, tags, created_at, content):
+    return NoteRow(id, client_id, title, subject, category, split_tags(tags), CompressedTextField.decode(content), created_at)
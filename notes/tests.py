@@ -1,3 +1,342 @@
-from django.test import TestCase
+import io
+import tempfile
+from pathlib import Path
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from core.fields import MARKER, CompressedTextField, compress_existing
+from core.query_guard import QueryCountTestCase
+from sharing.models import ShareLink, ShareMember
+from . import extraction, ingestion
+from .models import Note
+from .serializers import NoteListSerializer, NoteSerializer
+
+
+def _user_with_notes(username, count):
+    user = User.objects.create_user(username=username, email=f"{username}@example.com")
+    Note.objects.bulk_create(
+        [
+            Note(
+                user=user,
+                title=f"Note {i}",
+                subject="Geography",
+                category="Revision",
+                tags="erosion, rivers",
+                content="Rivers erode their banks." * 10,
+            )
+            for i in range(count)
+        ]
+    )
+    return user
+
+
+def _shared_note(username, scale):
+    """A note shared ``scale`` times, each share with one member."""
+    owner = _user_with_notes(username, 1)
+    note = Note.objects.get(user=owner)
+    shares = ShareLink.objects.bulk_create(
+        [ShareLink(created_by=owner, resource_type="note", note=note) for _ in range(scale)]
+    )
+    User.objects.bulk_create(
+        [User(username=f"{username}-member{i}", email=f"{username}-member{i}@example.com") for i in range(scale)]
+    )
+    members = User.objects.filter(username__startswith=f"{username}-member").order_by("id")
+    ShareMember.objects.bulk_create(
+        [ShareMember(share=share, user=member, added_by=owner) for share, member in zip(shares, members)]
+    )
+    return owner, note
+
+
+def _pdf(pages):
+    """A minimal PDF with one line of Helvetica text per page."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+            b"/Contents %d 0 R >>" % len(objects)
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def _docx(paragraphs):
+    document = extraction.docx.Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    table = document.add_table(rows=1, cols=2)
+    table.rows[0].cells[0].text, table.rows[0].cells[1].text = "Term", "Meander"
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+NOTE_PAYLOAD = {
+    "title": "Rivers",
+    "subject": "Geography",
+    "category": "Revision",
+    "tags": ["erosion", "rivers"],
+    "content": "Rivers erode their banks.",
+}
+
+
+class NotesQueryCountTests(QueryCountTestCase):
+    urlconf = "notes.urls"
+    url_prefix = "/api/notes/"
+    covered_routes = ("", "<int:pk>/", "import/")
+
+    def test_list(self):
+        self.assertConstantQueries("", "get", lambda scale: (_user_with_notes(f"list{scale}", scale), "", None))
+
+    def test_list_summary(self):
+        self.assertConstantQueries(
+            "", "get", lambda scale: (_user_with_notes(f"summary{scale}", scale), "?summary=1", None)
+        )
+
+    def test_list_summary_skips_content_column(self):
+        user = _user_with_notes("projection", 2)
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get("/api/notes/?summary=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("content", response.json()[0])
+        self.assertEqual(response.json()[0]["tags"], ["erosion", "rivers"])
+        # The other notes_note query is the ETag aggregate (see core.conditional).
+        note_selects = [
+            q["sql"] for q in context.captured_queries if 'FROM "notes_note"' in q["sql"] and "COUNT(" not in q["sql"]
+        ]
+        self.assertEqual(len(note_selects), 1)
+        self.assertNotIn('"notes_note"."content"', note_selects[0])
+
+    def test_fast_list_matches_serializers(self):
+        user = _user_with_notes("fastlist", 3)
+        Note.objects.filter(user=user).update(tags=" a, ,b ")
+        Note.objects.create(user=user, title="Big", subject="S", category="C", content="Long text. " * 500)
+        self.client.force_authenticate(user)
+        notes = Note.objects.filter(user=user).order_by("-created_at")
+        for path, serializer in (
+            ("/api/notes/", NoteSerializer(notes, many=True)),
+            ("/api/notes/?summary=1", NoteListSerializer(notes, many=True)),
+        ):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path).content, JSONRenderer().render(serializer.data))
+
+    def test_create(self):
+        self.assertConstantQueries(
+            "",
+            "post",
+            lambda scale: (_user_with_notes(f"create{scale}", scale), "", NOTE_PAYLOAD),
+            expected_status=201,
+        )
+
+    def test_create_with_client_id_upsert(self):
+        def setup(scale):
+            user = _user_with_notes(f"upsert{scale}", scale)
+            Note.objects.filter(user=user).update(client_id=None)
+            Note.objects.filter(pk=Note.objects.filter(user=user).first().pk).update(client_id="client-1")
+            return user, "", dict(NOTE_PAYLOAD, client_id="client-1")
+
+        self.assertConstantQueries("", "post", setup, expected_status=201)
+
+    def test_detail(self):
+        def setup(scale):
+            owner, note = _shared_note(f"detail{scale}", scale)
+            return owner, f"{note.id}/", None
+
+        self.assertConstantQueries("<int:pk>/", "get", setup)
+
+    def test_update(self):
+        def setup(scale):
+            owner, note = _shared_note(f"update{scale}", scale)
+            return owner, f"{note.id}/", NOTE_PAYLOAD
+
+        self.assertConstantQueries("<int:pk>/", "put", setup)
+
+    def test_delete(self):
+        def setup(scale):
+            owner, note = _shared_note(f"destroy{scale}", scale)
+            return owner, f"{note.id}/", None
+
+        self.assertConstantQueries("<int:pk>/", "delete", setup, expected_status=204)
+
+    def test_import(self):
+        def setup(scale):
+            user = _user_with_notes(f"import{scale}", scale)
+            return user, "import/", {"file": SimpleUploadedFile("rivers.pdf", _pdf(["Rivers"]))}
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(NOTES_IMPORT_DIR=directory):
+            self.assertConstantQueries("import/", "post", setup, expected_status=202, format="multipart")
+
+
+@override_settings(COMPRESSED_TEXT_THRESHOLD=100)
+class CompressedContentTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="compress")
+
+    def _stored(self, note):
+        return Note.objects.filter(pk=note.pk).values_list("content", flat=True).get()
+
+    def test_large_content_is_stored_compressed_and_read_back(self):
+        text = "Rivers erode their banks. " * 40
+        note = Note.objects.create(user=self.user, title="T", subject="S", category="C", content=text)
+
+        stored = self._stored(note)
+        self.assertTrue(stored.startswith(MARKER))
+        self.assertLess(len(stored), len(text))
+        self.assertEqual(CompressedTextField.decode(stored), text)
+
+        loaded = Note.objects.get(pk=note.pk)
+        self.assertTrue(loaded.__dict__["content"].startswith(MARKER))
+        self.assertEqual(loaded.content, text)
+        self.assertEqual(Note.objects.defer("content").get(pk=note.pk).content, text)
+
+    def test_small_and_marker_prefixed_content(self):
+        small = Note.objects.create(user=self.user, title="T", subject="S", category="C", content="short")
+        self.assertEqual(self._stored(small), "short")
+
+        tricky = Note.objects.create(user=self.user, title="T", subject="S", category="C", content=MARKER + "zlib:x")
+        self.assertEqual(Note.objects.get(pk=tricky.pk).content, MARKER + "zlib:x")
+
+    def test_compress_existing_converts_plain_rows(self):
+        text = "Plain stored text. " * 20
+        with self.settings(COMPRESSED_TEXT_THRESHOLD=10**9):
+            notes = [
+                Note.objects.create(user=self.user, title=f"T{i}", subject="S", category="C", content=text)
+                for i in range(5)
+            ]
+        self.assertEqual(self._stored(notes[0]), text)
+
+        compress_existing(Note, "content", batch_size=2)
+
+        for note in notes:
+            self.assertTrue(self._stored(note).startswith(MARKER))
+            self.assertEqual(Note.objects.get(pk=note.pk).content, text)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.user = _user_with_notes("conditional", 2)
+        self.client.force_authenticate(self.user)
+
+    def test_repeat_poll_returns_304_until_a_note_changes(self):
+        first = self.client.get("/api/notes/")
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("Authorization", first["Vary"])
+
+        again = self.client.get("/api/notes/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b"")
+        self.assertNotEqual(
+            self.client.get("/api/notes/?summary=1", HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304
+        )
+
+        note = Note.objects.filter(user=self.user).first()
+        note.title = "Edited"
+        note.save()
+        changed = self.client.get("/api/notes/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], first["ETag"])
+
+    def test_detail_etag_changes_on_update(self):
+        note = Note.objects.filter(user=self.user).first()
+        etag = self.client.get(f"/api/notes/{note.id}/")["ETag"]
+        self.assertEqual(self.client.get(f"/api/notes/{note.id}/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.patch(f"/api/notes/{note.id}/", {"title": "New"})
+        self.assertEqual(self.client.get(f"/api/notes/{note.id}/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(JOBS_ALWAYS_EAGER=True, NOTES_IMPORT_PAGES_PER_TASK=2)
+class NoteImportTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="importer")
+        self.client.force_authenticate(self.user)
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(NOTES_IMPORT_DIR=self.directory))
+
+    def _import(self, name, content, **fields):
+        response = self.client.post(
+            "/api/notes/import/", {"file": SimpleUploadedFile(name, content), **fields}, format="multipart"
+        )
+        self.assertEqual(response.status_code, 202, response.content)
+        return self.client.get(response.json()["status_url"]).json()
+
+    def test_pdf_pages_are_extracted_in_order_into_one_note(self):
+        pages = [f"Page {number} about meanders" for number in range(1, 6)]
+        job = self._import("Rivers chapter.pdf", _pdf(pages), subject="Geography")
+
+        self.assertEqual(job["status"], "done", job)
+        self.assertEqual(job["progress"]["done"], 5)
+        self.assertEqual(job["result"]["pages"], 5)
+        self.assertEqual(job["result"]["failed_page_count"], 0)
+        note = Note.objects.get(pk=job["result"]["note_ids"][0])
+        self.assertEqual((note.title, note.subject, note.category, note.tags),
+                         ("Rivers chapter", "Geography", "Imported", "imported"))
+        self.assertEqual([line for line in note.content.split("\n\n")], pages)
+        self.assertEqual(list(Path(self.directory).iterdir()), [])
+
+    def test_reimport_updates_the_same_notes_and_drops_extra_parts(self):
+        with override_settings(NOTES_IMPORT_NOTE_CHARS=40):
+            first = self._import("book.pdf", _pdf(["First page of the book", "Second page of the book"]),
+                                 client_id="book")
+        self.assertEqual(len(first["result"]["note_ids"]), 2)
+        self.assertEqual(
+            list(Note.objects.filter(user=self.user).order_by("pk").values_list("title", "client_id")),
+            [("book (1/2)", "book"), ("book (2/2)", "book:2")],
+        )
+
+        again = self._import("book.pdf", _pdf(["Rewritten"]), client_id="book")
+        self.assertEqual(again["result"]["note_ids"], first["result"]["note_ids"][:1])
+        self.assertEqual(list(Note.objects.filter(user=self.user).values_list("title", "content")),
+                         [("book", "Rewritten")])
+
+    def test_docx_paragraphs_and_tables(self):
+        job = self._import("essay.docx", _docx(["Oxbow lakes form.", "", "Rivers erode."]))
+        self.assertEqual(job["status"], "done", job)
+        note = Note.objects.get(pk=job["result"]["note_ids"][0])
+        self.assertEqual(note.content, "Oxbow lakes form.\n\nRivers erode.\n\nTerm | Meander")
+
+    def test_rejected_uploads(self):
+        post = lambda data: self.client.post("/api/notes/import/", data, format="multipart")  # noqa: E731
+        self.assertEqual(post({}).status_code, 400)
+        self.assertEqual(post({"file": SimpleUploadedFile("notes.txt", b"plain text")}).status_code, 400)
+        self.assertEqual(post({"file": SimpleUploadedFile("fake.pdf", b"PK\x03\x04")}).status_code, 400)
+        with override_settings(NOTES_IMPORT_MAX_BYTES=100):
+            self.assertEqual(post({"file": SimpleUploadedFile("big.pdf", _pdf(["x"]))}).status_code, 413)
+        self.assertFalse(Note.objects.exists())
+
+    def test_blank_pdf_fails_without_creating_notes(self):
+        job = self._import("scan.pdf", _pdf([""]))
+        self.assertEqual((job["status"], job["error"]), ("failed", "NoTextFound"))
+        self.assertFalse(Note.objects.exists())
+
+
+class ExtractionTests(TestCase):
+    def test_split_parts_breaks_between_blocks(self):
+        self.assertEqual(ingestion.split_parts(["aaaa", "bbbb", "cccc"], 10), ["aaaa\n\nbbbb", "cccc"])
+        self.assertEqual(ingestion.split_parts(["x" * 25], 10), ["x" * 10, "x" * 10, "x" * 5])
+
+    def test_deadline_interrupts_slow_python_code(self):
+        with self.assertRaises(extraction.ExtractionTimeout):
+            with extraction._deadline(0.05):
+                while True:
+                    pass
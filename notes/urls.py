@@ -1,7 +1,8 @@
 from django.urls import path
-from .views import NoteListCreateView, NoteDetailView
+from .views import NoteDetailView, NoteImportView, NoteListCreateView
 
 urlpatterns = [
     path("", NoteListCreateView.as_view()),
     path("<int:pk>/", NoteDetailView.as_view()),
+    path("import/", NoteImportView.as_view()),
 ]
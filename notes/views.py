@@ -1,19 +1,45 @@
+from pathlib import Path
+
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import PermissionDenied
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core import conditional, fastjson
+from search import indexing
+from . import extraction, ingestion
 from .models import Note
-from .serializers import NoteSerializer
+from .serializers import NoteListSerializer, NoteSerializer
+from .structs import note_rows
 
 
 class NoteListCreateView(generics.ListCreateAPIView):
     serializer_class = NoteSerializer
     permission_classes = [IsAuthenticated]
 
+    def _summary(self):
+        return self.request.method == "GET" and self.request.query_params.get("summary") in ("1", "true")
+
+    def get_serializer_class(self):
+        return NoteListSerializer if self._summary() else NoteSerializer
+
     def get_queryset(self):
         return Note.objects.filter(user=self.request.user).order_by("-created_at")
 
+    def list(self, request, *args, **kwargs):
+        # Same JSON as the serializers, built from values() rows via msgspec;
+        # summary mode never reads the (possibly large, compressed) content.
+        queryset = self.get_queryset()
+        return conditional.respond(
+            request,
+            conditional.for_queryset(request, queryset, "updated_at", request.user.id),
+            lambda: Response(fastjson.encode(note_rows(queryset, summary=self._summary()))),
+        )
+
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        indexing.schedule(serializer.save(user=self.request.user))
 
 
 class NoteDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -23,14 +49,73 @@ class NoteDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         return Note.objects.filter(user=self.request.user)
 
+    def retrieve(self, request, *args, **kwargs):
+        note = self.get_object()
+        return conditional.respond(
+            request,
+            conditional.for_instance(request, note, "updated_at", request.user.id),
+            lambda: Response(self.get_serializer(note).data),
+        )
+
     def perform_update(self, serializer):
         # Extra security: verify the note belongs to the current user
-        if serializer.instance.user != self.request.user:
+        if serializer.instance.user_id != self.request.user.id:
             raise PermissionDenied("You do not have permission to edit this note.")
-        serializer.save()
+        indexing.schedule(serializer.save())
 
     def perform_destroy(self, instance):
         # Extra security: verify the note belongs to the current user
-        if instance.user != self.request.user:
+        if instance.user_id != self.request.user.id:
             raise PermissionDenied("You do not have permission to delete this note.")
         instance.delete()
+        indexing.forget(instance.user_id)
+
+
+class NoteImportView(APIView):
+    """
+    Import a PDF or DOCX file into notes in the background. Multipart fields:
+    ``file`` (required), ``title`` (defaults to the file name), ``subject``,
+    ``category`` and ``client_id`` (importing again with the same one, or the
+    same file without one, updates the same notes). Returns 202 with a job to
+    poll; its result lists the note ids.
+    """
+
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def initialize_request(self, request, *args, **kwargs):
+        # Before anything reads the body: uploads go straight to disk.
+        request.upload_handlers = [ingestion.StreamingUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def post(self, request):
+        upload = request.FILES.get("file")
+        if request.upload_handlers[0].too_large:
+            return Response({"detail": "The file is too large to import."}, status=413)
+        if upload is None:
+            return Response({"detail": "file is required."}, status=400)
+        kind = extraction.sniff(upload.read(8), upload.name)
+        if kind is None:
+            return Response({"detail": "Only PDF and DOCX files can be imported."}, status=400)
+
+        data = request.data
+        client_id = str(data.get("client_id", "")).strip()
+        if len(client_id) > 48:
+            return Response({"detail": "client_id must be at most 48 characters."}, status=400)
+        job_id = ingestion.submit(
+            request.user.id,
+            upload,
+            kind,
+            title=(str(data.get("title", "")).strip() or Path(upload.name).stem or "Imported document")[:200],
+            subject=(str(data.get("subject", "")).strip() or "General")[:100],
+            category=(str(data.get("category", "")).strip() or "Imported")[:50],
+            client_id=client_id or None,
+        )
+        return Response(
+            {
+                "detail": "Import has started.",
+                "job_id": job_id,
+                "status_url": f"/api/jobs/{job_id}/",
+            },
+            status=202,
+        )
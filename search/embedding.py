@@ -0,0 +1,114 @@
+"""
+Local, CPU-only text embeddings.
+
+Text is split into overlapping chunks of about ``SEARCH_CHUNK_CHARS``
+characters on paragraph and sentence boundaries. Each chunk becomes a hashed
+bag of words: lower-cased words and adjacent word pairs are hashed (CRC32)
+into ``SEARCH_EMBEDDING_DIM`` signed buckets with sublinear term frequency
+(``1 + log tf``), and the vector is L2-normalised. No model or vocabulary is
+needed, so a chunk embeds in well under a millisecond and vectors stay
+comparable across processes and restarts; ``index.UserIndex`` adds IDF
+weights from the user's own chunks at query time.
+
+Changing the dimension or the features invalidates stored vectors; run
+``python manage.py build_search_index`` afterwards.
+"""
+import math
+import re
+import zlib
+
+from django.conf import settings
+
+from core.lazy import lazy_import
+
+np = lazy_import("numpy")
+
+_WORD_RE = re.compile(r"[^\W_]+(?:'[^\W_]+)?", re.UNICODE)
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+STOP_WORDS = frozenset(
+    "a an and are as at be been but by can do does for from had has have he her his how i if in into is it its "
+    "me my no not of on or our she so than that the their them then there these they this to was we were what "
+    "when where which who why will with you your".split()
+)
+# Word pairs count half as much as single words.
+BIGRAM_WEIGHT = 0.5
+
+
+def dimension():
+    return getattr(settings, "SEARCH_EMBEDDING_DIM", 512)
+
+
+def tokens(text):
+    return [word for word in _WORD_RE.findall(text.lower()) if word not in STOP_WORDS]
+
+
+def chunk_text(text, size=None, overlap=None):
+    """
+    Split ``text`` into chunks of at most ``size`` characters, breaking
+    between paragraphs, then sentences, then words; consecutive chunks share
+    about ``overlap`` characters so a passage cut in two is found from either.
+    """
+    size = size or getattr(settings, "SEARCH_CHUNK_CHARS", 800)
+    overlap = size // 8 if overlap is None else overlap
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text or ""):
+        for sentence in _SENTENCE_RE.split(paragraph.strip()):
+            sentence = " ".join(sentence.split())
+            while len(sentence) > size:
+                cut = sentence.rfind(" ", 0, size)
+                cut = cut if cut > 0 else size
+                pieces.append(sentence[:cut])
+                sentence = sentence[cut:].strip()
+            if sentence:
+                pieces.append(sentence)
+
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + 1 + len(piece) > size:
+            chunks.append(current)
+            tail = current[-overlap:] if overlap else ""
+            # Start the overlap on a word boundary.
+            current = tail[tail.find(" ") + 1:] if " " in tail else ""
+        current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _features(text):
+    words = tokens(text)
+    counts = {}
+    for word in words:
+        counts[word] = counts.get(word, 0) + 1.0
+    for first, second in zip(words, words[1:]):
+        pair = f"{first} {second}"
+        counts[pair] = counts.get(pair, 0) + BIGRAM_WEIGHT
+    return counts
+
+
+def embed(texts, dim=None):
+    """``float32`` array of shape ``(len(texts), dim)`` with unit-length rows (zero rows for empty text)."""
+    dim = dim or dimension()
+    rows, columns, values = [], [], []
+    for row, text in enumerate(texts):
+        for feature, count in _features(text).items():
+            digest = zlib.crc32(feature.encode("utf-8"))
+            rows.append(row)
+            columns.append(digest % dim)
+            # An independent bit decides the sign, so collisions tend to cancel.
+            weight = 1.0 + math.log(count)
+            values.append(weight if digest & 0x80000000 else -weight)
+    # Colliding features add up in their bucket.
+    flat = np.bincount(
+        np.asarray(rows, dtype=np.int64) * dim + np.asarray(columns, dtype=np.int64),
+        weights=np.asarray(values, dtype=np.float64),
+        minlength=len(texts) * dim,
+    )
+    matrix = flat.astype(np.float32).reshape(len(texts), dim)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def embed_one(text, dim=None):
+    return embed([text], dim)[0]
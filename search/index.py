@@ -0,0 +1,410 @@
+"""
+Per-user vector index over ``Chunk`` rows, memory-mapped from disk.
+
+Each user's chunks live in append-only segments under
+``SEARCH_INDEX_DIR/<user id>/``. A segment holds a contiguous range of
+chunk ids as three ``.npy`` files: the ``(rows, dim)`` float32 vectors, a
+structured metadata array (chunk id, kind, source id, facet hash, creation
+time) and per-column document frequencies. Segments are opened with
+``mmap_mode="r"``, so a worker only pays for the pages a query touches and
+the OS page cache is shared by every worker on the host.
+
+The database stays the source of truth. When the user's version
+(``core.conditional.version``, bumped by ``search.indexing`` after every
+change) moves on, ``for_user`` brings the files up to date incrementally:
+chunks newer than the last segment become a new segment, and rows whose
+chunk is gone are masked out using the live id list. Once dead rows pass
+``SEARCH_INDEX_DEAD_FRACTION`` or there are more than
+``SEARCH_INDEX_MAX_SEGMENTS`` segments, they are compacted into one.
+Updates hold an exclusive ``flock`` on the directory's ``.lock`` file, so
+workers syncing the same user take turns instead of writing overlapping
+segments. Deleting the directory only costs a rebuild.
+
+A query is one matrix-vector product per block of ``BLOCK_ROWS`` rows with a
+running top-k; filters (kind, facet, date, source ids) are evaluated on the
+metadata first, and sparse matches score only their own rows.
+"""
+import os
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from operator import itemgetter
+from pathlib import Path
+from typing import NamedTuple
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single dev server, nothing to coordinate.
+    fcntl = None
+
+from core import conditional, keyset, routers
+from core.fields import CompressedTextField
+from core.lazy import lazy_import
+from . import embedding
+from .models import Chunk
+
+np = lazy_import("numpy")
+
+KINDS = {Chunk.NOTE: 0, Chunk.CHAT: 1}
+BLOCK_ROWS = 16384
+
+
+class Hit(NamedTuple):
+    chunk_id: int
+    kind: str
+    source_id: int
+    score: float
+
+
+@lru_cache(maxsize=1)
+def meta_dtype():
+    return np.dtype(
+        [("chunk_id", "<i8"), ("kind", "i1"), ("source_id", "<i8"), ("facet", "<u4"), ("created", "<i8")]
+    )
+
+
+def facet_hash(value):
+    return zlib.crc32((value or "").strip().lower().encode("utf-8"))
+
+
+def version_scope(user_id):
+    return f"search-index:{user_id}"
+
+
+class Segment(NamedTuple):
+    vectors: object
+    meta: object
+    document_frequency: object
+
+    def __len__(self):
+        return len(self.meta)
+
+
+def segment_from_rows(rows, dim):
+    """
+    A segment built in memory from ``(chunk_id, kind, source_id, facet,
+    created_at, vector_bytes)`` rows, skipping vectors of another dimension.
+    """
+    rows = [row for row in rows if len(row[5]) == dim * 4]
+    meta = np.zeros(len(rows), dtype=meta_dtype())
+    meta["chunk_id"] = [row[0] for row in rows]
+    meta["kind"] = [KINDS[row[1]] for row in rows]
+    meta["source_id"] = [row[2] for row in rows]
+    meta["facet"] = [facet_hash(row[3]) for row in rows]
+    meta["created"] = [int(row[4].timestamp()) if row[4] else 0 for row in rows]
+    vectors = np.frombuffer(b"".join(bytes(row[5]) for row in rows), dtype="<f4").reshape(len(rows), dim)
+    return Segment(vectors, meta, np.count_nonzero(vectors, axis=0).astype(np.int64))
+
+
+def segment_from_arrays(matrix, chunk_ids, kinds=None, source_ids=None, facets=None, created=None):
+    """An in-memory segment (benchmarks and tests)."""
+    meta = np.zeros(len(matrix), dtype=meta_dtype())
+    meta["chunk_id"] = chunk_ids
+    meta["kind"] = [KINDS[kind] for kind in kinds] if kinds is not None else 0
+    meta["source_id"] = source_ids if source_ids is not None else chunk_ids
+    meta["facet"] = [facet_hash(facet) for facet in facets] if facets is not None else facet_hash("")
+    meta["created"] = created if created is not None else 0
+    return Segment(np.ascontiguousarray(matrix, dtype=np.float32), meta, np.count_nonzero(matrix, axis=0))
+
+
+class UserIndex:
+    def __init__(self, segments, live_ids=None):
+        self.segments = [segment for segment in segments if len(segment)]
+        # Per segment: boolean mask of rows whose chunk still exists, or None for all.
+        self.alive = [
+            None if live_ids is None else np.isin(segment.meta["chunk_id"], live_ids, assume_unique=True)
+            for segment in self.segments
+        ]
+        self.size = sum(
+            len(segment) if alive is None else int(alive.sum()) for segment, alive in zip(self.segments, self.alive)
+        )
+        dim = self.segments[0].vectors.shape[1] if self.segments else embedding.dimension()
+        # IDF over the user's own chunks (dead rows included until compaction),
+        # applied to the query side only: words in every note of the user say
+        # little about which one is meant.
+        document_frequency = sum((segment.document_frequency for segment in self.segments), np.zeros(dim))
+        self.idf = (np.log((1.0 + self.size) / (1.0 + document_frequency)) + 1.0).astype(np.float32)
+
+    def __len__(self):
+        return self.size
+
+    def _mask(self, number, kind, source_ids, facet, since, until):
+        segment, mask = self.segments[number], self.alive[number]
+        meta = segment.meta
+
+        def narrow(condition):
+            return condition if mask is None else mask & condition
+
+        if kind is not None:
+            mask = narrow(meta["kind"] == KINDS[kind])
+        if source_ids is not None:
+            mask = narrow(np.isin(meta["source_id"], np.asarray(list(source_ids), dtype=np.int64)))
+        if facet:
+            mask = narrow(meta["facet"] == facet_hash(facet))
+        if since is not None:
+            mask = narrow(meta["created"] >= int(since.timestamp()))
+        if until is not None:
+            mask = narrow(meta["created"] < int(until.timestamp()))
+        return mask
+
+    def search(self, query, k, kind=None, source_ids=None, facet=None, since=None, until=None, min_score=0.0):
+        """
+        The ``k`` best chunks for ``query`` scoring above ``min_score``, best
+        first. Filters: ``kind`` ("note"/"chat"), ``source_ids`` (note or chat
+        ids), ``facet`` (subject or mode), ``since``/``until`` (datetimes).
+        """
+        if not self.size or k <= 0:
+            return []
+        vector = embedding.embed_one(query, len(self.idf)) * self.idf
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return []
+        vector /= norm
+
+        best_scores, best_rows = [], []
+        for number, segment in enumerate(self.segments):
+            mask = self._mask(number, kind, source_ids, facet, since, until)
+            for start in range(0, len(segment), BLOCK_ROWS):
+                stop = min(start + BLOCK_ROWS, len(segment))
+                block_mask = None if mask is None else mask[start:stop]
+                if block_mask is None:
+                    rows = np.arange(start, stop)
+                    scores = segment.vectors[start:stop] @ vector
+                elif block_mask.mean() < 0.25:
+                    # Few matches: gather just those rows.
+                    rows = start + np.flatnonzero(block_mask)
+                    if not len(rows):
+                        continue
+                    scores = segment.vectors[rows] @ vector
+                else:
+                    rows = np.arange(start, stop)
+                    scores = np.where(block_mask, segment.vectors[start:stop] @ vector, -np.inf)
+                if len(scores) > k:
+                    top = np.argpartition(-scores, k - 1)[:k]
+                    rows, scores = rows[top], scores[top]
+                best_scores.append(scores)
+                best_rows.append(np.stack([np.full(len(rows), number), rows], axis=1))
+
+        if not best_scores:
+            return []
+        scores = np.concatenate(best_scores)
+        rows = np.concatenate(best_rows)
+        order = np.argsort(-scores, kind="stable")[:k]
+        hits = []
+        for position in order:
+            score = float(scores[position])
+            if not score > min_score:
+                break
+            number, row = rows[position]
+            meta = self.segments[number].meta[row]
+            kind_name = Chunk.NOTE if meta["kind"] == KINDS[Chunk.NOTE] else Chunk.CHAT
+            hits.append(Hit(int(meta["chunk_id"]), kind_name, int(meta["source_id"]), score))
+        return hits
+
+
+# On-disk segments
+
+def _directory(user_id):
+    root = getattr(settings, "SEARCH_INDEX_DIR", None) or Path(settings.BASE_DIR) / ".search_index"
+    return Path(root) / str(int(user_id))
+
+
+def _segment_name(first_id, last_id):
+    return f"{first_id:015d}-{last_id:015d}"
+
+
+def _load_segment(directory, name):
+    return Segment(
+        np.load(directory / f"{name}.vectors.npy", mmap_mode="r"),
+        np.load(directory / f"{name}.meta.npy", mmap_mode="r"),
+        np.load(directory / f"{name}.df.npy"),
+    )
+
+
+def _open_segments(directory):
+    """``(name, segment)`` pairs, oldest first; ``None`` if one vanished while being read."""
+    segments = []
+    for meta_path in sorted(directory.glob("*.meta.npy")):
+        name = meta_path.name[: -len(".meta.npy")]
+        try:
+            segments.append((name, _load_segment(directory, name)))
+        except FileNotFoundError:
+            return None
+    return segments
+
+
+def _save(path, array):
+    # Write then rename, so readers never see a partial file.
+    handle, temporary = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(handle, "wb") as stream:
+        np.save(stream, array)
+    os.replace(temporary, path)
+
+
+def _write_segment(directory, segment):
+    meta = segment.meta
+    name = _segment_name(int(meta["chunk_id"][0]), int(meta["chunk_id"][-1]))
+    _save(directory / f"{name}.vectors.npy", np.ascontiguousarray(segment.vectors))
+    _save(directory / f"{name}.df.npy", np.asarray(segment.document_frequency))
+    # Metadata last: its presence marks the segment complete.
+    _save(directory / f"{name}.meta.npy", np.ascontiguousarray(meta))
+    return name
+
+
+def _remove_segments(directory, names):
+    for name in names:
+        for suffix in (".meta.npy", ".vectors.npy", ".df.npy"):
+            try:
+                (directory / f"{name}{suffix}").unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _compact(directory, named_segments, live_ids):
+    parts = []
+    for _, segment in named_segments:
+        alive = np.isin(segment.meta["chunk_id"], live_ids, assume_unique=True)
+        parts.append((segment.vectors[alive], segment.meta[alive]))
+    vectors = np.concatenate([part[0] for part in parts])
+    meta = np.concatenate([part[1] for part in parts])
+    old_names = [name for name, _ in named_segments]
+    if not len(meta):
+        _remove_segments(directory, old_names)
+        return []
+    name = _write_segment(directory, Segment(vectors, meta, np.count_nonzero(vectors, axis=0).astype(np.int64)))
+    _remove_segments(directory, [old for old in old_names if old != name])
+    return [(name, _load_segment(directory, name))]
+
+
+@contextmanager
+def _locked(directory):
+    """Exclusive lock on the user's segments, across threads and processes."""
+    with open(directory / ".lock", "a") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _chunk_rows(queryset, chunk_size=2000):
+    """Chunk rows in id order, read ``chunk_size`` per query (see ``core.keyset``)."""
+    rows = queryset.values_list("id", "kind", "note_id", "history_id", "facet", "created_at", "vector")
+    return keyset.rows(rows, chunk_size, itemgetter(0), "id")
+
+
+def sync(user_id):
+    """Bring the user's segments up to date with the database and return the index."""
+    dim = embedding.dimension()
+    directory = _directory(user_id)
+    directory.mkdir(parents=True, exist_ok=True)
+    with _locked(directory):
+        return _sync(user_id, directory, dim)
+
+
+def _sync(user_id, directory, dim):
+    named_segments = _open_segments(directory) or []
+    if any(segment.vectors.shape[1] != dim for _, segment in named_segments):
+        # Embedded with another dimension: start over (keeping the lock file).
+        _remove_segments(directory, [name for name, _ in named_segments])
+        named_segments = []
+
+    indexed_to = max((int(segment.meta["chunk_id"][-1]) for _, segment in named_segments), default=0)
+    new_rows = [
+        (chunk_id, kind, note_id if kind == Chunk.NOTE else history_id, facet, created_at, vector)
+        for chunk_id, kind, note_id, history_id, facet, created_at, vector in _chunk_rows(
+            Chunk.objects.filter(user_id=user_id, id__gt=indexed_to)
+        )
+    ]
+    if new_rows:
+        segment = segment_from_rows(new_rows, dim)
+        if len(segment):
+            name = _write_segment(directory, segment)
+            named_segments.append((name, _load_segment(directory, name)))
+
+    live_ids = np.fromiter(
+        keyset.rows(Chunk.objects.filter(user_id=user_id).values_list("id", flat=True), 10000, int, "id"),
+        dtype=np.int64,
+    )
+    total = sum(len(segment) for _, segment in named_segments)
+    dead = total - len(live_ids)
+    if named_segments and (
+        len(named_segments) > getattr(settings, "SEARCH_INDEX_MAX_SEGMENTS", 8)
+        or dead > getattr(settings, "SEARCH_INDEX_DEAD_FRACTION", 0.25) * total
+    ):
+        named_segments = _compact(directory, named_segments, live_ids)
+    return UserIndex([segment for _, segment in named_segments], live_ids)
+
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def for_user(user_id):
+    current = conditional.version(version_scope(user_id))
+    with _lock:
+        cached = _indexes.get(user_id)
+        if cached is not None and cached[0] == current:
+            _indexes.move_to_end(user_id)
+            return cached[1]
+    # From the primary: a lagging replica would index an old state under the new version.
+    with routers.primary():
+        index = sync(user_id)
+    with _lock:
+        _indexes[user_id] = (current, index)
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > getattr(settings, "SEARCH_INDEX_CACHE_USERS", 32):
+            _indexes.popitem(last=False)
+    return index
+
+
+def search(user_id, query, k=None, **filters):
+    """
+    The user's chunks most relevant to ``query``, best first, as dicts with
+    ``kind``, ``id`` (note or chat id), ``title``, ``facet``, ``created_at``,
+    ``text`` and ``score``. ``filters`` are those of ``UserIndex.search``.
+    """
+    if not query or not query.strip():
+        return []
+    hits = for_user(user_id).search(
+        query,
+        k or getattr(settings, "SEARCH_TOP_K", 5),
+        min_score=getattr(settings, "SEARCH_MIN_SCORE", 0.05),
+        **filters,
+    )
+    if not hits:
+        return []
+    rows = {
+        row["id"]: row
+        for row in Chunk.objects.filter(id__in=[hit.chunk_id for hit in hits]).values(
+            "id", "title", "facet", "created_at", "text"
+        )
+    }
+    return [
+        {
+            "kind": hit.kind,
+            "id": hit.source_id,
+            "title": rows[hit.chunk_id]["title"],
+            "facet": rows[hit.chunk_id]["facet"],
+            "created_at": rows[hit.chunk_id]["created_at"],
+            "text": CompressedTextField.decode(rows[hit.chunk_id]["text"]),
+            "score": round(hit.score, 4),
+        }
+        for hit in hits
+        if hit.chunk_id in rows  # re-indexed since the index was synced
+    ]
+
+
+def search_notes(user_id, query, k=None, note_ids=None):
+    """Passages of the user's notes for ``query`` as ``{"note_id", "title", "text", "score"}`` dicts."""
+    return [
+        {"note_id": result["id"], "title": result["title"], "text": result["text"], "score": result["score"]}
+        for result in search(user_id, query, k, kind=Chunk.NOTE, source_ids=note_ids)
+    ]
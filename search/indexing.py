@@ -0,0 +1,130 @@
+"""
+Keeping ``Chunk`` rows in step with notes and chat answers.
+
+Saving a note or a chat answer schedules ``index_note``/``index_history`` as
+a background job (``core.jobs``), so chunking and embedding never add to the
+request. A job replaces all chunks of its source in one transaction and then
+bumps the user's index version; one that fails on a transient database
+error is retried ``SEARCH_INDEX_RETRIES`` times with exponential backoff, so
+a busy database does not leave the source unindexed until its next save.
+Deleting a source removes its chunks (by
+cascade, or children-first in batch deletions); callers bump the version
+with ``forget``.
+"""
+import logging
+import time
+from functools import partial
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+from ai.archive import rehydrate
+from ai.models import ChatHistory
+from core import conditional, jobs
+from notes.models import Note
+from . import embedding
+from .index import version_scope
+from .models import Chunk
+
+logger = logging.getLogger(__name__)
+
+RETRY_BACKOFF_SECONDS = 0.5
+
+
+def chat_title(input_data):
+    """What a chat answer replied to: the question, or the notes or project it was asked about."""
+    data = input_data if isinstance(input_data, dict) else {}
+    title = data.get("question") or data.get("notes") or data.get("project_name") or data.get("note_content") or ""
+    return " ".join(str(title).split())[:200]
+
+
+def _replace_chunks(source, heading, text, **fields):
+    texts = embedding.chunk_text(text)
+    # The heading (title, subject) is embedded with every passage, so a
+    # question naming the topic finds passages that never repeat it.
+    vectors = embedding.embed([f"{heading} {passage}" for passage in texts]).astype("<f4")
+    Chunk.objects.filter(**{source: fields[source]}).delete()
+    Chunk.objects.bulk_create(
+        [
+            Chunk(ordinal=ordinal, text=passage, vector=vector.tobytes(), **fields)
+            for ordinal, (passage, vector) in enumerate(zip(texts, vectors))
+        ]
+    )
+    transaction.on_commit(partial(forget, fields["user_id"]))
+    return len(texts)
+
+
+def index_note(note_id):
+    """Re-chunk and re-embed one note; returns the number of chunks stored."""
+    with transaction.atomic():
+        # Row lock: two quick saves of one note index one after the other.
+        note = Note.objects.select_for_update().filter(pk=note_id).first()
+        if note is None:
+            return 0
+        return _replace_chunks(
+            "note_id",
+            f"{note.title}. {note.subject}.",
+            note.content,
+            user_id=note.user_id,
+            kind=Chunk.NOTE,
+            note_id=note.pk,
+            title=note.title[:200],
+            facet=note.subject[:100],
+            created_at=note.created_at,
+        )
+
+
+def index_history(history_id):
+    """Chunk and embed one chat answer; returns the number of chunks stored."""
+    with transaction.atomic():
+        history = ChatHistory.objects.select_for_update().filter(pk=history_id).first()
+        if history is None:
+            return 0
+        rehydrate([history])
+        title = chat_title(history.input_data)
+        return _replace_chunks(
+            "history_id",
+            f"{title}.",
+            history.response_text,
+            user_id=history.user_id,
+            kind=Chunk.CHAT,
+            history_id=history.pk,
+            title=title,
+            facet=history.mode[:100],
+            created_at=history.created_at,
+        )
+
+
+def _retrying(index, source_id):
+    retries = getattr(settings, "SEARCH_INDEX_RETRIES", 4)
+    for attempt in range(retries + 1):
+        try:
+            return index(source_id)
+        except OperationalError:
+            if attempt == retries:
+                raise
+            delay = RETRY_BACKOFF_SECONDS * 2**attempt
+            logger.warning("%s(%s) hit a database error; retrying in %.1fs", index.__name__, source_id, delay)
+            time.sleep(delay)
+
+
+def _index_note_job(job, note_id):
+    return {"chunks": _retrying(index_note, note_id)}
+
+
+def _index_history_job(job, history_id):
+    return {"chunks": _retrying(index_history, history_id)}
+
+
+def schedule(note):
+    """Index ``note`` in the background once the current transaction commits."""
+    return jobs.submit("note_indexing", _index_note_job, note.pk)
+
+
+def schedule_history(history):
+    return jobs.submit("chat_indexing", _index_history_job, history.pk)
+
+
+def forget(user_id):
+    """Make every process re-sync the user's index on its next query."""
+    conditional.bump(version_scope(user_id))
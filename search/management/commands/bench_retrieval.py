@@ -0,0 +1,170 @@
+import itertools
+import json
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from search import embedding, index
+from search.index import UserIndex
+
+SYLLABLES = (
+    "ba be bi bo bu da de di do du ka ke ki ko ku la le li lo lu ma me mi mo mu na ne ni no nu ra re ri ro ru ta te ti to tu"
+).split()
+
+
+def _vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def _corpus(rng, notes, words_per_note, vocabulary, topic_words=150):
+    """Notes written mostly from their own topic's words, the rest from a shared Zipf-like background."""
+    cumulative = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(vocabulary))))
+    texts = []
+    for _ in range(notes):
+        topic = rng.sample(vocabulary, topic_words)
+        background = rng.choices(vocabulary, cum_weights=cumulative, k=words_per_note)
+        words = [rng.choice(topic) if rng.random() < 0.6 else word for word in background]
+        sentences = [" ".join(words[i:i + 12]).capitalize() + "." for i in range(0, len(words), 12)]
+        texts.append("\n\n".join(" ".join(sentences[i:i + 5]) for i in range(0, len(sentences), 5)))
+    return texts
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _latency(search, queries):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return {"p50": round(statistics.median(latencies), 2), "p95": round(_percentile(latencies, 0.95), 2)}
+
+
+SUBJECTS = ["Mathematics", "Geography", "Computer Science", "English", "Heritage Studies", "Biology"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure retrieval quality and speed of the search app on a synthetic corpus, in memory: "
+        "embedding throughput, top-k query latency, recall@k for queries made from words of one "
+        "passage, and prompt size with retrieval versus pasting the whole note. Prints a JSON report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--notes", type=int, default=300)
+        parser.add_argument("--words-per-note", type=int, default=1500)
+        parser.add_argument("--queries", type=int, default=300)
+        parser.add_argument("--query-words", type=int, default=6, help="Words taken from the target passage.")
+        parser.add_argument("--k", type=int, default=getattr(settings, "SEARCH_TOP_K", 5))
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument(
+            "--scale",
+            type=int,
+            default=0,
+            help="Also time filtered queries over this many chunks in memory-mapped segments "
+            "(e.g. 100000). For single-core numbers set OPENBLAS_NUM_THREADS=1.",
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        vocabulary = _vocabulary(rng, 5000)
+        notes = _corpus(rng, options["notes"], options["words_per_note"], vocabulary)
+
+        chunk_texts, chunk_notes = [], []
+        for note_id, text in enumerate(notes):
+            for chunk in embedding.chunk_text(text):
+                chunk_texts.append(chunk)
+                chunk_notes.append(note_id)
+        started = time.perf_counter()
+        matrix = embedding.embed(chunk_texts)
+        embed_seconds = time.perf_counter() - started
+        user_index = UserIndex([index.segment_from_arrays(matrix, range(len(chunk_texts)), source_ids=chunk_notes)])
+
+        k = options["k"]
+        latencies, chunk_hits, note_hits, retrieved_chars, pasted_chars = [], 0, 0, [], []
+        for _ in range(options["queries"]):
+            target = rng.randrange(len(chunk_texts))
+            words = embedding.tokens(chunk_texts[target])
+            query = " ".join(rng.sample(words, min(options["query_words"], len(words))))
+            started = time.perf_counter()
+            hits = user_index.search(query, k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            chunk_hits += any(hit.chunk_id == target for hit in hits)
+            note_hits += any(hit.source_id == chunk_notes[target] for hit in hits)
+            retrieved_chars.append(sum(len(chunk_texts[hit.chunk_id]) for hit in hits))
+            pasted_chars.append(len(notes[chunk_notes[target]]))
+
+        queries = options["queries"]
+        report = {
+            "notes": len(notes),
+            "chunks": len(chunk_texts),
+            "dim": matrix.shape[1],
+            "k": k,
+            "embed_chunks_per_sec": round(len(chunk_texts) / embed_seconds),
+            "query_ms_p50": round(statistics.median(latencies), 3),
+            "query_ms_p95": round(_percentile(latencies, 0.95), 3),
+            "recall_at_k_passage": round(chunk_hits / queries, 3),
+            "recall_at_k_note": round(note_hits / queries, 3),
+            "prompt_chars_retrieved": round(statistics.mean(retrieved_chars)),
+            "prompt_chars_whole_note": round(statistics.mean(pasted_chars)),
+        }
+        if options["scale"]:
+            report["scale"] = self._scale(rng, options["scale"], vocabulary, options, k)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def _scale(self, rng, chunks, vocabulary, options, k):
+        """Query latency over ``chunks`` chunks in four on-disk segments, unfiltered and filtered."""
+        texts = []
+        while len(texts) < chunks:
+            for text in _corpus(rng, 50, options["words_per_note"], vocabulary):
+                texts.extend(embedding.chunk_text(text))
+        texts = texts[:chunks]
+        started = time.perf_counter()
+        matrix = embedding.embed(texts)
+        embed_seconds = time.perf_counter() - started
+
+        now = datetime.now(timezone.utc)
+        kinds = [rng.choice(("note", "chat")) for _ in texts]
+        facets = [rng.choice(SUBJECTS) if kind == "note" else rng.choice(("study", "general")) for kind in kinds]
+        created = [int((now - timedelta(days=rng.randrange(365))).timestamp()) for _ in texts]
+        queries = [" ".join(rng.sample(embedding.tokens(rng.choice(texts)), 4)) for _ in range(options["queries"])]
+
+        with tempfile.TemporaryDirectory() as directory:
+            directory = Path(directory)
+            bounds = [len(texts) * part // 4 for part in range(5)]
+            for first, last in zip(bounds, bounds[1:]):
+                index._write_segment(
+                    directory,
+                    index.segment_from_arrays(
+                        matrix[first:last],
+                        range(first + 1, last + 1),
+                        kinds=kinds[first:last],
+                        facets=facets[first:last],
+                        created=created[first:last],
+                    ),
+                )
+            on_disk = UserIndex([segment for _, segment in index._open_segments(directory)])
+            month_ago = now - timedelta(days=30)
+            return {
+                "chunks": len(texts),
+                "segments": len(on_disk.segments),
+                "embed_chunks_per_sec": round(len(texts) / embed_seconds),
+                "query_ms": _latency(lambda query: on_disk.search(query, k), queries),
+                "query_ms_kind_chat": _latency(lambda query: on_disk.search(query, k, kind="chat"), queries),
+                "query_ms_subject": _latency(
+                    lambda query: on_disk.search(query, k, kind="note", facet="Geography"), queries
+                ),
+                "query_ms_last_30_days": _latency(lambda query: on_disk.search(query, k, since=month_ago), queries),
+            }
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from ai.models import ChatHistory
+from core import keyset
+from notes.models import Note
+from search import index, indexing
+
+
+class Command(BaseCommand):
+    help = (
+        "Chunk and embed existing notes and chat answers for search (search app) and rebuild the "
+        "on-disk index segments. Needed once after deploying, and after changing "
+        "SEARCH_EMBEDDING_DIM or SEARCH_CHUNK_CHARS. Safe to re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, default=None, help="Only this user id.")
+
+    def handle(self, *args, **options):
+        notes = Note.objects.all()
+        histories = ChatHistory.objects.all()
+        if options["user"] is not None:
+            notes = notes.filter(user_id=options["user"])
+            histories = histories.filter(user_id=options["user"])
+        counts = {"notes": 0, "chats": 0, "chunks": 0}
+        for note_id in keyset.rows(notes.values_list("pk", flat=True), 500, int):
+            counts["chunks"] += indexing.index_note(note_id)
+            counts["notes"] += 1
+        for history_id in keyset.rows(histories.values_list("pk", flat=True), 500, int):
+            counts["chunks"] += indexing.index_history(history_id)
+            counts["chats"] += 1
+        users = set(notes.values_list("user_id", flat=True)) | set(histories.values_list("user_id", flat=True))
+        for user_id in users:
+            index.sync(user_id)
+        self.stdout.write(
+            "Indexed {notes} note(s) and {chats} chat answer(s) into {chunks} chunk(s).".format(**counts)
+        )
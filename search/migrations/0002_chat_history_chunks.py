@@ -0,0 +1,64 @@
+# Generated by Django 6.0.1 on 2026-10-19 02:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_note_fields(apps, schema_editor):
+    Chunk = apps.get_model("search", "Chunk")
+    Note = apps.get_model("notes", "Note")
+    notes = Note.objects.filter(pk=models.OuterRef("note_id"))
+    Chunk.objects.update(
+        title=models.Subquery(notes.values("title")[:1]),
+        facet=models.Subquery(notes.values("subject")[:1]),
+        created_at=models.Subquery(notes.values("created_at")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0003_compress_response_text'),
+        ('notes', '0004_note_updated_at'),
+        ('search', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunk',
+            name='created_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chunk',
+            name='facet',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='chunk',
+            name='history',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_chunks', to='ai.chathistory'),
+        ),
+        migrations.AddField(
+            model_name='chunk',
+            name='kind',
+            field=models.CharField(choices=[('note', 'Note'), ('chat', 'Chat answer')], default='note', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='chunk',
+            name='title',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='chunk',
+            name='note',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_chunks', to='notes.note'),
+        ),
+        migrations.AddConstraint(
+            model_name='chunk',
+            constraint=models.UniqueConstraint(fields=('history', 'ordinal'), name='uniq_chunk_ordinal_per_history'),
+        ),
+        migrations.RunPython(backfill_note_fields, migrations.RunPython.noop),
+    ]
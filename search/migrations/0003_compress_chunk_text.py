@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:12
+
+import core.fields
+from django.db import migrations
+
+
+def compress_text(apps, schema_editor):
+    core.fields.compress_existing(apps.get_model("search", "Chunk"), "text")
+
+
+def decompress_text(apps, schema_editor):
+    core.fields.decompress_existing(apps.get_model("search", "Chunk"), "text")
+
+
+class Migration(migrations.Migration):
+
+    # Each batch commits on its own so large tables are not converted in
+    # one long transaction.
+    atomic = False
+
+    dependencies = [
+        ('search', '0002_chat_history_chunks'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chunk',
+            name='text',
+            field=core.fields.CompressedTextField(threshold=0),
+        ),
+        migrations.RunPython(compress_text, decompress_text),
+    ]
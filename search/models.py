@@ -0,0 +1,49 @@
+from django.contrib.auth.models import User
+from django.db import models
+
+from ai.models import ChatHistory
+from core.fields import CompressedTextField
+from notes.models import Note
+
+
+class Chunk(models.Model):
+    """
+    A passage of a user's note or chat answer with its embedding
+    (``search.embedding``), stored as raw little-endian float32 bytes.
+    ``title``, ``facet`` and ``created_at`` are copied from the source so
+    search results and filters never join back to it. Passages are stored
+    compressed whatever their length, so the copy costs a fraction of the
+    source text it duplicates.
+    """
+
+    NOTE = "note"
+    CHAT = "chat"
+    KIND_CHOICES = [(NOTE, "Note"), (CHAT, "Chat answer")]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES, default=NOTE)
+    note = models.ForeignKey(Note, on_delete=models.CASCADE, null=True, blank=True, related_name="search_chunks")
+    history = models.ForeignKey(
+        ChatHistory, on_delete=models.CASCADE, null=True, blank=True, related_name="search_chunks"
+    )
+    ordinal = models.PositiveIntegerField()
+    # Note title, or the question a chat answer replied to.
+    title = models.CharField(max_length=200, blank=True)
+    # Note subject or chat mode, for filtering.
+    facet = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(null=True, blank=True)
+    text = CompressedTextField(threshold=0)
+    vector = models.BinaryField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "note"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["note", "ordinal"], name="uniq_chunk_ordinal_per_note"),
+            models.UniqueConstraint(fields=["history", "ordinal"], name="uniq_chunk_ordinal_per_history"),
+        ]
+
+    @property
+    def source_id(self):
+        return self.note_id if self.kind == self.NOTE else self.history_id
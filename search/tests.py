@@ -0,0 +1,336 @@
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from ai.models import ChatHistory
+from core import jobs
+from core.query_guard import QueryCountTestCase
+from notes.models import Note
+from sharing.models import ShareLink, ShareMember
+from . import embedding, index, indexing
+from .indexing import index_history, index_note
+from .models import Chunk
+
+RIVERS = (
+    "Rivers erode their banks through hydraulic action and abrasion. Meanders form where the outer bank "
+    "erodes faster than the inner bank, and oxbow lakes are left behind when a meander is cut off."
+)
+CELLS = (
+    "Photosynthesis takes place in the chloroplasts of plant cells. Chlorophyll absorbs light energy, "
+    "which is used to turn carbon dioxide and water into glucose and oxygen."
+)
+
+
+class EmbeddingTests(SimpleTestCase):
+    def test_chunks_respect_size_and_overlap(self):
+        text = "\n\n".join(f"Sentence number {i} about erosion and rivers." for i in range(60))
+        chunks = embedding.chunk_text(text, size=200, overlap=40)
+        self.assertGreater(len(chunks), 5)
+        self.assertTrue(all(len(chunk) <= 200 + 40 for chunk in chunks))
+        for previous, following in zip(chunks, chunks[1:]):
+            self.assertIn(following.split()[0], previous)
+        self.assertEqual(embedding.chunk_text("x" * 500, size=200), ["x" * 200, "x" * 200, "x" * 100])
+
+    def test_vectors_are_unit_length_and_stable(self):
+        vectors = embedding.embed([RIVERS, CELLS, ""], dim=256)
+        self.assertEqual(vectors.shape, (3, 256))
+        self.assertAlmostEqual(float((vectors[0] ** 2).sum()), 1.0, places=5)
+        self.assertFalse(vectors[2].any())
+        self.assertEqual(embedding.embed_one(RIVERS, 256).tobytes(), vectors[0].tobytes())
+
+    def test_index_ranks_the_matching_passage_first(self):
+        matrix = embedding.embed([RIVERS, CELLS])
+        user_index = index.UserIndex([index.segment_from_arrays(matrix, [10, 11], source_ids=[1, 2])])
+        self.assertEqual(user_index.search("how do oxbow lakes form", 2)[0].source_id, 1)
+        self.assertEqual(user_index.search("chlorophyll and light", 2)[0].source_id, 2)
+        self.assertEqual([hit.source_id for hit in user_index.search("light", 2, source_ids=[1])], [])
+        self.assertEqual(user_index.search("the and of", 2), [])
+
+    def test_filters_and_deleted_rows_across_segments(self):
+        now = timezone.now()
+        old = int((now - timedelta(days=60)).timestamp())
+        first = index.segment_from_arrays(
+            embedding.embed([RIVERS, CELLS]), [1, 2], kinds=["note", "chat"], facets=["Geography", "study"],
+            created=[old, old],
+        )
+        second = index.segment_from_arrays(
+            embedding.embed([RIVERS]), [3], kinds=["note"], facets=["Biology"], created=[int(now.timestamp())]
+        )
+        user_index = index.UserIndex([first, second], live_ids=[2, 3])
+        self.assertEqual(len(user_index), 2)
+        self.assertEqual([hit.chunk_id for hit in user_index.search("oxbow lakes", 5)], [3])
+        self.assertEqual(user_index.search("oxbow lakes", 5, facet="geography"), [])
+        self.assertEqual([hit.chunk_id for hit in user_index.search("chlorophyll", 5, kind="chat")], [2])
+        self.assertEqual(user_index.search("chlorophyll", 5, since=now - timedelta(days=1)), [])
+        self.assertEqual(user_index.search("oxbow lakes", 5, until=now - timedelta(days=1)), [])
+
+
+class TempIndexMixin:
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        index._indexes.clear()
+        self.index_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(SEARCH_INDEX_DIR=self.index_dir))
+
+
+@override_settings(JOBS_ALWAYS_EAGER=True, SEARCH_CHUNK_CHARS=120)
+class NoteIndexingTests(TempIndexMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="indexer")
+        self.client.force_authenticate(self.user)
+
+    def _create(self, title, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/notes/", {"title": title, "subject": "Geography", "category": "Revision", "content": content}
+            )
+        self.assertEqual(response.status_code, 201)
+        return response.json()["id"]
+
+    def test_saving_notes_keeps_the_index_current(self):
+        rivers = self._create("Rivers", RIVERS)
+        cells = self._create("Cells", CELLS)
+        self.assertGreater(Chunk.objects.filter(note_id=rivers).count(), 1)
+        self.assertEqual(index.search_notes(self.user.id, "oxbow lake meander")[0]["note_id"], rivers)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f"/api/notes/{cells}/", {"content": "Oxbow lakes and meanders on the Zambezi."})
+        results = index.search_notes(self.user.id, "oxbow lake meander")
+        self.assertEqual({result["note_id"] for result in results}, {rivers, cells})
+        self.assertEqual(index.search_notes(self.user.id, "chlorophyll"), [])
+
+        self.client.delete(f"/api/notes/{rivers}/")
+        self.assertEqual([result["note_id"] for result in index.search_notes(self.user.id, "oxbow lakes")], [cells])
+
+    def test_other_users_notes_are_never_searched(self):
+        other = User.objects.create_user(username="other")
+        note = Note.objects.create(user=other, title="Rivers", subject="S", category="C", content=RIVERS)
+        index_note(note.id)
+        self.assertEqual(index.search_notes(self.user.id, "oxbow lake"), [])
+
+    def test_study_mode_sends_only_relevant_passages(self):
+        self._create("Rivers", RIVERS)
+        self._create("Cells", CELLS)
+        with mock.patch("ai.views.llm.chat", return_value=None) as chat, \
+                mock.patch("ai.views.llm.extract_text", return_value="answer"):
+            response = self.client.post("/api/ai/study/", {"question": "How do oxbow lakes form?"}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([source["title"] for source in response.json()["sources"]], ["Rivers"])
+        messages = chat.call_args.args[0]
+        context = messages[1]["content"]
+        self.assertEqual(messages[1]["role"], "system")
+        self.assertIn("oxbow lakes", context)
+        self.assertNotIn("chlorophyll", context.lower())
+        self.assertEqual(messages[-1], {"role": "user", "content": "How do oxbow lakes form?"})
+
+    def test_general_mode_project_requests_skip_retrieval(self):
+        self._create("Rivers", RIVERS)
+        with mock.patch("ai.views.note_index.search_notes") as search_notes:
+            response = self.client.post(
+                "/api/ai/general/", {"question": "Help with my geography project", "use_notes": True}, format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Project Mode", response.json()["answer"])
+        search_notes.assert_not_called()
+
+    def test_passages_are_stored_compressed(self):
+        rivers = self._create("Rivers", RIVERS)
+        stored = Chunk.objects.filter(note_id=rivers).values_list("text", flat=True)
+        self.assertTrue(all(text.startswith("\x01") for text in stored))
+        self.assertIn("oxbow lakes", index.search_notes(self.user.id, "oxbow lake meander")[0]["text"])
+
+    def test_indexing_retries_when_the_database_is_busy(self):
+        note = Note.objects.create(user=self.user, title="Rivers", subject="S", category="C", content=RIVERS)
+        real_index_note = indexing.index_note
+        calls = []
+
+        def flaky(note_id):
+            calls.append(note_id)
+            if len(calls) < 3:
+                raise OperationalError("database is locked")
+            return real_index_note(note_id)
+
+        with mock.patch.object(indexing, "index_note", flaky), \
+                mock.patch.object(indexing.time, "sleep") as sleep, self.assertLogs("search.indexing", "WARNING"):
+            job_id = indexing.schedule(note)
+        self.assertEqual(jobs.get(job_id)["status"], "done")
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.5, 1.0])
+        self.assertTrue(Chunk.objects.filter(note=note).exists())
+
+        calls.clear()
+        with override_settings(SEARCH_INDEX_RETRIES=1), mock.patch.object(indexing, "index_note", flaky), \
+                mock.patch.object(indexing.time, "sleep"), self.assertLogs("core.jobs", "ERROR"):
+            job_id = indexing.schedule(note)
+        self.assertEqual(jobs.get(job_id)["status"], "failed")
+
+    def test_sync_waits_for_the_users_directory_lock(self):
+        directory = Path(self.index_dir) / str(self.user.id)
+        directory.mkdir(parents=True)
+        entered = threading.Event()
+        with mock.patch.object(index, "_sync", side_effect=lambda *args: entered.set()):
+            with index._locked(directory):
+                worker = threading.Thread(target=index.sync, args=(self.user.id,))
+                worker.start()
+                self.assertFalse(entered.wait(0.2))
+            worker.join(5)
+        self.assertTrue(entered.is_set())
+
+    def test_segments_are_appended_then_compacted(self):
+        notes = [
+            Note.objects.create(user=self.user, title=f"Rivers {i}", subject="S", category="C", content=RIVERS)
+            for i in range(3)
+        ]
+        directory = Path(self.index_dir) / str(self.user.id)
+        for note in notes:
+            index_note(note.id)
+            index.sync(self.user.id)
+        self.assertEqual(len(list(directory.glob("*.meta.npy"))), 3)
+
+        with override_settings(SEARCH_INDEX_MAX_SEGMENTS=2):
+            user_index = index.sync(self.user.id)
+        self.assertEqual(len(list(directory.glob("*.meta.npy"))), 1)
+        self.assertEqual(len(user_index), Chunk.objects.filter(user=self.user).count())
+
+        notes[0].delete()
+        notes[1].delete()
+        user_index = index.sync(self.user.id)
+        self.assertEqual(len(user_index), Chunk.objects.filter(user=self.user).count())
+        self.assertEqual(sum(len(segment) for segment in user_index.segments), len(user_index))
+
+
+@override_settings(JOBS_ALWAYS_EAGER=True, SEARCH_CHUNK_CHARS=120)
+class SharedEditIndexingTests(TempIndexMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username="share-owner")
+        self.member = User.objects.create_user(username="share-member")
+        self.client.force_authenticate(self.member)
+
+    def test_collaborator_note_edits_are_reindexed(self):
+        note = Note.objects.create(user=self.owner, title="Rivers", subject="Geography", category="C", content=RIVERS)
+        index_note(note.id)
+        share = ShareLink.objects.create(created_by=self.owner, resource_type="note", note=note, permission="collab")
+        ShareMember.objects.create(share=share, user=self.member)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(f"/api/share/links/{share.token}/note/", {"content": CELLS}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual([result["note_id"] for result in index.search_notes(self.owner.id, "chlorophyll")], [note.id])
+        self.assertEqual(index.search_notes(self.owner.id, "oxbow lake meander"), [])
+
+    def test_answers_posted_into_a_shared_chat_are_indexed(self):
+        share = ShareLink.objects.create(
+            created_by=self.owner, resource_type="chat", session_id="shared-session", permission="collab"
+        )
+        ShareMember.objects.create(share=share, user=self.member)
+
+        with self.captureOnCommitCallbacks(execute=True), \
+                mock.patch("sharing.views.llm.chat", return_value=None), \
+                mock.patch("sharing.views.llm.extract_text", return_value=CELLS):
+            response = self.client.post(
+                f"/api/share/links/{share.token}/chat/", {"message": "What is photosynthesis?"}, format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+
+        results = self.client.get("/api/search/", {"q": "chlorophyll light energy", "kind": "chat"}).json()["results"]
+        self.assertEqual({result["id"] for result in results}, {ChatHistory.objects.get(user=self.member).id})
+
+
+@override_settings(JOBS_ALWAYS_EAGER=True, SEARCH_CHUNK_CHARS=120)
+class SearchEndpointTests(TempIndexMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="searcher")
+        self.client.force_authenticate(self.user)
+        self.rivers = Note.objects.create(
+            user=self.user, title="Rivers", subject="Geography", category="Revision", content=RIVERS
+        )
+        self.cells = Note.objects.create(
+            user=self.user, title="Cells", subject="Biology", category="Revision", content=CELLS
+        )
+        index_note(self.rivers.id)
+        index_note(self.cells.id)
+
+    def _search(self, **params):
+        response = self.client.get("/api/search/", params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["results"]
+
+    def test_chat_answers_are_indexed_when_saved(self):
+        with self.captureOnCommitCallbacks(execute=True), \
+                mock.patch("ai.views.llm.chat", return_value=None), \
+                mock.patch("ai.views.llm.extract_text", return_value=CELLS):
+            response = self.client.post("/api/ai/general/", {"question": "What is photosynthesis?"}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+        results = self._search(q="chlorophyll light energy", kind="chat")
+        history_id = ChatHistory.objects.get(user=self.user).id
+        self.assertEqual({(r["id"], r["title"], r["facet"]) for r in results},
+                         {(history_id, "What is photosynthesis?", "general")})
+
+        self.client.delete(f"/api/ai/history/{history_id}/delete/")
+        self.assertEqual(self._search(q="chlorophyll light energy", kind="chat"), [])
+
+    def test_filters(self):
+        history = ChatHistory.objects.create(user=self.user, mode="study", input_data={"question": "Q"},
+                                             response_text=RIVERS)
+        index_history(history.id)
+
+        kinds = {result["kind"] for result in self._search(q="oxbow lakes meanders")}
+        self.assertEqual(kinds, {"note", "chat"})
+        self.assertEqual({r["id"] for r in self._search(q="oxbow lakes", subject="geography")}, {self.rivers.id})
+        self.assertEqual(self._search(q="oxbow lakes", subject="Biology"), [])
+        self.assertEqual({r["id"] for r in self._search(q="oxbow lakes", mode="study")}, {history.id})
+        tomorrow = (timezone.now() + timedelta(days=1)).date().isoformat()
+        self.assertEqual(self._search(q="oxbow lakes", since=tomorrow), [])
+        self.assertEqual(len(self._search(q="oxbow lakes", until=tomorrow, limit=1)), 1)
+
+    def test_invalid_parameters(self):
+        for params in ({}, {"q": "x", "kind": "file"}, {"q": "x", "subject": "a", "mode": "b"},
+                       {"q": "x", "kind": "chat", "subject": "a"}, {"q": "x", "since": "yesterday"},
+                       {"q": "x", "limit": "many"}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get("/api/search/", params).status_code, 400)
+
+    def test_build_search_index_command(self):
+        Chunk.objects.all().delete()
+        ChatHistory.objects.create(user=self.user, mode="study", input_data={"question": "Q"}, response_text=CELLS)
+        out = StringIO()
+        call_command("build_search_index", user=self.user.id, stdout=out)
+        self.assertIn("2 note(s) and 1 chat answer(s)", out.getvalue())
+        self.assertTrue(self._search(q="chlorophyll", kind="chat"))
+
+
+def _user_with_chunks(username, count):
+    user = User.objects.create_user(username=username)
+    for i in range(count):
+        content = RIVERS if i == 0 else CELLS
+        note = Note.objects.create(user=user, title=f"Note {i}", subject="Geography", category="C", content=content)
+        index_note(note.id)
+    return user
+
+
+class SearchQueryCountTests(TempIndexMixin, QueryCountTestCase):
+    urlconf = "search.urls"
+    url_prefix = "/api/search/"
+    covered_routes = ("",)
+
+    def test_search(self):
+        self.assertConstantQueries(
+            "", "get", lambda scale: (_user_with_chunks(f"search{scale}", scale), "?q=oxbow+lakes&limit=50", None)
+        )
@@ -0,0 +1,73 @@
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core import fastjson
+from . import index
+from .models import Chunk
+
+MAX_LIMIT = 50
+
+
+def _parse_when(value):
+    """A datetime from an ISO date (midnight) or datetime; ``None`` when absent, ``ValueError`` when invalid."""
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        parsed = datetime.combine(day, time.min)
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class SearchView(APIView):
+    """
+    Semantic search over the user's notes and chat answers.
+
+    ``q`` is required. Optional filters: ``kind`` (note or chat), ``subject``
+    (notes), ``mode`` (chat answers), ``since``/``until`` (ISO date or
+    datetime, by creation) and ``limit`` (1-50, default 10).
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        query = params.get("q", "").strip()
+        if not query:
+            return Response({"detail": "q is required."}, status=400)
+
+        kind = params.get("kind") or None
+        subject, mode = params.get("subject", "").strip(), params.get("mode", "").strip()
+        if subject and mode:
+            return Response({"detail": "Filter by subject or mode, not both."}, status=400)
+        if subject or mode:
+            implied = Chunk.NOTE if subject else Chunk.CHAT
+            if kind not in (None, implied):
+                return Response({"detail": f"{'subject' if subject else 'mode'} only applies to kind={implied}."},
+                                status=400)
+            kind = implied
+        if kind not in (None, Chunk.NOTE, Chunk.CHAT):
+            return Response({"detail": "Invalid kind."}, status=400)
+        try:
+            since, until = _parse_when(params.get("since")), _parse_when(params.get("until"))
+            limit = int(params.get("limit", 10))
+        except ValueError:
+            return Response({"detail": "Invalid since, until or limit."}, status=400)
+
+        results = index.search(
+            request.user.id,
+            query,
+            max(1, min(limit, MAX_LIMIT)),
+            kind=kind,
+            facet=subject or mode or None,
+            since=since,
+            until=until,
+        )
+        return Response(fastjson.encode({"results": results}))
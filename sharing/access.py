@@ -0,0 +1,82 @@
+"""
+Short-lived signed share-access tokens.
+
+After a full ownership/membership check, read endpoints hand the client a
+signed token carrying the share token, user id, role and permission. While
+it is fresh, later reads can trust those claims without touching
+``ShareLink``/``ShareMember``. Revocation is tracked in the cache: one entry
+per revoked link and one per removed member, each stamped with the time of
+revocation and kept only as long as a token could still be valid.
+"""
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+HEADER = "X-Share-Access-Token"
+_SALT = "sharing.access"
+
+
+def enabled():
+    return getattr(settings, "SHARE_ACCESS_TOKENS_ENABLED", False)
+
+
+def _ttl():
+    return getattr(settings, "SHARE_ACCESS_TOKEN_TTL", 300)
+
+
+def _revoked_key(share_token, user_id=None):
+    if user_id is None:
+        return f"share-revoked:{share_token}"
+    return f"share-revoked:{share_token}:{user_id}"
+
+
+def mint(share, user, role):
+    return signing.dumps(
+        {
+            "t": str(share.token),
+            "u": user.id,
+            "r": role,
+            "p": share.permission,
+            "k": share.resource_type,
+            "s": share.session_id,
+            "n": share.note_id,
+            "iat": time.time(),
+        },
+        salt=_SALT,
+        compress=True,
+    )
+
+
+def claims_for(request, share_token):
+    """Return the verified claims presented with ``request``, or ``None``."""
+    if not enabled():
+        return None
+    raw = request.headers.get(HEADER)
+    if not raw:
+        return None
+    try:
+        claims = signing.loads(raw, salt=_SALT, max_age=_ttl())
+    except signing.BadSignature:
+        return None
+    if claims.get("t") != str(share_token) or claims.get("u") != request.user.id:
+        return None
+    revoked = cache.get_many([_revoked_key(share_token), _revoked_key(share_token, request.user.id)])
+    if any(revoked_at >= claims["iat"] for revoked_at in revoked.values()):
+        return None
+    return claims
+
+
+def attach(response, share, user, role):
+    if enabled():
+        response[HEADER] = mint(share, user, role)
+    return response
+
+
+def revoke_share(share_token):
+    cache.set(_revoked_key(share_token), time.time(), _ttl())
+
+
+def revoke_member(share_token, user_id):
+    cache.set(_revoked_key(share_token, user_id), time.time(), _ttl())
@@ -0,0 +1,37 @@
+"""msgspec rows for shared chat transcripts (see ``core.fastjson``)."""
+from datetime import datetime
+from typing import Union
+
+import msgspec
+
+from ai.archive import archived_texts
+from ai.models import ChatHistory
+from core.fields import CompressedTextField
+
+
+class ChatMessage(msgspec.Struct):
+    id: Union[int, str]
+    role: str
+    content: str
+    created_at: datetime
+    username: str
+
+
+def _question(input_data):
+    return input_data.get("question") or input_data.get("notes") or input_data.get("project_name") or ""
+
+
+def chat_messages(session_id):
+    """The session transcript as alternating user/assistant messages."""
+    rows = list(
+        ChatHistory.objects.filter(input_data__session_id=session_id)
+        .order_by("created_at")
+        .values_list("id", "input_data", "response_text", "archived_at", "created_at", "user__username")
+    )
+    archived = archived_texts([row[0] for row in rows if row[3] is not None])
+    messages = []
+    for id, input_data, response_text, archived_at, created_at, username in rows:
+        answer = archived[id] if id in archived else CompressedTextField.decode(response_text)
+        messages.append(ChatMessage(id, "user", _question(input_data), created_at, username))
+        messages.append(ChatMessage(f"{id}-assistant", "assistant", answer, created_at, "REE AI"))
+    return messages
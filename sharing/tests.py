@@ -0,0 +1,317 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from ai.models import ChatHistory
+from core.llm_stub import StubLLMServer
+from core.query_guard import QueryCountTestCase
+from notes.models import Note
+from . import access, views
+from .models import ShareLink, ShareMember, ShareInvite
+
+
+def _make_users(prefix, count):
+    User.objects.bulk_create(
+        [User(username=f"{prefix}{i}", email=f"{prefix}{i}@example.com") for i in range(count)]
+    )
+    return list(User.objects.filter(username__startswith=prefix).order_by("id"))
+
+
+def _chat_share(prefix, scale, permission="collab"):
+    """
+    A chat share with ``scale`` members, where every member has also posted
+    into the shared session so each message row points at a different user.
+    """
+    owner = User.objects.create_user(username=f"{prefix}-owner", email=f"{prefix}-owner@example.com")
+    members = _make_users(f"{prefix}-member", scale)
+    session_id = f"{prefix}-session"
+    ChatHistory.objects.bulk_create(
+        [
+            ChatHistory(
+                user=author,
+                mode="general",
+                input_data={"question": f"Question from {author.username}", "session_id": session_id},
+                response_text="Answer",
+            )
+            for author in [owner, *members]
+        ]
+    )
+    share = ShareLink.objects.create(created_by=owner, resource_type="chat", session_id=session_id, permission=permission)
+    ShareMember.objects.bulk_create([ShareMember(share=share, user=member, added_by=owner) for member in members])
+    return owner, share, members
+
+
+def _note_share(prefix, scale):
+    owner = User.objects.create_user(username=f"{prefix}-owner", email=f"{prefix}-owner@example.com")
+    note = Note.objects.create(user=owner, title="Rivers", subject="Geography", category="Revision", tags="a, b", content="Text")
+    members = _make_users(f"{prefix}-member", scale)
+    share = ShareLink.objects.create(created_by=owner, resource_type="note", note=note, permission="collab")
+    ShareMember.objects.bulk_create([ShareMember(share=share, user=member, added_by=owner) for member in members])
+    return owner, share, members
+
+
+class SharingQueryCountTests(QueryCountTestCase):
+    urlconf = "sharing.urls"
+    url_prefix = "/api/share/"
+    covered_routes = (
+        "links/",
+        "links/create/",
+        "links/<uuid:token>/",
+        "links/<uuid:token>/revoke/",
+        "links/<uuid:token>/members/",
+        "links/<uuid:token>/members/<int:user_id>/",
+        "links/<uuid:token>/chat/",
+        "links/<uuid:token>/note/",
+        "links/<uuid:token>/invite/",
+        "invites/",
+        "invites/<int:invite_id>/",
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.llm = StubLLMServer(latency=0, token_rate=0, tokens=20).start()
+        cls.llm_settings = override_settings(OPENROUTER_API_KEY="test-key", OPENROUTER_BASE_URL=cls.llm.base_url)
+        cls.llm_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.llm_settings.disable()
+        cls.llm.stop()
+        super().tearDownClass()
+
+    def test_list_links(self):
+        def setup(scale):
+            owner = User.objects.create_user(username=f"list{scale}")
+            members = _make_users(f"list{scale}-member", 2)
+            shares = ShareLink.objects.bulk_create(
+                [ShareLink(created_by=owner, resource_type="chat", session_id=f"s{i}") for i in range(scale)]
+            )
+            ShareMember.objects.bulk_create(
+                [ShareMember(share=share, user=member) for share in shares for member in members]
+            )
+            return owner, "links/", None
+
+        self.assertConstantQueries("links/", "get", setup)
+
+    def test_create_chat_link(self):
+        def setup(scale):
+            owner, share, _ = _chat_share(f"createchat{scale}", scale)
+            return owner, "links/create/", {
+                "resource_type": "chat",
+                "session_id": share.session_id,
+                "permission": share.permission,
+            }
+
+        self.assertConstantQueries("links/create/", "post", setup, expected_status=201)
+
+    def test_create_chat_link_assigns_session(self):
+        def setup(scale):
+            owner = User.objects.create_user(username=f"assign{scale}")
+            rows = ChatHistory.objects.bulk_create(
+                [
+                    ChatHistory(user=owner, mode="general", input_data={"question": f"q{i}"}, response_text="a")
+                    for i in range(scale)
+                ]
+            )
+            return owner, "links/create/", {
+                "resource_type": "chat",
+                "session_id": f"assign{scale}-session",
+                "history_ids": [row.id for row in rows],
+            }
+
+        self.assertConstantQueries("links/create/", "post", setup, expected_status=201)
+
+    def test_create_note_link(self):
+        def setup(scale):
+            owner, share, _ = _note_share(f"createnote{scale}", scale)
+            return owner, "links/create/", {
+                "resource_type": "note",
+                "note_id": share.note_id,
+                "permission": share.permission,
+            }
+
+        self.assertConstantQueries("links/create/", "post", setup, expected_status=201)
+
+    def test_link_detail_as_member(self):
+        def setup(scale):
+            _, share, members = _chat_share(f"detail{scale}", scale)
+            return members[0], f"links/{share.token}/", None
+
+        self.assertConstantQueries("links/<uuid:token>/", "get", setup)
+
+    def test_note_link_detail_as_owner(self):
+        def setup(scale):
+            owner, share, _ = _note_share(f"notedetail{scale}", scale)
+            return owner, f"links/{share.token}/", None
+
+        self.assertConstantQueries("links/<uuid:token>/", "get", setup)
+
+    def test_revoke(self):
+        def setup(scale):
+            owner, share, _ = _chat_share(f"revoke{scale}", scale)
+            return owner, f"links/{share.token}/revoke/", None
+
+        self.assertConstantQueries("links/<uuid:token>/revoke/", "post", setup)
+
+    def test_members(self):
+        def setup(scale):
+            _, share, members = _chat_share(f"members{scale}", scale)
+            return members[0], f"links/{share.token}/members/", None
+
+        self.assertConstantQueries("links/<uuid:token>/members/", "get", setup)
+
+    def test_remove_member(self):
+        def setup(scale):
+            owner, share, members = _chat_share(f"remove{scale}", scale)
+            return owner, f"links/{share.token}/members/{members[0].id}/", None
+
+        self.assertConstantQueries("links/<uuid:token>/members/<int:user_id>/", "delete", setup)
+
+    def test_shared_chat_read(self):
+        def setup(scale):
+            _, share, members = _chat_share(f"chatread{scale}", scale)
+            return members[0], f"links/{share.token}/chat/", None
+
+        self.assertConstantQueries("links/<uuid:token>/chat/", "get", setup)
+
+    def test_shared_chat_post(self):
+        def setup(scale):
+            _, share, members = _chat_share(f"chatpost{scale}", scale)
+            return members[0], f"links/{share.token}/chat/", {"message": "And then?"}
+
+        self.assertConstantQueries("links/<uuid:token>/chat/", "post", setup)
+
+    def test_shared_note_read(self):
+        def setup(scale):
+            _, share, members = _note_share(f"noteread{scale}", scale)
+            return members[0], f"links/{share.token}/note/", None
+
+        self.assertConstantQueries("links/<uuid:token>/note/", "get", setup)
+
+    def test_shared_note_update(self):
+        def setup(scale):
+            _, share, members = _note_share(f"noteupdate{scale}", scale)
+            return members[0], f"links/{share.token}/note/", {"title": "Rivers (edited)"}
+
+        self.assertConstantQueries("links/<uuid:token>/note/", "put", setup)
+
+    def test_invite(self):
+        def setup(scale):
+            owner, share, _ = _chat_share(f"invite{scale}", scale)
+            User.objects.create_user(username=f"invitee{scale}")
+            return owner, f"links/{share.token}/invite/", {"username": f"invitee{scale}"}
+
+        self.assertConstantQueries("links/<uuid:token>/invite/", "post", setup)
+
+    def test_invite_list(self):
+        def setup(scale):
+            invitee = User.objects.create_user(username=f"invitelist{scale}")
+            for i in range(scale):
+                owner, share, _ = _chat_share(f"invitelist{scale}-{i}", 2)
+                ShareInvite.objects.create(share=share, invited_user=invitee, invited_by=owner)
+            return invitee, "invites/", None
+
+        self.assertConstantQueries("invites/", "get", setup)
+
+    def test_invite_accept(self):
+        def setup(scale):
+            owner, share, _ = _chat_share(f"accept{scale}", scale)
+            invitee = User.objects.create_user(username=f"accept{scale}-invitee")
+            invite = ShareInvite.objects.create(share=share, invited_user=invitee, invited_by=owner)
+            return invitee, f"invites/{invite.id}/", {"action": "accept"}
+
+        self.assertConstantQueries("invites/<int:invite_id>/", "post", setup)
+
+
+@override_settings(SHARE_ACCESS_TOKENS_ENABLED=True)
+class ShareAccessTokenTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner, self.share, members = _chat_share("access", 2)
+        self.member = members[0]
+        self.client.force_authenticate(self.member)
+        self.path = f"/api/share/links/{self.share.token}/chat/"
+
+    def _read(self, access_token=None):
+        headers = {"HTTP_X_SHARE_ACCESS_TOKEN": access_token} if access_token else {}
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.path, **headers)
+        tables = {
+            table
+            for query in context.captured_queries
+            for table in ("sharing_sharelink", "sharing_sharemember")
+            if table in query["sql"]
+        }
+        return response, tables
+
+    def test_signed_token_skips_membership_queries(self):
+        response, tables = self._read()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(tables, {"sharing_sharelink", "sharing_sharemember"})
+
+        cached, tables = self._read(response[access.HEADER])
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(tables, set())
+        self.assertEqual(cached.data, response.data)
+
+    def test_removed_member_token_is_rejected(self):
+        token = self._read()[0][access.HEADER]
+        self.client.force_authenticate(self.owner)
+        self.client.delete(f"/api/share/links/{self.share.token}/members/{self.member.id}/")
+        self.client.force_authenticate(self.member)
+        response, _ = self._read(token)
+        self.assertEqual(response.status_code, 403)
+
+    def test_revoked_share_token_is_rejected(self):
+        token = self._read()[0][access.HEADER]
+        self.client.force_authenticate(self.owner)
+        self.client.post(f"/api/share/links/{self.share.token}/revoke/")
+        self.client.force_authenticate(self.member)
+        response, _ = self._read(token)
+        self.assertEqual(response.status_code, 404)
+
+    def test_token_is_bound_to_user(self):
+        token = self._read()[0][access.HEADER]
+        outsider = User.objects.create_user(username="outsider")
+        self.client.force_authenticate(outsider)
+        response, _ = self._read(token)
+        self.assertEqual(response.status_code, 403)
+
+
+class SharedChatConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_transcript_is_built_once_per_change_for_all_members(self):
+        owner, share, members = _chat_share("polling", 2)
+        path = f"/api/share/links/{share.token}/chat/"
+        with mock.patch("sharing.views.chat_messages", wraps=views.chat_messages) as build:
+            bodies = []
+            for member in members:
+                self.client.force_authenticate(member)
+                bodies.append(self.client.get(path).content)
+            self.assertEqual(build.call_count, 1)
+            self.assertEqual(bodies[0], bodies[1])
+
+            ChatHistory.objects.create(
+                user=owner, mode="general", input_data={"question": "New?", "session_id": share.session_id},
+                response_text="Fresh answer",
+            )
+            self.assertIn(b"Fresh answer", self.client.get(path).content)
+            self.assertEqual(build.call_count, 2)
+
+    def test_removed_member_gets_403_not_304(self):
+        owner, share, members = _chat_share("conditional", 1)
+        path = f"/api/share/links/{share.token}/chat/"
+        self.client.force_authenticate(members[0])
+        etag = self.client.get(path)["ETag"]
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        ShareMember.objects.filter(share=share).delete()
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 403)
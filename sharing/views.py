@@ -1,78 +1,72 @@
 from django.utils import timezone
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 
+from ai import llm, prompts, sessions
+from ai.archive import rehydrate
 from ai.models import ChatHistory
+from core import caching, conditional, fastjson
 from notes.models import Note
+from search import indexing
+from . import access
 from .models import ShareLink, ShareMember, ShareInvite
 from .serializers import ShareLinkSerializer, ShareMemberSerializer, NoteSummarySerializer, ShareInviteSerializer
-from ai.views import (
-    _chat,
-    _extract_text,
-    _ree_identity,
-    _project_template,
-    _project_formatting_rules,
-    _originality_rules,
-    _project_subject_rules,
-)
+from .structs import chat_messages
 
 
 def _share_not_found():
     return Response({"detail": "Share link not found."}, status=status.HTTP_404_NOT_FOUND)
 
 
-def _get_active_share(token):
+def _get_active_share(token, with_owner=False):
+    related = ["note", "created_by"] if with_owner else ["note"]
     try:
-        share = ShareLink.objects.get(token=token, revoked_at__isnull=True)
+        share = ShareLink.objects.select_related(*related).get(token=token, revoked_at__isnull=True)
     except ShareLink.DoesNotExist:
         return None
     return share
 
 
-def _share_members_payload(share):
-    members = ShareMember.objects.filter(share=share).select_related("user").order_by("added_at")
-    return ShareMemberSerializer(members, many=True).data
+# Columns ShareLinkSerializer / ShareMemberSerializer actually render.
+SHARE_LINK_FIELDS = ("token", "resource_type", "session_id", "note_id", "permission", "created_at")
+MEMBER_FIELDS = ("share_id", "role", "added_at", "user__id", "user__username")
 
 
-def _chat_messages_for_session(session_id):
-    items = (
-        ChatHistory.objects.filter(input_data__session_id=session_id)
-        .select_related("user")
-        .order_by("created_at")
+def _members_prefetch(prefix=""):
+    # ShareLinkSerializer nests members -> user; load both levels up front,
+    # without the user's password hash, email and other unused columns.
+    return Prefetch(
+        f"{prefix}members",
+        queryset=ShareMember.objects.select_related("user").only(*MEMBER_FIELDS).order_by("added_at"),
     )
-    messages = []
-    for item in items:
-        messages.append(
-            {
-                "id": item.id,
-                "role": "user",
-                "content": item.input_data.get("question")
-                or item.input_data.get("notes")
-                or item.input_data.get("project_name")
-                or "",
-                "created_at": item.created_at,
-                "username": item.user.username,
-            }
-        )
-        messages.append(
-            {
-                "id": f"{item.id}-assistant",
-                "role": "assistant",
-                "content": item.response_text,
-                "created_at": item.created_at,
-                "username": "REE AI",
-            }
-        )
-    return messages
+
+
+def _access_role(share, user):
+    """Return ``"owner"``, the member's role, or ``None`` when ``user`` has no access."""
+    if share.created_by_id == user.id:
+        return "owner"
+    return ShareMember.objects.filter(share=share, user=user).values_list("role", flat=True).first()
+
+
+def _is_owner_or_member(share, user):
+    return _access_role(share, user) is not None
+
+
+def _share_members_payload(share):
+    members = ShareMember.objects.filter(share=share).select_related("user").order_by("added_at")
+    return ShareMemberSerializer(members, many=True).data
 
 
 class ShareLinkCreateView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @transaction.atomic
     def post(self, request):
         resource_type = request.data.get("resource_type")
         permission = request.data.get("permission", "read")
@@ -88,15 +82,9 @@ class ShareLinkCreateView(APIView):
             if not session_id:
                 return Response({"detail": "session_id is required for chat."}, status=400)
             if not ChatHistory.objects.filter(user=request.user, input_data__session_id=session_id).exists():
+                # Chat shared before it had a session: tag the given rows in one UPDATE.
                 history_ids = request.data.get("history_ids") or []
-                if history_ids:
-                    histories = ChatHistory.objects.filter(user=request.user, id__in=history_ids)
-                    for item in histories:
-                        input_data = dict(item.input_data or {})
-                        input_data["session_id"] = session_id
-                        item.input_data = input_data
-                        item.save(update_fields=["input_data"])
-                if not ChatHistory.objects.filter(user=request.user, input_data__session_id=session_id).exists():
+                if not history_ids or not sessions.assign(request.user, history_ids, session_id):
                     return Response({"detail": "Chat session not found."}, status=404)
             share = ShareLink.objects.filter(
                 created_by=request.user,
@@ -134,8 +122,8 @@ class ShareLinkCreateView(APIView):
                     permission=permission,
                 )
 
+        prefetch_related_objects([share], _members_prefetch())
         data = ShareLinkSerializer(share).data
-        data["members"] = _share_members_payload(share)
         return Response(data, status=201)
 
 
@@ -155,6 +143,7 @@ class ShareLinkListView(APIView):
         if note_id:
             qs = qs.filter(note_id=note_id)
 
+        qs = qs.only(*SHARE_LINK_FIELDS).prefetch_related(_members_prefetch())
         data = ShareLinkSerializer(qs, many=True).data
         return Response(data)
 
@@ -163,11 +152,11 @@ class ShareLinkDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, token):
-        share = _get_active_share(token)
+        share = _get_active_share(token, with_owner=True)
         if not share:
             return _share_not_found()
 
-        if share.created_by != request.user and not ShareMember.objects.filter(share=share, user=request.user).exists():
+        if not _is_owner_or_member(share, request.user):
             invite = ShareInvite.objects.filter(share=share, invited_user=request.user, status="pending").first()
             if invite:
                 return Response(
@@ -176,17 +165,17 @@ class ShareLinkDetailView(APIView):
                 )
             return Response({"detail": "Not allowed."}, status=status.HTTP_403_FORBIDDEN)
 
+        prefetch_related_objects([share], _members_prefetch())
         payload = ShareLinkSerializer(share).data
-        payload["members"] = _share_members_payload(share)
 
         if share.resource_type == "chat":
-            payload["messages"] = _chat_messages_for_session(share.session_id)
+            payload["messages"] = chat_messages(share.session_id)
         else:
             note = share.note
             payload["note"] = NoteSummarySerializer(note).data if note else None
 
         payload["owner"] = {"id": share.created_by.id, "username": share.created_by.username}
-        return Response(payload)
+        return Response(fastjson.encode(payload))
 
 
 class ShareLinkRevokeView(APIView):
@@ -194,10 +183,11 @@ class ShareLinkRevokeView(APIView):
 
     def post(self, request, token):
         share = _get_active_share(token)
-        if not share or share.created_by != request.user:
+        if not share or share.created_by_id != request.user.id:
             return _share_not_found()
         share.revoked_at = timezone.now()
         share.save(update_fields=["revoked_at"])
+        access.revoke_share(share.token)
         return Response({"detail": "Share link revoked."})
 
 
@@ -209,35 +199,68 @@ class ShareMembersView(APIView):
         if not share:
             return _share_not_found()
 
-        if share.created_by != request.user and not ShareMember.objects.filter(
-            share=share, user=request.user
-        ).exists():
+        if not _is_owner_or_member(share, request.user):
             return Response({"detail": "Not allowed."}, status=403)
 
         return Response(_share_members_payload(share))
 
     def delete(self, request, token, user_id):
         share = _get_active_share(token)
-        if not share or share.created_by != request.user:
+        if not share or share.created_by_id != request.user.id:
             return _share_not_found()
         ShareMember.objects.filter(share=share, user_id=user_id).delete()
         ShareInvite.objects.filter(share=share, invited_user_id=user_id).update(status="revoked", responded_at=timezone.now())
+        access.revoke_member(share.token, user_id)
         return Response({"detail": "Member removed."})
 
 
+_transcripts = caching.tiered("shared-chat")
+
+
+def _shared_chat_response(request, session_id, permission):
+    # Only called once access is established (signed token or membership).
+    validators = conditional.for_queryset(
+        request, ChatHistory.objects.filter(input_data__session_id=session_id), "created_at", permission
+    )
+    # Every member polls the same transcript, so it is built once per change.
+    # Keyed by the ETag: the cache only serves what a 304 would confirm.
+    return conditional.respond(
+        request,
+        validators,
+        lambda: Response(
+            _transcripts.get_or_set(
+                f"{session_id}:{validators.etag}",
+                lambda: fastjson.encode({"messages": chat_messages(session_id), "permission": permission}),
+                getattr(settings, "SHARED_CHAT_CACHE_TTL", 60),
+            )
+        ),
+    )
+
+
+def _shared_note_response(request, note, permission):
+    return conditional.respond(
+        request,
+        conditional.for_instance(request, note, "updated_at", permission),
+        lambda: Response({"note": NoteSummarySerializer(note).data, "permission": permission}),
+    )
+
+
 class SharedChatView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, token):
+        claims = access.claims_for(request, token)
+        if claims and claims["k"] == "chat":
+            return _shared_chat_response(request, claims["s"], claims["p"])
+
         share = _get_active_share(token)
         if not share or share.resource_type != "chat":
             return _share_not_found()
-        if share.created_by != request.user and not ShareMember.objects.filter(share=share, user=request.user).exists():
+        role = _access_role(share, request.user)
+        if role is None:
             return Response({"detail": "Not allowed."}, status=403)
-        return Response({
-            "messages": _chat_messages_for_session(share.session_id),
-            "permission": share.permission,
-        })
+        response = _shared_chat_response(request, share.session_id, share.permission)
+        return access.attach(response, share, request.user, role)
 
     def post(self, request, token):
         share = _get_active_share(token)
@@ -245,7 +268,7 @@ class SharedChatView(APIView):
             return _share_not_found()
         if share.permission != "collab":
             return Response({"detail": "Read-only share."}, status=403)
-        if share.created_by != request.user and not ShareMember.objects.filter(share=share, user=request.user).exists():
+        if not _is_owner_or_member(share, request.user):
             return Response({"detail": "Not allowed."}, status=403)
 
         message = request.data.get("message", "").strip()
@@ -261,18 +284,18 @@ class SharedChatView(APIView):
             .order_by("created_at")
         )
         history = []
-        for item in history_items:
+        for item in rehydrate(list(history_items)):
             history.append({"role": "user", "content": item.input_data.get("question") or item.input_data.get("notes") or item.input_data.get("project_name") or ""})
             history.append({"role": "assistant", "content": item.response_text})
 
         if mode == "study":
             system_prompt = (
-                f"{_ree_identity()} "
+                f"{prompts.ree_identity()} "
                 "Mode: STUDY. Behave Socratically: ask guiding questions, explain step-by-step, "
                 "and break content into small chunks. Explain the notes in simple, understandable terms."
             )
         elif mode == "project":
-            subject_rules = _project_subject_rules(subject)
+            subject_rules = prompts.project_subject_rules(subject)
             prompt = (
                 "Guided Project Mode: ask step-by-step questions to build the project. "
                 "Ask for subject, topic, and school level if missing. "
@@ -285,36 +308,37 @@ class SharedChatView(APIView):
                     "Use subject-specific rules. Localize examples. Examiner-safe language."
                 )
             system_prompt = (
-                f"{_ree_identity()} "
+                f"{prompts.ree_identity()} "
                 "Mode: PROJECT (ZIMSEC). "
-                f"{_project_template()} "
-                f"{_project_formatting_rules()} "
-                f"{_originality_rules()} "
+                f"{prompts.project_template()} "
+                f"{prompts.project_formatting_rules()} "
+                f"{prompts.originality_rules()} "
                 f"{subject_rules}"
             )
             history.append({"role": "user", "content": prompt})
         else:
             system_prompt = (
-                f"{_ree_identity()} "
+                f"{prompts.ree_identity()} "
                 "Mode: GENERAL. Provide direct answers with simple explanations. "
                 "Ask a brief follow-up question if needed."
             )
 
-        completion = _chat(
+        completion = llm.chat(
             [
                 {"role": "system", "content": system_prompt},
                 *history,
                 {"role": "user", "content": message},
             ]
         )
-        response_text = _extract_text(completion)
+        response_text = llm.extract_text(completion)
 
-        ChatHistory.objects.create(
+        answer = ChatHistory.objects.create(
             user=request.user,
             mode=mode,
             input_data={"question": message, "session_id": share.session_id},
             response_text=response_text,
         )
+        indexing.schedule_history(answer)
 
         return Response({"answer": response_text})
 
@@ -323,16 +347,20 @@ class SharedNoteView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, token):
+        claims = access.claims_for(request, token)
+        if claims and claims["k"] == "note":
+            note = Note.objects.filter(id=claims["n"]).first()
+            if note:
+                return _shared_note_response(request, note, claims["p"])
+
         share = _get_active_share(token)
         if not share or share.resource_type != "note" or not share.note:
             return _share_not_found()
-        if share.created_by != request.user and not ShareMember.objects.filter(share=share, user=request.user).exists():
+        role = _access_role(share, request.user)
+        if role is None:
             return Response({"detail": "Not allowed."}, status=403)
-        note = share.note
-        return Response({
-            "note": NoteSummarySerializer(note).data,
-            "permission": share.permission,
-        })
+        response = _shared_note_response(request, share.note, share.permission)
+        return access.attach(response, share, request.user, role)
 
     def put(self, request, token):
         share = _get_active_share(token)
@@ -340,7 +368,7 @@ class SharedNoteView(APIView):
             return _share_not_found()
         if share.permission != "collab":
             return Response({"detail": "Read-only share."}, status=403)
-        if share.created_by != request.user and not ShareMember.objects.filter(share=share, user=request.user).exists():
+        if not _is_owner_or_member(share, request.user):
             return Response({"detail": "Not allowed."}, status=403)
 
         note = share.note
@@ -351,6 +379,7 @@ class SharedNoteView(APIView):
         note.tags = data.get("tags", note.tags)
         note.content = data.get("content", note.content)
         note.save()
+        indexing.schedule(note)
 
         return Response({"note": NoteSummarySerializer(note).data})
 
@@ -360,7 +389,7 @@ class ShareInviteCreateView(APIView):
 
     def post(self, request, token):
         share = _get_active_share(token)
-        if not share or share.created_by != request.user:
+        if not share or share.created_by_id != request.user.id:
             return _share_not_found()
 
         username = (request.data.get("username") or "").strip()
@@ -376,6 +405,7 @@ class ShareInviteCreateView(APIView):
             return Response({"detail": "You are already the owner."}, status=400)
 
         ShareMember.objects.filter(share=share, user=invited_user).delete()
+        access.revoke_member(share.token, invited_user.id)
 
         invite, _ = ShareInvite.objects.get_or_create(
             share=share,
@@ -395,7 +425,18 @@ class ShareInviteListView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        invites = ShareInvite.objects.filter(invited_user=request.user, status="pending").select_related("share", "invited_by")
+        invites = (
+            ShareInvite.objects.filter(invited_user=request.user, status="pending")
+            .select_related("share", "invited_by")
+            .only(
+                "status",
+                "created_at",
+                "invited_by__id",
+                "invited_by__username",
+                *(f"share__{field}" for field in SHARE_LINK_FIELDS),
+            )
+            .prefetch_related(_members_prefetch("share__"))
+        )
         return Response(ShareInviteSerializer(invites, many=True).data)
 
 
@@ -11,9 +11,11 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
 from pathlib import Path
+import importlib.util
 import os
 import warnings
 import dj_database_url
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -52,6 +54,16 @@ def _env_int(name, default):
         return default
 
 
+def _env_float(name, default):
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        return default
+
+
 def _database_url():
     # Prefer pooled connection URLs for hosted environments (e.g., Render).
     return (
@@ -107,14 +119,20 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework.authtoken',
     'corsheaders',
+    'core',
     'authapi',
     'users',
     'notes',
     'ai',
     'sharing',
+    'mailer',
+    'search',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.InstrumentationMiddleware',
+    'core.middleware.CompressionMiddleware',
+    'core.middleware.ReplicaPinningMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -158,14 +176,99 @@ if DB_URL and "supabase" in DB_URL and ".pooler.supabase.com" not in DB_URL:
         RuntimeWarning,
     )
 
-DATABASES = {
-    "default": dj_database_url.config(
-        default=DB_URL or f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
+def _database(url):
+    db = dj_database_url.parse(
+        url,
         conn_max_age=600,
-        ssl_require=bool(DB_URL),
+        conn_health_checks=_env_bool("DATABASE_CONN_HEALTH_CHECKS", True),
+        ssl_require=url.startswith(("postgres://", "postgresql://")),
     )
+    if db["ENGINE"] != "django.db.backends.postgresql":
+        return db
+    db.setdefault("OPTIONS", {})
+
+    # Supabase's pooler (Supavisor/PgBouncer) in transaction mode listens on 6543:
+    # consecutive transactions may run on different server connections, so nothing
+    # that lives in a server session (named cursors, prepared statements) is safe.
+    if _env_bool("DATABASE_TRANSACTION_POOLING", str(db.get("PORT")) == "6543"):
+        db["DISABLE_SERVER_SIDE_CURSORS"] = True
+        db["OPTIONS"]["prepare_threshold"] = None
+
+    # psycopg3's connection pool (needs psycopg[pool]) replaces persistent
+    # per-thread connections. CONN_HEALTH_CHECKS makes the pool check a
+    # connection before handing it out, so a pooler restart costs a reconnect
+    # rather than a failed request.
+    if _env_bool("DATABASE_POOL", True) and importlib.util.find_spec("psycopg_pool"):
+        db["CONN_MAX_AGE"] = 0
+        db["OPTIONS"]["pool"] = {
+            "min_size": _env_int("DATABASE_POOL_MIN_SIZE", 1),
+            "max_size": _env_int("DATABASE_POOL_MAX_SIZE", 4),
+            # Seconds a request waits for a free connection before failing.
+            "timeout": _env_float("DATABASE_POOL_TIMEOUT", 10.0),
+            "max_idle": _env_float("DATABASE_POOL_MAX_IDLE", 300.0),
+            "max_lifetime": _env_float("DATABASE_POOL_MAX_LIFETIME", 1800.0),
+        }
+    return db
+
+
+DATABASES = {
+    # parse(), not config(): config() would read DATABASE_URL ahead of the pooled URLs.
+    "default": _database(DB_URL or f"sqlite:///{BASE_DIR / 'db.sqlite3'}"),
 }
 
+# Read replicas (comma-separated URLs). core.routers.ReplicaRouter sends reads
+# there and pins a user's reads to the primary for DATABASE_REPLICA_PIN_SECONDS
+# after their own writes; the pin is kept in the cache, so share it between workers.
+for _index, _url in enumerate(_env_list("DATABASE_REPLICA_URLS", _env_list("DATABASE_REPLICA_URL"))):
+    DATABASES["replica" if _index == 0 else f"replica_{_index}"] = {
+        **_database(_url),
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["core.routers.ReplicaRouter"] if len(DATABASES) > 1 else []
+DATABASE_REPLICA_PIN_SECONDS = _env_int("DATABASE_REPLICA_PIN_SECONDS", 5)
+
+# Shared cache. Throttle counters, job status, share-token revocations and
+# replica pins must be visible to every worker, so the default is never
+# per-process: Redis when REDIS_URL is set, otherwise CACHE_BACKEND picks a
+# file-based cache (one host) or the database ("db", shared by every host;
+# run `python manage.py createcachetable` once).
+_CACHE_BACKENDS = {
+    "redis": "django.core.cache.backends.redis.RedisCache",
+    "db": "django.core.cache.backends.db.DatabaseCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+}
+REDIS_URL = os.getenv("REDIS_URL", "")
+_cache_backend = os.getenv("CACHE_BACKEND", "redis" if REDIS_URL else "file").strip().lower()
+if _cache_backend not in _CACHE_BACKENDS:
+    raise ValueError(f"CACHE_BACKEND must be one of {', '.join(_CACHE_BACKENDS)}, not {_cache_backend!r}.")
+CACHES = {
+    "default": {
+        "BACKEND": _CACHE_BACKENDS[_cache_backend],
+        "LOCATION": {
+            "redis": REDIS_URL,
+            "db": "django_cache",
+            "file": os.getenv("CACHE_DIR", str(BASE_DIR / ".django_cache")),
+            "locmem": "default",
+        }[_cache_backend],
+        "TIMEOUT": _env_int("CACHE_DEFAULT_TIMEOUT", 300),
+        # Bump to drop every cached value at once (e.g. after changing a cached format).
+        "VERSION": _env_int("CACHE_VERSION", 1),
+        "KEY_PREFIX": os.getenv("CACHE_KEY_PREFIX", "zim"),
+    }
+}
+# Tests always use an in-process cache (see core.test_runner).
+TEST_RUNNER = "core.test_runner.TestRunner"
+# core.caching.TieredCache: in-process LRU in front of the shared cache. Another
+# worker's writes and tag invalidations reach this process within
+# CACHE_L1_TTL seconds (0 disables the in-process tier).
+CACHE_L1_MAX_ENTRIES = _env_int("CACHE_L1_MAX_ENTRIES", 1024)
+CACHE_L1_TTL = _env_float("CACHE_L1_TTL", 5.0)
+# XFetch beta: higher recomputes hot entries earlier before they expire.
+CACHE_EARLY_RECOMPUTE_BETA = _env_float("CACHE_EARLY_RECOMPUTE_BETA", 1.0)
+# Seconds a shared chat transcript is kept for the members polling it.
+SHARED_CHAT_CACHE_TTL = _env_int("SHARED_CHAT_CACHE_TTL", 60)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -186,6 +289,113 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Note content and chat answers at least this many characters long are stored
+# compressed (core.fields.CompressedTextField). Codec: zstd or zlib; empty
+# picks zstd when the zstandard package is installed.
+COMPRESSED_TEXT_THRESHOLD = _env_int("COMPRESSED_TEXT_THRESHOLD", 2048)
+COMPRESSED_TEXT_CODEC = os.getenv("COMPRESSED_TEXT_CODEC", "")
+
+# Chat answers older than this move to compressed cold storage when
+# `python manage.py archive_chat_history` runs. Codec: zstd (needs the
+# zstandard package) or zlib; empty picks zstd when available.
+CHAT_ARCHIVE_AFTER_DAYS = _env_int("CHAT_ARCHIVE_AFTER_DAYS", 90)
+CHAT_ARCHIVE_CODEC = os.getenv("CHAT_ARCHIVE_CODEC", "")
+
+# Background jobs (core.jobs) run on an in-process thread pool; status is kept
+# in the cache, so use a shared cache when running several processes.
+JOBS_MAX_WORKERS = _env_int("JOBS_MAX_WORKERS", 2)
+JOBS_RESULT_TTL = _env_int("JOBS_RESULT_TTL", 24 * 3600)
+JOBS_ALWAYS_EAGER = _env_bool("JOBS_ALWAYS_EAGER", False)
+# Retrieval over the user's notes and chat answers (search app): they are
+# split into passages of about SEARCH_CHUNK_CHARS characters and embedded
+# locally into SEARCH_EMBEDDING_DIM hashed features when saved; Study and
+# General mode put the SEARCH_TOP_K best note passages scoring above
+# SEARCH_MIN_SCORE in the prompt. After changing the dimension or chunk size
+# run `python manage.py build_search_index`.
+SEARCH_EMBEDDING_DIM = _env_int("SEARCH_EMBEDDING_DIM", 512)
+SEARCH_CHUNK_CHARS = _env_int("SEARCH_CHUNK_CHARS", 800)
+SEARCH_TOP_K = _env_int("SEARCH_TOP_K", 5)
+SEARCH_MIN_SCORE = _env_float("SEARCH_MIN_SCORE", 0.05)
+# Users whose vector index each worker keeps in memory.
+SEARCH_INDEX_CACHE_USERS = _env_int("SEARCH_INDEX_CACHE_USERS", 32)
+# Per-user memory-mapped vector segments; a derived cache, safe to delete.
+# Segments are merged when there are more than SEARCH_INDEX_MAX_SEGMENTS or
+# more than SEARCH_INDEX_DEAD_FRACTION of their rows were deleted.
+SEARCH_INDEX_DIR = os.getenv("SEARCH_INDEX_DIR", str(BASE_DIR / ".search_index"))
+SEARCH_INDEX_MAX_SEGMENTS = _env_int("SEARCH_INDEX_MAX_SEGMENTS", 8)
+SEARCH_INDEX_DEAD_FRACTION = _env_float("SEARCH_INDEX_DEAD_FRACTION", 0.25)
+# Indexing jobs that hit a transient database error (SQLite's "database is
+# locked") are retried this many times, waiting 0.5s, 1s, 2s, ... in between.
+SEARCH_INDEX_RETRIES = _env_int("SEARCH_INDEX_RETRIES", 4)
+# Worker processes for CPU-heavy document work (core.processes): parsing
+# imports and rendering exports never run on request or job threads.
+PROCESS_POOL_WORKERS = _env_int("PROCESS_POOL_WORKERS", 2)
+# Importing PDF/DOCX files into notes (POST /api/notes/import/): uploads of up
+# to NOTES_IMPORT_MAX_BYTES are streamed to NOTES_IMPORT_DIR and parsed by a
+# background job in tasks of NOTES_IMPORT_PAGES_PER_TASK pages with
+# NOTES_IMPORT_PAGE_TIMEOUT seconds per page. Longer text than
+# NOTES_IMPORT_NOTE_CHARS is split across several notes.
+NOTES_IMPORT_MAX_BYTES = _env_int("NOTES_IMPORT_MAX_BYTES", 50 * 1024 * 1024)
+NOTES_IMPORT_DIR = os.getenv("NOTES_IMPORT_DIR", str(BASE_DIR / ".imports"))
+NOTES_IMPORT_PAGES_PER_TASK = _env_int("NOTES_IMPORT_PAGES_PER_TASK", 8)
+NOTES_IMPORT_PAGE_TIMEOUT = _env_int("NOTES_IMPORT_PAGE_TIMEOUT", 10)
+NOTES_IMPORT_NOTE_CHARS = _env_int("NOTES_IMPORT_NOTE_CHARS", 100_000)
+# Project Mode .docx exports, cached per user under EXPORT_DIR by content hash;
+# files not downloaded for EXPORT_CACHE_TTL seconds, and the oldest beyond
+# EXPORT_CACHE_MAX_BYTES in total, are removed. A render taking longer than
+# EXPORT_RENDER_TIMEOUT seconds answers 503.
+EXPORT_DIR = os.getenv("EXPORT_DIR", str(BASE_DIR / ".exports"))
+EXPORT_CACHE_TTL = _env_int("EXPORT_CACHE_TTL", 7 * 24 * 3600)
+EXPORT_CACHE_MAX_BYTES = _env_int("EXPORT_CACHE_MAX_BYTES", 200 * 1024 * 1024)
+EXPORT_RENDER_TIMEOUT = _env_int("EXPORT_RENDER_TIMEOUT", 30)
+# Account data export (GET /api/auth/export/): rows are read
+# ACCOUNT_EXPORT_CHUNK_SIZE at a time; accounts with more than
+# ACCOUNT_EXPORT_STREAM_MAX_ROWS records are exported by a background job to
+# ACCOUNT_EXPORT_DIR and downloaded from there (resumable).
+ACCOUNT_EXPORT_DIR = os.getenv("ACCOUNT_EXPORT_DIR", str(BASE_DIR / ".account_exports"))
+ACCOUNT_EXPORT_CHUNK_SIZE = _env_int("ACCOUNT_EXPORT_CHUNK_SIZE", 500)
+ACCOUNT_EXPORT_STREAM_MAX_ROWS = _env_int("ACCOUNT_EXPORT_STREAM_MAX_ROWS", 5000)
+# Rows per transaction when deleting accounts and chat history.
+DELETION_BATCH_SIZE = _env_int("DELETION_BATCH_SIZE", 500)
+# Deletions whose job has reported no progress for this many seconds are
+# restarted by `manage.py resume_deletions` (see core.deletion).
+DELETION_RESUME_AFTER = _env_int("DELETION_RESUME_AFTER", 900)
+
+# Password hashing profile. New hashes use the selected hasher; hashes made
+# with another profile or different cost parameters are re-encoded on the
+# next successful login. Compare costs with `python manage.py benchmark_hashers`.
+# Unset cost parameters fall back to Django's defaults.
+_PASSWORD_HASHER_PROFILES = {
+    "pbkdf2": "authapi.hashers.TunedPBKDF2PasswordHasher",
+    "scrypt": "authapi.hashers.TunedScryptPasswordHasher",
+    "argon2": "authapi.hashers.TunedArgon2PasswordHasher",
+}
+PASSWORD_HASHER_PROFILE = os.getenv("PASSWORD_HASHER_PROFILE", "pbkdf2").strip().lower()
+if PASSWORD_HASHER_PROFILE not in _PASSWORD_HASHER_PROFILES:
+    warnings.warn(
+        f"Unknown PASSWORD_HASHER_PROFILE={PASSWORD_HASHER_PROFILE!r}; using 'pbkdf2'.",
+        RuntimeWarning,
+    )
+    PASSWORD_HASHER_PROFILE = "pbkdf2"
+if PASSWORD_HASHER_PROFILE == "argon2" and importlib.util.find_spec("argon2") is None:
+    warnings.warn(
+        "PASSWORD_HASHER_PROFILE=argon2 requires argon2-cffi; using 'scrypt'.",
+        RuntimeWarning,
+    )
+    PASSWORD_HASHER_PROFILE = "scrypt"
+PASSWORD_HASHERS = [
+    _PASSWORD_HASHER_PROFILES[PASSWORD_HASHER_PROFILE],
+    *(path for name, path in _PASSWORD_HASHER_PROFILES.items() if name != PASSWORD_HASHER_PROFILE),
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+]
+PASSWORD_PBKDF2_ITERATIONS = _env_int("PASSWORD_PBKDF2_ITERATIONS", None)
+PASSWORD_SCRYPT_WORK_FACTOR = _env_int("PASSWORD_SCRYPT_WORK_FACTOR", None)
+PASSWORD_SCRYPT_BLOCK_SIZE = _env_int("PASSWORD_SCRYPT_BLOCK_SIZE", None)
+PASSWORD_SCRYPT_PARALLELISM = _env_int("PASSWORD_SCRYPT_PARALLELISM", None)
+PASSWORD_ARGON2_TIME_COST = _env_int("PASSWORD_ARGON2_TIME_COST", None)
+PASSWORD_ARGON2_MEMORY_COST = _env_int("PASSWORD_ARGON2_MEMORY_COST", None)
+PASSWORD_ARGON2_PARALLELISM = _env_int("PASSWORD_ARGON2_PARALLELISM", None)
+
 # Internationalization
 # https://docs.djangoproject.com/en/6.0/topics/i18n/
 
@@ -216,6 +426,14 @@ CORS_ALLOWED_ORIGINS = _env_list(
     ],
 )
 CORS_ALLOW_CREDENTIALS = _env_bool("DJANGO_CORS_ALLOW_CREDENTIALS", False)
+CORS_ALLOW_HEADERS = (*default_headers, "x-share-access-token", "if-none-match", "if-modified-since")
+CORS_EXPOSE_HEADERS = ["X-Share-Access-Token", "ETag", "Last-Modified"]
+
+# Response compression (core.middleware.CompressionMiddleware): brotli when the
+# optional `brotli` package is installed, gzip otherwise. Smaller bodies are sent as is.
+COMPRESSION_MIN_SIZE = _env_int("COMPRESSION_MIN_SIZE", 1024)
+COMPRESSION_GZIP_LEVEL = _env_int("COMPRESSION_GZIP_LEVEL", 6)
+COMPRESSION_BROTLI_QUALITY = _env_int("COMPRESSION_BROTLI_QUALITY", 5)
 
 # OpenRouter API
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
@@ -241,6 +459,16 @@ DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "no-reply@zimproject.local"
 PASSWORD_RESET_URL = os.getenv("PASSWORD_RESET_URL", "")
 FRONTEND_BASE_URL = os.getenv("FRONTEND_BASE_URL", "")
 
+# Outbound mail queue (mailer app). Web processes start an in-process sender
+# after each enqueue unless a dedicated `manage.py send_outbox --loop` worker
+# is used instead.
+EMAIL_OUTBOX_AUTOSTART = _env_bool("EMAIL_OUTBOX_AUTOSTART", True)
+EMAIL_OUTBOX_BATCH_SIZE = _env_int("EMAIL_OUTBOX_BATCH_SIZE", 50)
+EMAIL_OUTBOX_POLL_SECONDS = _env_int("EMAIL_OUTBOX_POLL_SECONDS", 30)
+EMAIL_OUTBOX_MAX_ATTEMPTS = _env_int("EMAIL_OUTBOX_MAX_ATTEMPTS", 5)
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = _env_int("EMAIL_OUTBOX_RETRY_BASE_SECONDS", 30)
+EMAIL_OUTBOX_RETRY_MAX_SECONDS = _env_int("EMAIL_OUTBOX_RETRY_MAX_SECONDS", 3600)
+
 # Normalize SMTP transport flags to avoid STARTTLS/SSL mismatch failures.
 if EMAIL_USE_TLS and EMAIL_USE_SSL:
     warnings.warn(
@@ -264,10 +492,21 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
+# Seconds an authenticated user row is reused across requests (0 disables the cache).
+JWT_USER_CACHE_TTL = _env_int("JWT_USER_CACHE_TTL", 60)
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "core.authentication.CachedJWTAuthentication",
+    ),
+    "DEFAULT_RENDERER_CLASSES": (
+        "core.renderers.MsgspecJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "core.parsers.MsgspecJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
     ),
     "DEFAULT_THROTTLE_CLASSES": [
         "rest_framework.throttling.UserRateThrottle",
@@ -277,6 +516,21 @@ REST_FRAMEWORK = {
     },
 }
 
+# Shared resources: after a full membership check, GET /chat/ and /note/ return a
+# signed X-Share-Access-Token that lets repeat reads skip the membership queries.
+# Revocations are tracked in the cache, so enable this only with a cache shared by all workers.
+SHARE_ACCESS_TOKENS_ENABLED = _env_bool("SHARE_ACCESS_TOKENS_ENABLED", False)
+SHARE_ACCESS_TOKEN_TTL = _env_int("SHARE_ACCESS_TOKEN_TTL", 300)
+
+# Request instrumentation (Server-Timing headers + Prometheus metrics)
+# Fraction of requests that are timed; unsampled requests skip all bookkeeping.
+INSTRUMENTATION_SAMPLE_RATE = _env_float(
+    "INSTRUMENTATION_SAMPLE_RATE", 1.0 if DEBUG else 0.05
+)
+INSTRUMENTATION_SERVER_TIMING = _env_bool("INSTRUMENTATION_SERVER_TIMING", True)
+# Bearer token required by /api/metrics/; when empty only staff users may scrape.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 USE_X_FORWARDED_HOST = True
 SESSION_COOKIE_SECURE = not DEBUG
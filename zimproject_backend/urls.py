@@ -7,4 +7,6 @@ urlpatterns = [
     path('api/ai/', include('ai.urls')),
     path('api/notes/', include('notes.urls')),
     path('api/share/', include('sharing.urls')),
+    path('api/search/', include('search.urls')),
+    path('api/', include('core.urls')),
 ]